@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""tscut benchmark
+
+Generates synthetic ts files with tsgen.py and times tscut.py commands on them in subprocesses. Reports MB/s, packets/s
+and the peak RSS of each command, and writes the results to a JSON file to compare versions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TSCUT = os.path.join(os.path.dirname(BENCH_DIR), 'tscut.py')
+TSGEN = os.path.join(BENCH_DIR, 'tsgen.py')
+COMMANDS = ['packets', 'pid', 'programs', 'frames', 'cut', 'concat']
+
+
+def run(argv):
+    """Run a command with its output discarded. Returns the exit status, the wall time [s] and the peak RSS [bytes]."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, stdout=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+
+    return proc.returncode, seconds, peak_rss
+
+
+def get_argv(command, args, path_1, path_2, out_path):
+    """Return the command line of a benchmark and the files it reads."""
+    argv = [sys.executable, args.tscut]
+    options = ['-t', str(args.packet_size)] + args.tscut_options
+    if command == 'cut':
+        start = args.duration / 3
+        return argv + ['cut', *options, '-r', '-s', str(start), '-e', str(start * 2), path_1, out_path], [path_1]
+    elif command == 'concat':
+        return argv + ['concat', *options, path_1, path_2, out_path], [path_1, path_2]
+    else:
+        return argv + [command, *options, path_1], [path_1]
+
+
+def get_version(tscut):
+    """Return the git revision of tscut.py, or None."""
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(tscut)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """Main routine"""
+    parser = argparse.ArgumentParser(description='Benchmark tscut.py commands on synthetic ts files.')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tscut', default=TSCUT, help='tscut.py to benchmark')
+    parser.add_argument('-c', '--commands', nargs='+', choices=COMMANDS, default=COMMANDS, help='commands to benchmark')
+    parser.add_argument(
+        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+    )
+    parser.add_argument('-d', '--duration', type=float, default=60, help='duration of the generated files [s]')
+    parser.add_argument('-b', '--bitrate', type=float, default=8e6, help='bitrate of the generated files [bps]')
+    parser.add_argument('-g', '--gop', type=int, default=15, help='GOP size of the generated files [frames]')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per command (the fastest is reported)')
+    parser.add_argument('--data-dir', help='directory for the generated files (default: a temporary directory)')
+    parser.add_argument(
+        '--tscut-options', nargs=argparse.REMAINDER, default=[], help='options passed to every tscut.py command'
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        name = f'bench_{args.packet_size}_{args.duration:g}s_{args.bitrate:g}bps_gop{args.gop}'
+        path_1 = os.path.join(data_dir, name + '_1.ts')
+        path_2 = os.path.join(data_dir, name + '_2.ts')
+        out_path = os.path.join(tmp_dir, 'out.ts')
+        gen_options = ['-t', str(args.packet_size), '-d', str(args.duration), '-b', str(args.bitrate)]
+        gen_options += ['-g', str(args.gop)]
+        for path, base in ((path_1, 0), (path_2, int((args.duration + 10) * 90000))):
+            if not os.path.exists(path):
+                subprocess.run([sys.executable, TSGEN, path, *gen_options, '--base', str(base)], check=True)
+
+        results = []
+        for command in args.commands:
+            argv, infiles = get_argv(command, args, path_1, path_2, out_path)
+            size = sum(os.path.getsize(path) for path in infiles)
+            runs = [run(argv) for _ in range(args.repeat)]
+            status = max(r[0] for r in runs)
+            seconds = min(r[1] for r in runs)
+            peak_rss = max(r[2] for r in runs)
+            results.append(
+                {
+                    'command': command,
+                    'argv': argv[1:],
+                    'status': status,
+                    'seconds': seconds,
+                    'mb_per_s': size / seconds / 1e6,
+                    'packets_per_s': size / args.packet_size / seconds,
+                    'peak_rss_mb': peak_rss / 1e6,
+                }
+            )
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {result['command']: result for result in json.load(f)['results']}
+    print(
+        f'{"command":10} {"s":>8} {"MB/s":>8} {"packets/s":>11} {"RSS MB":>8}' + ('  vs baseline' if baseline else '')
+    )
+    for result in results:
+        line = '{command:10} {seconds:8.3f} {mb_per_s:8.2f} {packets_per_s:11.0f} {peak_rss_mb:8.1f}'.format(**result)
+        if result['command'] in baseline:
+            line += f'  {baseline[result["command"]]["seconds"] / result["seconds"]:.2f}x'
+        if result['status']:
+            line += f'  (exit status {result["status"]})'
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(
+                {
+                    'version': get_version(args.tscut),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'params': {
+                        'packet_size': args.packet_size,
+                        'duration': args.duration,
+                        'bitrate': args.bitrate,
+                        'gop': args.gop,
+                        'repeat': args.repeat,
+                        'tscut_options': args.tscut_options,
+                    },
+                    'results': results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Synthetic MPEG-TS generator
+
+Writes a constant bitrate stream with a PAT, a PMT, MPEG-2 or HEVC video PES with I/P/B picture headers and PCR, audio
+PES and null packets.
+"""
+
+import argparse
+import struct
+
+TS_PACKET_SIZE = 188
+PAT_PID = 0x0000
+PMT_PID = 0x1000
+VIDEO_PID = 0x0100
+AUDIO_PID = 0x0110
+NULL_PID = 0x1FFF
+PROGRAM_NUMBER = 1
+STREAM_TYPE_MPEG2_VIDEO = 0x02
+STREAM_TYPE_HEVC = 0x24
+VIDEO_STREAM_TYPES = {'mpeg2': STREAM_TYPE_MPEG2_VIDEO, 'hevc': STREAM_TYPE_HEVC}
+STREAM_TYPE_AAC = 0x0F
+PSI_INTERVAL = 0.1  # [s]
+DECODER_DELAY = 0.5  # DTS - PCR at the start [s]
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_FRAME_SAMPLES = 1024
+AUDIO_BITRATE = 192000
+FRAME_WEIGHTS = {'I': 5, 'P': 2, 'B': 1}  # Relative video frame sizes
+
+
+def make_crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+CRC_TABLE = make_crc_table()
+
+
+def crc32_mpeg2(data):
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def encode_timestamp(prefix, ts):
+    """Encode a 33-bit PTS or DTS in the 5 bytes of a PES header."""
+    ts %= 1 << 33
+    return bytes(
+        [
+            (prefix << 4) | ((ts >> 29) & 0b00001110) | 1,
+            (ts >> 22) & 0b11111111,
+            ((ts >> 14) & 0b11111110) | 1,
+            (ts >> 7) & 0b11111111,
+            ((ts << 1) & 0b11111110) | 1,
+        ]
+    )
+
+
+def make_section(table_id, table_id_extension, body):
+    """Make a PSI section with its CRC_32."""
+    section_length = 5 + len(body) + 4
+    section = struct.pack('>BHHBBB', table_id, 0xB000 | section_length, table_id_extension, 0xC1, 0, 0) + body
+    return section + struct.pack('>I', crc32_mpeg2(section))
+
+
+def make_pes(stream_id, data, pts, dts=None):
+    """Make a PES packet (the length is 0 for video)."""
+    if dts is None:
+        header = b'\x80\x80\x05' + encode_timestamp(0b0010, pts)
+    else:
+        header = b'\x80\xc0\x0a' + encode_timestamp(0b0011, pts) + encode_timestamp(0b0001, dts)
+    length = len(header) + len(data)
+    if stream_id >= 0xE0 or length > 0xFFFF:
+        length = 0
+    return b'\x00\x00\x01' + bytes([stream_id]) + struct.pack('>H', length) + header + data
+
+
+def get_gop(gop_size, num_b_frames):
+    """Return the (display index, picture coding type) of the frames of a closed GOP in decoding order."""
+    anchors = list(range(0, gop_size, num_b_frames + 1))
+    if anchors[-1] != gop_size - 1:
+        anchors.append(gop_size - 1)
+    frames = [(0, 'I')]
+    for prev, anchor in zip(anchors, anchors[1:]):
+        frames.append((anchor, 'P'))
+        frames += [(i, 'B') for i in range(prev + 1, anchor)]
+    return frames
+
+
+class TsGenerator:
+    """Constant bitrate TS generator"""
+
+    def __init__(
+        self,
+        out,
+        packet_size=188,
+        bitrate=8000000,
+        fps=30000 / 1001,
+        gop_size=15,
+        num_b_frames=2,
+        base=0,
+        codec='mpeg2',
+    ):
+        self.out = out
+        self.packet_size = packet_size
+        self.bitrate = bitrate
+        self.fps = fps
+        self.gop_size = gop_size
+        self.num_b_frames = num_b_frames
+        self.base = base  # PCR of the first packet [90 kHz]
+        self.codec = codec
+        self.num_packets = 0
+        self.continuity_counters = {}
+        self.buffer = []
+
+    def pcr(self):
+        """PCR [27 MHz] of the next packet"""
+        return self.base * 300 + self.num_packets * TS_PACKET_SIZE * 8 * 27000000 // self.bitrate
+
+    def write_packet(self, pid, payload, payload_unit_start_indicator=False, has_pcr=False):
+        """Write a packet with as much of payload as fits, and return the number of payload bytes written."""
+        continuity_counter = self.continuity_counters.get(pid, 0)
+        self.continuity_counters[pid] = (continuity_counter + 1) % 16
+        adaptation_field = None  # Flags and fields
+        if has_pcr:
+            pcr = self.pcr()
+            pcr_base, pcr_ext = pcr // 300 % (1 << 33), pcr % 300
+            adaptation_field = b'\x10' + struct.pack('>IH', pcr_base >> 1, ((pcr_base & 1) << 15) | 0x7E00 | pcr_ext)
+        room = TS_PACKET_SIZE - 4 - (1 + len(adaptation_field) if adaptation_field is not None else 0)
+        data = payload[:room]
+        stuffing = room - len(data)
+        if adaptation_field is None and stuffing:
+            adaptation_field = b'' if stuffing == 1 else b'\x00'
+            stuffing -= 1 + len(adaptation_field)
+        if adaptation_field is None:
+            adaptation_field = b''
+        else:
+            adaptation_field = bytes([len(adaptation_field) + stuffing]) + adaptation_field + b'\xff' * stuffing
+        adaptation_field_control = (0b10 if adaptation_field else 0) | (0b01 if data else 0)
+        header = struct.pack(
+            '>BHB',
+            0x47,
+            (0x4000 if payload_unit_start_indicator else 0) | pid,
+            (adaptation_field_control << 4) | continuity_counter,
+        )
+        packet = header + adaptation_field + data
+        if self.packet_size == 192:
+            ats = self.pcr() % (1 << 30)
+            packet = struct.pack('>I', ats) + packet
+        self.buffer.append(packet)
+        if len(self.buffer) >= 4096:
+            self.flush()
+        self.num_packets += 1
+        return len(data)
+
+    def write_pes(self, pid, pes, has_pcr=False):
+        payload_unit_start_indicator = True
+        while pes:
+            n = self.write_packet(pid, pes, payload_unit_start_indicator, has_pcr)
+            pes = pes[n:]
+            payload_unit_start_indicator = has_pcr = False
+
+    def write_psi(self):
+        pat = make_section(0x00, 1, struct.pack('>HH', PROGRAM_NUMBER, 0xE000 | PMT_PID))
+        pmt = make_section(
+            0x02,
+            PROGRAM_NUMBER,
+            struct.pack('>HH', 0xE000 | VIDEO_PID, 0xF000)
+            + struct.pack('>BHH', VIDEO_STREAM_TYPES[self.codec], 0xE000 | VIDEO_PID, 0xF000)
+            + struct.pack('>BHH', STREAM_TYPE_AAC, 0xE000 | AUDIO_PID, 0xF000),
+        )
+        self.write_packet(PAT_PID, b'\x00' + pat, True)
+        self.write_packet(PMT_PID, b'\x00' + pmt, True)
+
+    def picture(self, picture_coding_type, temporal_reference, size):
+        """Video elementary stream of a picture: MPEG-2, or an HEVC access unit if the codec is 'hevc'"""
+        if self.codec == 'hevc':
+            return self.hevc_picture(picture_coding_type, size)
+
+        es = b''
+        if picture_coding_type == 'I':
+            es += b'\x00\x00\x01\xb3\x2d\x01\xe0\x24\xff\xff\xe0\x00'  # Sequence header
+            es += b'\x00\x00\x01\xb8\x00\x08\x00\x40'  # GOP header (closed GOP)
+        coding_type = {'I': 1, 'P': 2, 'B': 3}[picture_coding_type]
+        es += b'\x00\x00\x01\x00' + struct.pack('>HBB', (temporal_reference << 6) | (coding_type << 3), 0xFF, 0xF8)
+        es += b'\x00\x00\x01\x01'  # Slice
+        return es + b'\xa5' * max(size - len(es), 0)
+
+    def hevc_picture(self, picture_coding_type, size):
+        """HEVC access unit of a picture, with one extra slice header bit in the PPS"""
+        es = b''
+        if picture_coding_type == 'I':
+            es += b'\x00\x00\x01\x44\x01\xc3\x80'  # PPS: pps_id 0, num_extra_slice_header_bits 1
+            es += b'\x00\x00\x01\x26\x01\xac'  # IDR_W_RADL slice
+        else:
+            # TRAIL_R slice: first_slice_segment_in_pic_flag 1, pps_id 0, slice_reserved_flag, slice_type B or P
+            es += b'\x00\x00\x01\x02\x01' + (b'\xd0' if picture_coding_type == 'B' else b'\xc8')
+        return es + b'\xa5' * max(size - len(es), 0)
+
+    def run(self, duration):
+        frame_duration = 90000 / self.fps
+        gop = get_gop(self.gop_size, self.num_b_frames)
+        weights = sum(FRAME_WEIGHTS[t] for _, t in gop)
+        video_bitrate = (self.bitrate - AUDIO_BITRATE) * 0.85
+        unit_size = video_bitrate / 8 / self.fps * len(gop) / weights
+        audio_frame_duration = 90000 * AUDIO_FRAME_SAMPLES / AUDIO_SAMPLE_RATE
+        audio_frame_size = AUDIO_BITRATE * AUDIO_FRAME_SAMPLES // AUDIO_SAMPLE_RATE // 8
+        start = self.base + DECODER_DELAY * 90000
+        num_frames = int(duration * self.fps)
+        num_audio_frames = 0
+        psi_time = None
+        for j in range(num_frames):
+            gop_start = j - j % self.gop_size
+            display_idx, picture_coding_type = gop[j % self.gop_size]
+            dts = start + j * frame_duration
+            pts = start + (gop_start + display_idx + 1) * frame_duration
+            if psi_time is None or dts - psi_time >= PSI_INTERVAL * 90000:
+                self.write_psi()
+                psi_time = dts
+            es = self.picture(picture_coding_type, display_idx, int(unit_size * FRAME_WEIGHTS[picture_coding_type]))
+            self.write_pes(VIDEO_PID, make_pes(0xE0, es, round(pts), round(dts)), has_pcr=True)
+            while num_audio_frames * audio_frame_duration <= (j + 1) * frame_duration:
+                audio_pts = round(start + num_audio_frames * audio_frame_duration)
+                self.write_pes(AUDIO_PID, make_pes(0xC0, b'\xff\xf1' + b'\x5a' * (audio_frame_size - 2), audio_pts))
+                num_audio_frames += 1
+            # Null packets up to the bitrate
+            end = (j + 1) * frame_duration * 300 + self.base * 300
+            while self.pcr() < end:
+                self.write_packet(NULL_PID, b'\xff' * (TS_PACKET_SIZE - 4))
+        self.flush()
+
+    def flush(self):
+        self.out.write(b''.join(self.buffer))
+        self.buffer.clear()
+
+
+def main():
+    """Main routine"""
+    parser = argparse.ArgumentParser(description='Generate a synthetic MPEG-TS file.')
+    parser.add_argument('outfile', metavar='output', help='output file')
+    parser.add_argument(
+        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+    )
+    parser.add_argument('-d', '--duration', type=float, default=60, help='duration [s]')
+    parser.add_argument('-b', '--bitrate', type=float, default=8e6, help='bitrate [bps]')
+    parser.add_argument('--fps', type=float, default=30000 / 1001, help='frame rate')
+    parser.add_argument('-g', '--gop', type=int, default=15, help='GOP size [frames]')
+    parser.add_argument('--b-frames', type=int, default=2, help='B-frames between anchor frames')
+    parser.add_argument('--base', type=int, default=0, help='PCR of the first packet [90 kHz]')
+    parser.add_argument('--codec', choices=list(VIDEO_STREAM_TYPES), default='mpeg2', help='video codec')
+    args = parser.parse_args()
+
+    with open(args.outfile, 'wb') as f:
+        TsGenerator(
+            f, args.packet_size, int(args.bitrate), args.fps, args.gop, args.b_frames, args.base, args.codec
+        ).run(args.duration)
+
+
+if __name__ == '__main__':
+    main()
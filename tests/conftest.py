@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import tscut  # noqa: E402
+import tsgen  # noqa: E402
+
+
+@pytest.fixture
+def make_ts(tmp_path):
+    """Return a function generating a synthetic ts file with tsgen and returning its bytes (bytearray)."""
+
+    def make_ts(duration=2, packet_size=188, **kwargs):
+        path = tmp_path / 'gen.ts'
+        with open(path, 'wb') as f:
+            tsgen.TsGenerator(f, packet_size, **kwargs).run(duration)
+        return bytearray(path.read_bytes())
+
+    return make_ts
+
+
+@pytest.fixture
+def run_tscut(capsys):
+    """Return a function running a tscut command line in this process and returning its stdout."""
+
+    def run_tscut(*argv):
+        args = tscut.build_parser().parse_args([str(arg) for arg in argv])
+        tscut.stats.reset()
+        tscut.set_packet_size(args)
+        args.func(args)
+        return capsys.readouterr().out
+
+    return run_tscut
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def numpy_mode(request, monkeypatch):
+    """Run a test with NumPy if it is installed, and without it."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(tscut, 'import_numpy', lambda: None)
+    return request.param
@@ -0,0 +1,80 @@
+import json
+import re
+
+import pytest
+
+import tscut
+
+
+def test_batch_job_stats(make_ts, tmp_path, capsys):
+    sizes = []
+    for name, duration in [('a.ts', 1), ('b.ts', 2)]:
+        data = make_ts(duration=duration)
+        (tmp_path / name).write_bytes(data)
+        sizes.append(len(data))
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(
+        json.dumps(
+            [
+                {'name': 'a', 'args': ['--stats', 'pid', str(tmp_path / 'a.ts')]},
+                {
+                    'name': 'b',
+                    'args': ['--stats', '--profile', str(tmp_path / 'b.prof'), 'pid', str(tmp_path / 'b.ts')],
+                },
+            ]
+        )
+    )
+    tscut.run_command(tscut.build_parser().parse_args(['batch', '-j', '1', str(manifest)]))
+    stderr = capsys.readouterr().err
+    # Each job reports its own bytes, not those of the jobs run before it in the same worker process
+    reads = [int(n) for n in re.findall(r'^Read: (\d+) bytes', stderr, re.MULTILINE)]
+    assert sorted(reads) == sorted(sizes)
+    assert (tmp_path / 'b.prof').stat().st_size > 0
+
+
+def run_batch(*argv):
+    tscut.run_command(tscut.build_parser().parse_args(['batch'] + [str(arg) for arg in argv]))
+
+
+def test_batch(make_ts, run_tscut, tmp_path, capsys):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=3))
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(
+        json.dumps(
+            [
+                ['index', str(path)],
+                {'name': 'cut', 'args': ['cut', '-r', '-s', 1, '-e', 2, str(path), str(tmp_path / 'batch_cut.ts')]},
+                ['pid', str(path)],
+            ]
+        )
+    )
+    run_batch('-j', 2, '--report', tmp_path / 'report.json', manifest)
+    stdout = capsys.readouterr().out
+    report = json.loads((tmp_path / 'report.json').read_text())
+    assert [job['name'] for job in report] == [f'index {path}', 'cut', f'pid {path}']
+    assert all(job['status'] == 'ok' and job['seconds'] >= 0 and job['error'] is None for job in report)
+    assert report[1]['args'] == ['cut', '-r', '-s', '1', '-e', '2', str(path), str(tmp_path / 'batch_cut.ts')]
+
+    # The same results as the commands run one by one
+    assert stdout == run_tscut('pid', path)
+    assert (tmp_path / 'input.ts.tsidx').exists()
+    run_tscut('cut', '-r', '-s', 1, '-e', 2, path, tmp_path / 'cut.ts')
+    assert (tmp_path / 'batch_cut.ts').read_bytes() == (tmp_path / 'cut.ts').read_bytes()
+
+
+def test_batch_failed_jobs(make_ts, tmp_path, capsys):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=1))
+    manifest = tmp_path / 'jobs.csv'
+    manifest.write_text(
+        f'# name,args\n\npid,{path}\npid,{tmp_path / "missing.ts"}\npid,--no-such-option,{path}\nbatch,{manifest}\n'
+    )
+    with pytest.raises(SystemExit) as e:
+        run_batch('--report', tmp_path / 'report.json', manifest)
+    assert e.value.code == 1
+    report = json.loads((tmp_path / 'report.json').read_text())
+    assert [job['status'] for job in report] == ['ok', 'failed', 'failed', 'failed']
+    assert 'FileNotFoundError' in report[1]['error']
+    assert [job['error'] for job in report[2:]] == ['invalid arguments', 'batch cannot be a job']
+    assert '4 jobs, 3 failed' in capsys.readouterr().err
@@ -0,0 +1,71 @@
+import csv
+import io
+import re
+import sys
+
+import pytest
+
+import tscut
+import tsgen
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('clock', ['ats', 'pcr'])
+def test_bitrate(make_ts, run_tscut, tmp_path, clock):
+    data = make_ts(duration=5, packet_size=192)
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    output = tmp_path / 'bitrate.csv'
+    out = run_tscut('bitrate', '--clock', clock, '-i', 0.5, '-o', output, path)
+    assert re.search(r'^Bitrate: 8\.0\d\d Mbps', out, re.MULTILINE)
+    assert f'[0x{tsgen.VIDEO_PID:04X}]' in out
+
+    rows = list(csv.DictReader(io.StringIO(output.read_text())))
+    assert len(rows) == 10
+    assert [float(row['time']) for row in rows] == [i * 0.5 for i in range(10)]
+    for row in rows[:-1]:
+        assert float(row['total']) == pytest.approx(8000000, rel=0.01)
+    for row in rows:
+        assert sum(float(value) for name, value in row.items() if name.startswith('0x')) == float(row['total'])
+    # Every packet is counted in an interval
+    total_packets = sum(float(row['total']) for row in rows) * 0.5 / (tscut.TS_PACKET_SIZE * 8)
+    assert round(total_packets) == len(data) // 192
+
+
+def test_bitrate_npy(make_ts, run_tscut, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=3))
+    run_tscut('bitrate', '-o', tmp_path / 'bitrate.npy', '--pcr-output', tmp_path / 'pcr.npy', path)
+    table = np.load(tmp_path / 'bitrate.npy')
+    assert table.dtype.names[:2] == ('time', 'total')
+    assert f'0x{tsgen.VIDEO_PID:04X}' in table.dtype.names
+    pcrs = np.load(tmp_path / 'pcr.npy')
+    assert (pcrs['pid'] == tsgen.VIDEO_PID).all()
+    assert not pcrs['discontinuity'].any()
+    assert (np.diff(pcrs['time']) > 0).all()
+    assert pcrs['time'][-1] == pytest.approx(3, abs=0.1)
+
+
+def test_bitrate_pcr_clock_stdin(make_ts, run_tscut, monkeypatch):
+    stdin = io.BufferedReader(io.BytesIO(bytes(make_ts(duration=1))))
+    monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(stdin))
+    with pytest.raises(ValueError, match='seekable'):
+        run_tscut('bitrate', '--clock', 'pcr', '-')
+
+
+def test_bitrate_ats_wraparound(make_ts, run_tscut, tmp_path):
+    # Over several blocks, with the ATS wrapping around in the middle
+    data = make_ts(duration=5, packet_size=192)
+    assert len(data) // 192 > tscut.CHUNK_SIZE
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    expected = run_tscut('bitrate', '-o', tmp_path / 'expected.csv', path)
+    middle = int.from_bytes(data[len(data) // 2 : len(data) // 2 + 4], 'big') & (tscut.ATS_WRAP - 1)
+    for pos in range(0, len(data), 192):
+        header = int.from_bytes(data[pos : pos + 4], 'big')
+        ats = (header - middle) % tscut.ATS_WRAP  # 0 in the middle
+        data[pos : pos + 4] = (header & ~(tscut.ATS_WRAP - 1) | ats).to_bytes(4, 'big')
+    path.write_bytes(data)
+    assert run_tscut('bitrate', '-o', tmp_path / 'bitrate.csv', path) == expected
+    assert (tmp_path / 'bitrate.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
@@ -0,0 +1,24 @@
+import json
+
+PAT_PID = 0x0000
+
+
+def test_check_clean(make_ts, run_tscut, numpy_mode, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts())
+    report = json.loads(run_tscut('check', path))
+    assert report['ok']
+    assert report['continuity_errors'] == 0
+    assert report['tables']['0x0000']['crc_errors'] == 0
+
+
+def test_check_leading_continuation_packet(make_ts, run_tscut, numpy_mode, tmp_path):
+    data = make_ts()
+    assert (data[1] << 8 | data[2]) & 0x1FFF == PAT_PID
+    data[1] &= 0xBF  # Clear the payload_unit_start_indicator of the first PAT packet
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    report = json.loads(run_tscut('check', path))
+    assert report['ok']
+    assert report['crc_errors'] == 0
+    assert report['tables']['0x0000']['sections'] > 0
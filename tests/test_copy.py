@@ -0,0 +1,81 @@
+import io
+import os
+
+import pytest
+
+import tscut
+
+DATA = bytes(range(256)) * 400
+OFFSET = 1000
+SIZE = 60000
+
+
+@pytest.fixture(autouse=True)
+def small_copies(monkeypatch):
+    """Copy the test data in several calls."""
+    monkeypatch.setattr(tscut, 'COPY_SIZE', 8192)
+    monkeypatch.setattr(tscut, 'COPY_BLOCK_SIZE', 4096)
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / 'input.bin'
+    path.write_bytes(DATA)
+    return path
+
+
+def unsupported(*args):
+    raise OSError('not supported')
+
+
+def check_copy(tsi, tso, size=SIZE):
+    """Copy a range after a header, then a trailer, and check the output and the input position."""
+    tso.write(b'header')
+    assert tscut.copy_range(tsi, tso, OFFSET, size) == min(size, len(DATA) - OFFSET)
+    assert tsi.tell() == OFFSET + min(size, len(DATA) - OFFSET)
+    tso.write(b'trailer')
+
+
+@pytest.mark.parametrize('fallback', ['copy_file_range', 'sendfile', 'blocks'])
+def test_copy_range_files(input_path, tmp_path, monkeypatch, fallback):
+    if fallback in ('sendfile', 'blocks'):
+        monkeypatch.setattr(os, 'copy_file_range', unsupported, raising=False)
+    if fallback == 'blocks':
+        monkeypatch.setattr(os, 'sendfile', unsupported, raising=False)
+    tscut.stats.reset()
+    with open(input_path, 'rb') as tsi, open(tmp_path / 'output.bin', 'wb') as tso:
+        check_copy(tsi, tso)
+    assert (tmp_path / 'output.bin').read_bytes() == b'header' + DATA[OFFSET : OFFSET + SIZE] + b'trailer'
+    if fallback != 'blocks':
+        assert tscut.stats.num_bytes_written == SIZE
+
+
+def test_copy_range_fails_midway(input_path, tmp_path, monkeypatch):
+    # The kernel copy stops after some calls, and the rest is copied by the next method
+    copy_file_range = os.copy_file_range if hasattr(os, 'copy_file_range') else None
+    calls = []
+
+    def failing_copy_file_range(*args):
+        calls.append(args)
+        if len(calls) > 2 or copy_file_range is None:
+            raise OSError('not supported')
+        return copy_file_range(*args)
+
+    monkeypatch.setattr(os, 'copy_file_range', failing_copy_file_range, raising=False)
+    monkeypatch.setattr(os, 'sendfile', unsupported, raising=False)
+    with open(input_path, 'rb') as tsi, open(tmp_path / 'output.bin', 'wb') as tso:
+        check_copy(tsi, tso)
+    assert (tmp_path / 'output.bin').read_bytes() == b'header' + DATA[OFFSET : OFFSET + SIZE] + b'trailer'
+
+
+@pytest.mark.parametrize('size', [SIZE, len(DATA)])
+def test_copy_range_no_fileno(size):
+    tso = io.BytesIO()
+    check_copy(io.BytesIO(DATA), tso, size)
+    assert tso.getvalue() == b'header' + DATA[OFFSET : OFFSET + size] + b'trailer'
+
+
+def test_copy_range_mmap(input_path, tmp_path):
+    with tscut.open_input(str(input_path), True) as tsi, open(tmp_path / 'output.bin', 'wb') as tso:
+        check_copy(tsi, tso)
+    assert (tmp_path / 'output.bin').read_bytes() == b'header' + DATA[OFFSET : OFFSET + SIZE] + b'trailer'
@@ -0,0 +1,74 @@
+import io
+import struct
+
+import pytest
+
+import tscut
+import tsgen
+
+VIDEO_PES_START = b'\x00\x00\x01\xe0'
+
+
+def strip_dts(data):
+    """Turn the DTS of the video PES headers into stuffing bytes, leaving only the PTS."""
+    pos = data.find(VIDEO_PES_START)
+    while pos >= 0:
+        data[pos + 7] &= 0xBF  # PTS_DTS_flags 0b11 -> 0b10
+        pos = data.find(VIDEO_PES_START, pos + 1)
+    return data
+
+
+def test_join_pts_only(make_ts, run_tscut, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(strip_dts(make_ts(duration=3, num_b_frames=0)))
+    output = tmp_path / 'output.ts'
+    run_tscut('cut', '-r', '-s', 0.5, '-e', 1, '-s', 2, '-e', 2.5, '--join', path, output)
+    with tscut.TsFile(str(output)) as ts:
+        pts = [frame.pts for frame in ts.frames()]
+    assert all(frame_pts is not None for frame_pts in pts)
+    # The second segment follows the first one instead of keeping its timestamps 1 s later
+    assert max(b - a for a, b in zip(pts, pts[1:])) <= tscut.CONCAT_GAP + 3003
+
+
+def test_first_timestamps_pts_only(make_ts, tmp_path):
+    data = strip_dts(make_ts(duration=10))
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    tscut.stats.reset()
+    with open(path, 'rb') as f:
+        pcr, pts, dts = tscut.get_edge_timestamp(f, 188, False, tsgen.VIDEO_PID)
+    assert pcr is not None and pts is not None
+    assert dts == pts
+    # The scan stops at the first video PES header instead of looking for a DTS to the end
+    assert tscut.stats.num_packets < len(data) // 188
+
+
+def test_last_timestamps_pts_only(make_ts, tmp_path):
+    data = strip_dts(make_ts(duration=10))
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    tscut.stats.reset()
+    with open(path, 'rb') as f:
+        pcr, pts, dts = tscut.get_edge_timestamp(f, 188, True, tsgen.VIDEO_PID)
+    assert pcr is not None and pts is not None
+    assert dts == pts
+    # The scan stops in the last window instead of walking back to the start
+    assert tscut.stats.num_packets <= tscut.EDGE_WINDOW
+
+
+def test_stream_cut_no_video():
+    pat = tsgen.make_section(0x00, 1, struct.pack('>HH', tsgen.PROGRAM_NUMBER, 0xE000 | tsgen.PMT_PID))
+    pmt = tsgen.make_section(
+        0x02,
+        tsgen.PROGRAM_NUMBER,
+        struct.pack(
+            '>HHBHH', 0xE000 | tsgen.AUDIO_PID, 0xF000, tsgen.STREAM_TYPE_AAC, 0xE000 | tsgen.AUDIO_PID, 0xF000
+        ),
+    )
+    packets = [
+        struct.pack('>BHB', 0x47, 0x4000 | pid, 0x10) + b'\x00' + section
+        for pid, section in [(0, pat), (tsgen.PMT_PID, pmt)]
+    ]
+    data = b''.join(packet.ljust(188, b'\xff') for packet in packets) * 4
+    with pytest.raises(ValueError, match='No video stream'):
+        tscut.stream_cut(io.BytesIO(data), io.BytesIO(), 188, 0, 1)
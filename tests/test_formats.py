@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+import tscut
+import tsgen
+from conftest import ROOT
+
+
+@pytest.fixture
+def input_ts(make_ts, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=2))
+    return path
+
+
+def parse_csv(output):
+    return [[int(value) if value.lstrip('-').isdigit() else value for value in row] for row in csv.reader(output)]
+
+
+@pytest.mark.parametrize('command', ['pkt', 'pid', 'prg', 'frm'])
+def test_csv_jsonl(input_ts, run_tscut, command):
+    header, *rows = parse_csv(io.StringIO(run_tscut(command, '--format', 'csv', input_ts)))
+    records = [json.loads(line) for line in run_tscut(command, '--format', 'jsonl', input_ts).splitlines()]
+    assert [list(record) for record in records] == [header] * len(rows)
+    assert [list(record.values()) for record in records] == rows
+    assert rows
+
+
+def test_formats_values(input_ts, run_tscut):
+    pids = parse_csv(io.StringIO(run_tscut('pid', '--format', 'csv', input_ts)))
+    data = input_ts.read_bytes()
+    assert sum(count for _, count in pids[1:]) == sum(data[i + 1] & 0x1F != 0x1F for i in range(0, len(data), 188))
+    assert f'[0x{tsgen.VIDEO_PID:04X}]' in run_tscut('pid', input_ts)
+    programs = parse_csv(io.StringIO(run_tscut('prg', '--format', 'csv', input_ts)))
+    assert programs[0] == ['program_number', 'program_map_pid', 'pid', 'stream_type']
+    assert [tsgen.PROGRAM_NUMBER, tsgen.PMT_PID, tsgen.VIDEO_PID, tscut.STREAM_TYPE_MPEG2_VIDEO] in programs
+
+
+@pytest.mark.parametrize('stdout', ['file', 'pipe'])
+@pytest.mark.parametrize('command', ['pkt', 'pid', 'frm'])
+def test_npy(input_ts, run_tscut, tmp_path, command, stdout):
+    np = pytest.importorskip('numpy')
+    argv = [sys.executable, f'{ROOT}/tscut.py', command, '--format', 'npy', str(input_ts)]
+    path = tmp_path / 'output.npy'
+    if stdout == 'file':
+        with open(path, 'wb') as f:
+            subprocess.run(argv, stdout=f, check=True)
+    else:
+        path.write_bytes(subprocess.run(argv, stdout=subprocess.PIPE, check=True).stdout)
+    table = np.load(path)
+
+    header, *rows = parse_csv(io.StringIO(run_tscut(command, '--format', 'csv', input_ts)))
+    assert list(table.dtype.names) == header
+    assert [[value.decode() if isinstance(value, bytes) else value for value in row] for row in table.tolist()] == rows
@@ -0,0 +1,79 @@
+import pytest
+
+import tscut
+import tsgen
+
+DURATION = 2
+NUM_FRAMES = int(DURATION * 30000 / 1001)
+AUD = b'\x00\x00\x01\x09\xf0'  # H.264 access unit delimiter
+H264_PARAMETER_SETS = b'\x00\x00\x01\x67\x42\x00\x1e' + b'\x00\x00\x01\x68\xce\x38\x80'  # SPS, PPS
+H264_SLICES = {
+    'I': b'\x00\x00\x01\x65\x88',  # IDR slice
+    'P': b'\x00\x00\x01\x41\x98',  # first_mb_in_slice 0, slice_type 5 (P)
+    'B': b'\x00\x00\x01\x01\x9c',  # first_mb_in_slice 0, slice_type 6 (B)
+}
+
+
+class H264Generator(tsgen.TsGenerator):
+    """TsGenerator of H.264 access units"""
+
+    def picture(self, picture_coding_type, temporal_reference, size):
+        es = AUD + (H264_PARAMETER_SETS if picture_coding_type == 'I' else b'') + H264_SLICES[picture_coding_type]
+        return es + b'\xa5' * max(size - len(es), 0)
+
+
+def get_frame_types(gop_size, num_frames=NUM_FRAMES):
+    """Return the picture coding types of the generated frames in decoding order."""
+    gop = [picture_coding_type for _, picture_coding_type in tsgen.get_gop(gop_size, 2)]
+    return [gop[j % gop_size] for j in range(num_frames)]
+
+
+@pytest.mark.parametrize(
+    'es, expected',
+    [
+        (AUD + H264_PARAMETER_SETS + H264_SLICES['I'], 'I'),
+        (AUD + H264_SLICES['P'], 'P'),
+        (AUD + H264_SLICES['B'], 'B'),
+        (AUD + b'\x00\x00\x01\x21\x88', 'I'),  # Non-IDR slice, slice_type 7 (I)
+        (b'\x00\x00\x01\x41\xc0', 'P'),  # slice_type 0 (P)
+        (AUD, None),
+    ],
+)
+def test_h264_picture_coding_type(es, expected):
+    assert tscut.get_picture_coding_type(es, tscut.STREAM_TYPE_H264) == expected
+
+
+def test_hevc_picture_coding_type():
+    idr = tsgen.TsGenerator(None, codec='hevc').hevc_picture('I', 0)
+    p = tsgen.TsGenerator(None, codec='hevc').hevc_picture('P', 0)
+    b = tsgen.TsGenerator(None, codec='hevc').hevc_picture('B', 0)
+    # The slice_type follows num_extra_slice_header_bits of the PPS, found in the I picture
+    assert tscut.get_picture_coding_type(p, tscut.STREAM_TYPE_HEVC) is None
+    extra_slice_header_bits = {}
+    assert tscut.get_picture_coding_type(idr, tscut.STREAM_TYPE_HEVC, extra_slice_header_bits) == 'I'
+    assert extra_slice_header_bits == {0: 1}
+    assert tscut.get_picture_coding_type(p, tscut.STREAM_TYPE_HEVC, extra_slice_header_bits) == 'P'
+    assert tscut.get_picture_coding_type(b, tscut.STREAM_TYPE_HEVC, extra_slice_header_bits) == 'B'
+
+
+@pytest.mark.parametrize('codec', ['mpeg2', 'h264', 'hevc'])
+def test_frame_types(codec, run_tscut, tmp_path, monkeypatch):
+    path = tmp_path / 'input.ts'
+    with open(path, 'wb') as f:
+        if codec == 'h264':
+            monkeypatch.setitem(tsgen.VIDEO_STREAM_TYPES, 'h264', tscut.STREAM_TYPE_H264)
+            H264Generator(f, codec='h264').run(DURATION)
+        else:
+            tsgen.TsGenerator(f, codec=codec).run(DURATION)
+    rows = run_tscut('frm', '--format', 'csv', path).splitlines()[1:]
+    assert [row.split(',')[3] for row in rows] == get_frame_types(15)
+
+
+def test_hevc_pps_before_range(make_ts, run_tscut, tmp_path, monkeypatch):
+    # The only PPS is in the first frame, so the workers of the later ranges start without one
+    monkeypatch.setattr(tscut, 'MIN_RANGE', 1024)
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=DURATION, codec='hevc', gop_size=1000))
+    for jobs in [1, 4]:
+        rows = run_tscut('frm', '--format', 'csv', '-j', jobs, path).splitlines()[1:]
+        assert [row.split(',')[3] for row in rows] == get_frame_types(1000)
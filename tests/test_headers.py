@@ -0,0 +1,43 @@
+import pytest
+
+import tscut
+
+
+@pytest.fixture
+def input_ts(make_ts, tmp_path):
+    data = make_ts(duration=5, packet_size=192)
+    assert len(data) // 192 > tscut.CHUNK_SIZE  # Several blocks
+    data[192 * 10 + 5] |= 0x80  # transport_error_indicator
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    return path
+
+
+def test_packet_headers(input_ts):
+    np = pytest.importorskip('numpy')
+    data = input_ts.read_bytes()
+    headers = tscut.PacketHeaders(np, data, 192)
+    ts_packets = [data[i + 4 : i + 192] for i in range(0, len(data), 192)]
+    for name in [
+        'sync_byte',
+        'transport_error_indicator',
+        'payload_unit_start_indicator',
+        'transport_priority',
+        'pid',
+        'transport_scrambling_control',
+        'adaptation_field_control',
+        'continuity_counter',
+    ]:
+        get = getattr(tscut, f'get_{name}')
+        assert getattr(headers, name).tolist() == [get(ts_packet) for ts_packet in ts_packets], name
+    assert headers.transport_error_indicator.sum() == 1
+
+
+def test_pid_pkt(input_ts, run_tscut, numpy_mode):
+    data = input_ts.read_bytes()
+    pids = [(data[i + 5] & 0x1F) << 8 | data[i + 6] for i in range(0, len(data), 192)]
+    counts = sorted((pid, pids.count(pid)) for pid in set(pids) if pid != 0x1FFF)
+    assert run_tscut('pid', input_ts) == ''.join(f'[0x{pid:04X}] {count:12d}\n' for pid, count in counts)
+
+    rows = run_tscut('pkt', '--format', 'csv', input_ts).splitlines()[1:]
+    assert rows == [f'{i * 192 + 4},{pid}' for i, pid in enumerate(pids)]
@@ -0,0 +1,24 @@
+import pytest
+
+STRAY_BYTES = b'\xa5\x5a\xa5\x5a\xa5'
+
+
+def test_index_frames(make_ts, run_tscut, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts())
+    scanned = run_tscut('frm', path)
+    run_tscut('index', path)
+    assert (tmp_path / 'input.ts.tsidx').exists()
+    assert run_tscut('frm', path) == scanned
+
+
+def test_index_skipped_bytes(make_ts, run_tscut, tmp_path):
+    data = make_ts()
+    pos = len(data) // 188 // 3 * 188
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data[:pos] + STRAY_BYTES + data[pos:])
+    scanned = run_tscut('frm', path)
+    with pytest.raises(ValueError, match='Not indexed'):
+        run_tscut('index', path)
+    assert not (tmp_path / 'input.ts.tsidx').exists()
+    assert run_tscut('frm', path) == scanned
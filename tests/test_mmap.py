@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import tscut
+
+
+def test_mapped_input(tmp_path):
+    data = bytes(range(256)) * 10
+    path = tmp_path / 'input.bin'
+    path.write_bytes(data)
+    with tscut.MappedInput(str(path)) as f:
+        assert f.seekable()
+        chunk = f.read(100)
+        assert isinstance(chunk, memoryview) and chunk == data[:100]
+        assert f.tell() == 100
+        assert f.seek(-10, os.SEEK_END) == len(data) - 10
+        assert f.read() == data[-10:]
+        assert f.read(10) == b''
+        assert f.seek(5, os.SEEK_SET) == 5 and f.seek(5, os.SEEK_CUR) == 10
+        assert f.read(5) == data[10:15]
+        del chunk
+
+
+def test_mapped_empty(tmp_path):
+    path = tmp_path / 'empty.ts'
+    path.write_bytes(b'')
+    with tscut.MappedInput(str(path)) as f:
+        assert f.read() == b''
+        assert f.seek(0, os.SEEK_END) == 0
+
+
+@pytest.mark.parametrize(
+    'argv',
+    [
+        ['pid'],
+        ['pkt', '--format', 'csv'],
+        ['frm'],
+        ['cut', '-r', '-s', 1, '-e', 2, 'OUT'],
+        ['cut', '-r', '-s', 0.5, '-e', 1, '-s', 2, '-e', 2.5, '--join', 'OUT'],
+        ['concat', 'INPUT', 'OUT'],
+    ],
+)
+def test_mmap_commands(make_ts, run_tscut, tmp_path, argv):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=3, packet_size=192))
+    results = []
+    for options, name in [([], 'output.ts'), (['--mmap'], 'mmap_output.ts')]:
+        command, *args = [path if arg == 'INPUT' else tmp_path / name if arg == 'OUT' else arg for arg in argv]
+        output = run_tscut(command, *options, path, *args)
+        results.append((output, (tmp_path / name).read_bytes() if 'OUT' in argv else None))
+    assert results[1] == results[0]
+    assert results[0][0] or results[0][1]
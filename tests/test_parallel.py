@@ -0,0 +1,110 @@
+import pytest
+
+import tscut
+import tsgen
+
+STRAY_BYTES = b'\xa5\x5a\xa5\x5a\xa5'
+JUNK = b'\xa5' * 400  # Longer than a packet
+RANGE = 1024  # Packets per worker range
+DURATION = 3
+
+
+@pytest.fixture(autouse=True)
+def small_ranges(monkeypatch):
+    """Split the short test files into several worker ranges."""
+    monkeypatch.setattr(tscut, 'MIN_RANGE', RANGE)
+
+
+class Input:
+    """ts file with bytes inserted between packets, and its packet counts and video frame offsets known from the
+    generated packets
+
+    A packet followed by inserted bytes instead of a sync byte is skipped.
+    """
+
+    def __init__(self, data, path, inserts):
+        packets = [data[i : i + 188] for i in range(0, len(data), 188)]
+        self.pid_counts = {}
+        self.frame_offsets = []
+        self.frame_packet_indices = []
+        self.num_skipped_bytes = 0
+        inserts = dict(inserts)  # Bytes inserted by packet index
+        chunks = []
+        offset = 0
+        for packet_idx, packet in enumerate(packets):
+            if packet_idx in inserts:
+                chunks.append(inserts[packet_idx])
+                offset += len(inserts[packet_idx])
+            chunks.append(packet)
+            offset += len(packet)
+            if packet_idx + 1 in inserts:
+                self.num_skipped_bytes += len(packet) + len(inserts[packet_idx + 1])
+                continue
+            pid = (packet[1] << 8 | packet[2]) & 0x1FFF
+            if pid != 0x1FFF:
+                self.pid_counts[pid] = self.pid_counts.get(pid, 0) + 1
+            if pid == tsgen.VIDEO_PID and packet[1] & 0x40:
+                self.frame_offsets.append(offset - len(packet))
+                self.frame_packet_indices.append(packet_idx)
+        self.path = path
+        path.write_bytes(b''.join(chunks))
+
+
+@pytest.fixture(params=['mpeg2', 'hevc'])
+def codec(request):
+    return request.param
+
+
+@pytest.fixture
+def make_input(make_ts, tmp_path, codec):
+    """Return a function writing a generated ts file with the given bytes inserted before packets, as an Input."""
+
+    def make_input(inserts=()):
+        return Input(make_ts(duration=DURATION, codec=codec), tmp_path / 'input.ts', inserts)
+
+    return make_input
+
+
+@pytest.fixture
+def stray_input(make_input, make_ts, codec):
+    """Input with stray bytes, and junk straddling the byte boundary of a worker range and of its first chunk"""
+    num_packets = len(make_ts(duration=DURATION, codec=codec)) // 188
+    size = num_packets * 188 + len(JUNK) + 2 * len(STRAY_BYTES)
+    _, bound = tscut.split_range(size // 188, 4)[1]  # Packet index of a range boundary
+    return make_input([(bound - 1, JUNK), (num_packets // 3, STRAY_BYTES), (num_packets * 3 // 4, STRAY_BYTES)])
+
+
+def get_rows(output):
+    return [[int(value) if value.isdigit() else value for value in row.split(',')] for row in output.splitlines()[1:]]
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_parallel_pid(stray_input, run_tscut, jobs):
+    rows = get_rows(run_tscut('pid', '--format', 'csv', '-j', jobs, stray_input.path))
+    assert dict(rows) == stray_input.pid_counts
+    assert tscut.stats.num_skipped_bytes == stray_input.num_skipped_bytes
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_parallel_frm(stray_input, run_tscut, jobs):
+    rows = get_rows(run_tscut('frm', '--format', 'csv', '-j', jobs, stray_input.path))
+    assert len(rows) >= int(DURATION * 30000 / 1001) - 1
+    assert [row[0] for row in rows] == stray_input.frame_offsets
+    assert all(row[3] in 'IPB' for row in rows)
+    assert tscut.stats.num_skipped_bytes == stray_input.num_skipped_bytes
+
+
+def test_parallel_index(make_input, run_tscut, tmp_path):
+    input = make_input()
+    for jobs, name in [(1, 'serial.tsidx'), (4, 'parallel.tsidx')]:
+        run_tscut('index', '-o', tmp_path / name, '-j', jobs, input.path)
+        frame_index = tscut.read_index(str(input.path), 188, str(tmp_path / name))
+        assert len(frame_index.frames) == int(DURATION * 30000 / 1001)
+        assert [frame.packet_idx for frame in frame_index.frames] == input.frame_packet_indices
+    assert (tmp_path / 'parallel.tsidx').read_bytes() == (tmp_path / 'serial.tsidx').read_bytes()
+
+
+def test_parallel_index_stray(stray_input, run_tscut, tmp_path):
+    with pytest.raises(ValueError, match='Not indexed'):
+        run_tscut('index', '-o', tmp_path / 'parallel.tsidx', '-j', 4, stray_input.path)
+    assert not (tmp_path / 'parallel.tsidx').exists()
@@ -0,0 +1,81 @@
+import pytest
+
+import tscut
+import tsgen
+
+
+@pytest.fixture
+def packets(make_ts):
+    data = make_ts(duration=1)
+    return [data[i : i + 188] for i in range(0, len(data), 188)]
+
+
+def get_section(packets, pid):
+    """Return the first section of a pid, which starts in its first packet."""
+    payload = tscut.get_payload(next(packet for packet in packets if tscut.get_pid(packet) == pid))
+    return payload[1 + payload[0] :]  # After the pointer_field
+
+
+def test_slots(packets):
+    section = get_section(packets, tsgen.PAT_PID)
+    for obj in [tscut.AdaptationField(packets[0], 4), tscut.Pes(packets[0], 4), tscut.Pat(section)]:
+        assert not hasattr(obj, '__dict__')
+
+
+def test_adaptation_field(packets):
+    pcr_packets = [packet for packet in packets if tscut.has_pcr(packet)]
+    assert pcr_packets
+    for packet in packets:
+        adaptation_field = tscut.get_adaptation_field(packet)
+        has_pcr = adaptation_field is not None and adaptation_field.pcr_flag == 1
+        assert tscut.has_pcr(packet) == has_pcr
+        if has_pcr:
+            base, ext = adaptation_field.pcr
+            assert base * 300 + ext == tscut.get_pcr(packet)
+            assert (adaptation_field.pcr_base, adaptation_field.pcr_ext) == (base, ext)
+            assert adaptation_field.opcr is None
+
+
+def test_lazy_decoding(packets):
+    # The fields are decoded from the packet when they are accessed, not when the view is made
+    packet = bytearray(next(packet for packet in packets if tscut.has_pcr(packet)))
+    adaptation_field = tscut.AdaptationField(packet, 4)
+    pes = tscut.Pes(packet, tscut.get_payload_offset(packet))
+    pts = pes.pts
+    packet[6] ^= 0x80  # PCR base bit 32
+    assert adaptation_field.pcr_base == tscut.get_pcr(packet) // 300
+    packet[tscut.get_payload_offset(packet) + 10] ^= 0x01  # PTS bit 22
+    assert pes.pts == pts ^ (1 << 22)
+    packet[5] &= ~0b00010000  # PCR_flag
+    assert adaptation_field.pcr is None and not tscut.has_pcr(packet)
+
+
+def test_pes(packets):
+    video = next(packet for packet in packets if tscut.get_pid(packet) == tsgen.VIDEO_PID)
+    pes = tscut.Pes(video, tscut.get_payload_offset(video))
+    assert pes.packet_start_code_prefix == 0x000001 and pes.stream_id == 0xE0
+    assert pes.pts - pes.dts == 3003  # The first I picture is displayed after the following P picture is decoded
+    assert bytes(pes.pes_packet_data_byte[:4]) == b'\x00\x00\x01\xb3'  # Sequence header
+
+    # A section is not taken for a PES header
+    pat = next(packet for packet in packets if tscut.get_pid(packet) == tsgen.PAT_PID)
+    pes = tscut.Pes(pat, tscut.get_payload_offset(pat))
+    assert pes.packet_start_code_prefix is None and pes.pts is None and pes.dts is None
+
+
+def test_pat_pmt(packets):
+    pat = tscut.Pat(get_section(packets, tsgen.PAT_PID))
+    assert pat.is_crc_valid() and (pat.program_numbers, pat.pids) == ([tsgen.PROGRAM_NUMBER], [tsgen.PMT_PID])
+    pmt = tscut.Pmt(get_section(packets, tsgen.PMT_PID))
+    assert pmt.is_crc_valid() and pmt.program_number == tsgen.PROGRAM_NUMBER and pmt.pcr_pid == tsgen.VIDEO_PID
+    assert pmt.elementary_pids == [tsgen.VIDEO_PID, tsgen.AUDIO_PID]
+    assert pmt.stream_types == [tscut.STREAM_TYPE_MPEG2_VIDEO, tsgen.STREAM_TYPE_AAC]
+
+
+def test_scan_objects(make_ts, run_tscut, tmp_path):
+    # frm makes a Pes per video PES header and no AdaptationField
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=2))
+    run_tscut('frm', path)
+    assert tscut.stats.num_pes == int(2 * 30000 / 1001)
+    assert tscut.stats.num_adaptation_fields == 0
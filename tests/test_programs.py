@@ -0,0 +1,48 @@
+import struct
+
+import tscut
+import tsgen
+
+MISSING_PMT_PID = 0x1001
+
+
+def add_missing_program(data):
+    """Rewrite the PATs with a second program whose PMT is never sent."""
+    pat = tsgen.make_section(
+        0x00,
+        1,
+        struct.pack('>HHHH', tsgen.PROGRAM_NUMBER, 0xE000 | tsgen.PMT_PID, 2, 0xE000 | MISSING_PMT_PID),
+    )
+    for pos in range(0, len(data), 188):
+        if (data[pos + 1] << 8 | data[pos + 2]) & 0x1FFF == tsgen.PAT_PID:
+            header = bytes([0x47, 0x40, 0x00, 0x10 | data[pos + 3] & 0x0F])
+            data[pos : pos + 188] = (header + b'\x00' + pat).ljust(188, b'\xff')
+    return data
+
+
+def test_find_programs_missing_pmt(make_ts, tmp_path):
+    data = add_missing_program(make_ts(duration=5))
+    path = tmp_path / 'input.ts'
+    path.write_bytes(data)
+    with open(path, 'rb') as f:
+        reader = tscut.PacketReader(f, 188)
+        programs = tscut.find_programs(reader)
+    assert [program[:3] for program in programs] == [
+        (tsgen.PROGRAM_NUMBER, tsgen.PMT_PID, tsgen.VIDEO_PID),
+        (2, MISSING_PMT_PID, None),
+    ]
+    # The PMT of the second program is waited for a few PAT repetitions, not to the end
+    assert reader.packet_idx < len(data) // 188 // 2
+
+
+def test_stream_cut_lookback_while_probing(make_ts, tmp_path, capsys):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(add_missing_program(make_ts(duration=5, gop_size=3)))
+    output = tmp_path / 'output.ts'
+    with open(path, 'rb') as tsi, open(output, 'wb') as tso:
+        tscut.stream_cut(tsi, tso, 188, 3, 4, True, lookback=1000)
+    # The packets read while waiting for the missing PMT are limited to the lookback buffer, which holds a GOP
+    assert 'Lookback buffer of 1000 packets overflowed' in capsys.readouterr().err
+    with tscut.TsFile(str(output)) as ts:
+        assert ts.probe.video_pid == tsgen.VIDEO_PID
+        assert [frame.picture_coding_type for frame in ts.frames()][0] == 'I'
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+import tscut
+
+
+class ShortReads(io.RawIOBase):
+    """Non-seekable input returning at most size bytes per read, like a pipe"""
+
+    def __init__(self, data, size):
+        self.data = memoryview(data)
+        self.size = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(self.size, len(b), len(self.data))
+        b[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+@pytest.mark.parametrize('packet_size', [188, 192])
+@pytest.mark.parametrize('chunk_size', [1, 7, tscut.CHUNK_SIZE])
+def test_packets(make_ts, packet_size, chunk_size):
+    data = bytes(make_ts(duration=1, packet_size=packet_size))
+    ts_offset = tscut.get_ts_offset(packet_size)
+    reader = tscut.PacketReader(io.BytesIO(data + b'\x47\x00'), packet_size, chunk_size=chunk_size)
+    num_packets = 0
+    for ts_packet in reader:
+        # A view of the 188-byte TS packet, without the ATS of a 192-byte packet
+        assert isinstance(ts_packet, memoryview)
+        assert reader.packet_idx == num_packets
+        assert reader.offset == num_packets * packet_size
+        assert ts_packet == data[reader.offset + ts_offset : reader.offset + packet_size]
+        num_packets += 1
+    # The partial packet at the end is not yielded
+    assert num_packets == len(data) // packet_size
+
+
+def test_blocks(make_ts):
+    data = bytes(make_ts(duration=1))
+    reader = tscut.PacketReader(io.BytesIO(data), 188, chunk_size=100)
+    blocks = []
+    for block in reader.blocks():
+        assert reader.block_offset == sum(len(block) for block in blocks)
+        assert len(block) <= 100 * 188 and len(block) % 188 == 0
+        blocks.append(bytes(block))
+    assert b''.join(blocks) == data
+
+
+@pytest.mark.parametrize('start, stop', [(0, None), (10, None), (10, 20), (30, 20), (0, 10**9)])
+def test_range(make_ts, start, stop):
+    data = bytes(make_ts(duration=1))
+    reader = tscut.PacketReader(io.BytesIO(data), 188, start, stop, chunk_size=7)
+    indices = [reader.packet_idx for _ in reader]
+    num_packets = len(data) // 188
+    assert indices == list(range(start, min(stop or num_packets, num_packets)))
+
+
+@pytest.mark.parametrize('read_size', [1, 100, 500, 65536])
+def test_short_reads(make_ts, read_size):
+    data = bytes(make_ts(duration=1, packet_size=192))
+    tsi = ShortReads(data, read_size)
+    packets = [bytes(ts_packet) for ts_packet in tscut.PacketReader(tsi, 192, chunk_size=3)]
+    assert packets == [data[i + 4 : i + 192] for i in range(0, len(data), 192)]
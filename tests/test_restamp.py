@@ -0,0 +1,61 @@
+import pytest
+
+import tscut
+
+np = pytest.importorskip('numpy')
+
+
+def get_timestamps(data, packet_size):
+    """Return the ATS, and the PCR base, PTS and DTS by packet index, of the packets."""
+    ats, pcrs, pts, dts = [], {}, {}, {}
+    ts_offset = tscut.get_ts_offset(packet_size)
+    for i in range(0, len(data) // packet_size):
+        packet = data[i * packet_size : (i + 1) * packet_size]
+        if packet_size == 192:
+            ats.append(int.from_bytes(packet[:4], 'big') & (tscut.ATS_WRAP - 1))
+        ts_packet = packet[ts_offset:]
+        if tscut.has_pcr(ts_packet):
+            pcrs[i] = tscut.decode_pcr(ts_packet, 6)[0]
+        offset = tscut.get_payload_offset(ts_packet)
+        if tscut.get_payload_unit_start_indicator(ts_packet) and offset is not None:
+            pes = tscut.Pes(ts_packet, offset)
+            if pes.pts is not None:
+                pts[i] = pes.pts
+            if pes.dts is not None:
+                dts[i] = pes.dts
+    return ats, pcrs, pts, dts
+
+
+@pytest.mark.parametrize('packet_size', [188, 192])
+@pytest.mark.parametrize('shift', [90000, -90000, tscut.PTS_WRAP - 45000])
+def test_restamp(make_ts, packet_size, shift):
+    data = make_ts(duration=2, packet_size=packet_size)
+    block = bytearray(data)
+    tscut.restamp_block(np, block, packet_size, shift)
+    packets = bytearray(data)
+    for pos in range(0, len(packets), packet_size):
+        packet = packets[pos : pos + packet_size]
+        tscut.restamp_packet(packet, packet_size, shift)
+        packets[pos : pos + packet_size] = packet
+    assert block == packets
+
+    ats, pcrs, pts, dts = get_timestamps(data, packet_size)
+    new_ats, new_pcrs, new_pts, new_dts = get_timestamps(block, packet_size)
+    assert new_ats == [(t + shift * 300) % tscut.ATS_WRAP for t in ats]
+    assert pcrs and new_pcrs == {i: (t + shift) % tscut.PTS_WRAP for i, t in pcrs.items()}
+    assert pts and new_pts == {i: (t + shift) % tscut.PTS_WRAP for i, t in pts.items()}
+    assert dts and new_dts == {i: (t + shift) % tscut.PTS_WRAP for i, t in dts.items()}
+
+
+def test_concat_restamp(make_ts, run_tscut, tmp_path, monkeypatch):
+    # The second input starts 100 s after the first one ends, so it is restamped
+    (tmp_path / 'a.ts').write_bytes(make_ts(duration=3))
+    (tmp_path / 'b.ts').write_bytes(make_ts(duration=3, base=100 * 90000))
+    run_tscut('concat', tmp_path / 'a.ts', tmp_path / 'b.ts', tmp_path / 'numpy.ts')
+    monkeypatch.setattr(tscut, 'import_numpy', lambda: None)
+    run_tscut('concat', tmp_path / 'a.ts', tmp_path / 'b.ts', tmp_path / 'python.ts')
+    assert (tmp_path / 'numpy.ts').read_bytes() == (tmp_path / 'python.ts').read_bytes()
+
+    with tscut.TsFile(str(tmp_path / 'numpy.ts')) as ts:
+        dts = [frame.dts for frame in ts.frames()]
+    assert max(b - a for a, b in zip(dts, dts[1:])) <= tscut.CONCAT_GAP + 3003
@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+import tscut
+import tsgen
+
+STRAY_BYTES = b'\xa5\x5a\xa5\x5a\xa5'
+
+
+@pytest.fixture
+def stray_ts(make_ts, tmp_path):
+    """Path of a ts file with stray bytes inserted after a third of its packets"""
+    data = make_ts()
+    pos = len(data) // 188 // 3 * 188
+    path = tmp_path / 'stray.ts'
+    path.write_bytes(data[:pos] + STRAY_BYTES + data[pos:])
+    return path
+
+
+@pytest.mark.parametrize('command', ['pkt', 'pid', 'prg', 'frm'])
+def test_skipped_bytes(stray_ts, run_tscut, numpy_mode, command):
+    run_tscut(command, stray_ts)
+    # The packet before the stray bytes, which is not followed by a sync byte, is skipped too
+    assert tscut.stats.num_skipped_bytes == 188 + len(STRAY_BYTES)
+
+
+@pytest.mark.parametrize('chunk_size', [19, 20, 21, 1000])
+def test_junk_at_chunk_boundary(make_ts, chunk_size):
+    data = make_ts(duration=1)
+    pos = 19 * 188 + 100  # Inside the last packet of the first chunk of 20 packets
+    data[pos:pos] = STRAY_BYTES
+    reader = tscut.PacketReader(io.BytesIO(bytes(data)), 188, chunk_size=chunk_size, resync=True)
+    offsets = [reader.offset for _ in reader]
+    assert 19 * 188 not in offsets
+    assert offsets[19] == 20 * 188 + len(STRAY_BYTES)
+    assert len(offsets) == len(data) // 188 - 1
+    assert reader.num_skipped_bytes == 188 + len(STRAY_BYTES)
+
+
+def test_frame_offsets(stray_ts, run_tscut, numpy_mode):
+    data = stray_ts.read_bytes()
+    rows = run_tscut('frm', '--format', 'csv', stray_ts).splitlines()[1:]
+    assert len(rows) == int(2 * 30000 / 1001)
+    for row in rows:
+        offset = int(row.split(',')[0])
+        # A video packet with a payload unit start
+        assert data[offset] == 0x47
+        assert (data[offset + 1] << 8 | data[offset + 2]) == 0x4000 | tsgen.VIDEO_PID
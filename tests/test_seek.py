@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+import tscut
+import tsgen
+
+SEGMENTS = [(-1, 2), (3.3, 7.9), (12, 12.5), (18, 30)]
+
+
+def assert_seek_is_linear(data, relative_time):
+    tsi = io.BytesIO(bytes(data))
+    segments = SEGMENTS
+    if not relative_time:
+        first = tscut.get_edge_timestamp(tsi, 188, False, tsgen.VIDEO_PID)[1] / 90000
+        segments = [(start + first, end + first) for start, end in segments]
+    unwrapper = tscut.get_pts_unwrapper(tsi, 188, tsgen.VIDEO_PID)
+    video_frames = tscut.scan_frames(tsi, 188, tsgen.VIDEO_PID)
+    expected = tscut.get_segment_cut_points(video_frames, segments, relative_time, unwrapper)
+    assert tscut.seek_segment_cut_points(tsi, 188, tsgen.VIDEO_PID, segments, relative_time) == expected
+
+
+@pytest.mark.parametrize('relative_time', [False, True])
+def test_seek(make_ts, relative_time):
+    assert_seek_is_linear(make_ts(duration=20), relative_time)
+
+
+@pytest.mark.parametrize('relative_time', [False, True])
+def test_seek_discontinuity(make_ts, relative_time):
+    # The PTS go back 10 s in the middle of the file
+    assert_seek_is_linear(make_ts(duration=10, base=900000) + make_ts(duration=10, base=0), relative_time)
+
+
+def test_probe_window(make_ts):
+    data = make_ts(duration=20)
+    tsi = io.BytesIO(bytes(data))
+    seeker = tscut.PtsSeeker(tsi, 188, tsgen.VIDEO_PID)
+    assert seeker.probe(len(data) // 188 // 2) is not None
+    # A probe reads a few windows, not SEEK_WINDOW packets
+    assert tsi.tell() < tscut.SEEK_WINDOW * 188 // 4 + len(data) // 2
+
+
+@pytest.mark.parametrize('relative_time', [False, True])
+def test_seek_wraparound(make_ts, relative_time):
+    # The PTS wrap around 10 s into the file
+    assert_seek_is_linear(make_ts(duration=20, base=tscut.PTS_WRAP - 10 * 90000), relative_time)
+
+
+@pytest.mark.parametrize('times', [['-r', '-s', 8, '-e', 15], ['-s', 2, '-e', 6]])
+def test_cut_wraparound(make_ts, run_tscut, tmp_path, times):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=20, base=tscut.PTS_WRAP - 10 * 90000))
+    run_tscut('cut', *times, path, tmp_path / 'seek.ts')
+    run_tscut('cut', '--linear', *times, path, tmp_path / 'linear.ts')
+    run_tscut('index', path)
+    run_tscut('cut', *times, path, tmp_path / 'indexed.ts')
+    seek = (tmp_path / 'seek.ts').read_bytes()
+    # The cut has the few seconds asked for, across or after the wraparound
+    assert 3 * 1000000 < len(seek) < 9 * 1000000
+    assert (tmp_path / 'linear.ts').read_bytes() == seek
+    assert (tmp_path / 'indexed.ts').read_bytes() == seek
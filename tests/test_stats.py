@@ -0,0 +1,24 @@
+import io
+
+import tscut
+import tsgen
+
+
+def test_section_units(make_ts, run_tscut, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts())
+    run_tscut('check', path)
+    assert tscut.stats.units[tsgen.PAT_PID]['units'] > 0
+    assert tscut.stats.units[tsgen.PMT_PID]['max_unit_size'] > 0
+    report = io.StringIO()
+    tscut.stats.report(report)
+    assert f'Units [0x{tsgen.PMT_PID:04X}]: units ' in report.getvalue()
+
+
+def test_frame_units(make_ts, run_tscut, tmp_path):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=1))
+    run_tscut('frm', path)
+    units = tscut.stats.units[tsgen.VIDEO_PID]
+    assert units['units'] == int(1 * 30000 / 1001)
+    assert 0 < units['collected_bytes'] < units['bytes']
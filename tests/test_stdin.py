@@ -0,0 +1,58 @@
+import io
+import sys
+
+import pytest
+
+import tscut
+
+
+class ChunkedRaw(io.RawIOBase):
+    """Pipe-like raw input returning its data in writes of the given sizes, then in writes of the last size"""
+
+    def __init__(self, data, sizes):
+        self.data = memoryview(data)
+        self.sizes = list(sizes)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        size = self.sizes.pop(0) if len(self.sizes) > 1 else self.sizes[0]
+        n = min(size, len(b), len(self.data))
+        b[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+@pytest.fixture
+def set_stdin(monkeypatch):
+    """Return a function making stdin read the given data in writes of the given sizes."""
+
+    def set_stdin(data, sizes):
+        monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BufferedReader(ChunkedRaw(data, sizes))))
+
+    return set_stdin
+
+
+def test_stdin_short_first_write(make_ts, run_tscut, set_stdin, tmp_path):
+    data = make_ts(duration=3, packet_size=192)
+    set_stdin(data, [500, 4096])
+    output = tmp_path / 'output.ts'
+    run_tscut('cut', '-r', '-s', 1, '-e', 2, '-', output)
+    assert tscut.detect_input_packet_size(str(output)) == 192
+    with tscut.TsFile(str(output)) as ts:
+        assert len(list(ts.frames())) > 0
+
+
+def test_stdin_head_read_again(make_ts, set_stdin):
+    data = bytes(make_ts(duration=1, packet_size=192))
+    set_stdin(data, [500, 4096])
+    assert tscut.detect_input_packet_size('-') == 192
+    with tscut.open_input('-') as f:
+        assert f.read(1000) + f.read() == data
+
+
+def test_stdin_undetected(set_stdin):
+    set_stdin(bytes(range(256)) * 64, [500])
+    with pytest.raises(ValueError, match='packet size of stdin'):
+        tscut.detect_input_packet_size('-')
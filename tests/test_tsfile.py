@@ -0,0 +1,91 @@
+import io
+
+import pytest
+
+import tscut
+import tsgen
+
+DURATION = 3
+NUM_FRAMES = int(DURATION * 30000 / 1001)
+
+
+@pytest.fixture(params=[188, 192])
+def input_ts(make_ts, tmp_path, request):
+    path = tmp_path / 'input.ts'
+    path.write_bytes(make_ts(duration=DURATION, packet_size=request.param))
+    return path
+
+
+def test_probe(input_ts):
+    data = input_ts.read_bytes()
+    with tscut.TsFile(str(input_ts)) as ts:
+        packet_size = ts.packet_size
+        assert ts.video_stream == (tsgen.VIDEO_PID, tscut.STREAM_TYPE_MPEG2_VIDEO)
+        assert ts.num_packets == len(data) // packet_size
+        assert list(ts.programs()) == [
+            (
+                tsgen.PROGRAM_NUMBER,
+                tsgen.PMT_PID,
+                [tsgen.VIDEO_PID, tsgen.AUDIO_PID],
+                [tscut.STREAM_TYPE_MPEG2_VIDEO, tsgen.STREAM_TYPE_AAC],
+            )
+        ]
+    assert data[tscut.get_ts_offset(packet_size) :: packet_size] == b'\x47' * (len(data) // packet_size)
+    assert ts.file is None
+
+
+def test_packets(input_ts, numpy_mode):
+    data = input_ts.read_bytes()
+    with tscut.TsFile(str(input_ts)) as ts:
+        ts_offset = tscut.get_ts_offset(ts.packet_size)
+        packets = [(offset, bytes(ts_packet)) for offset, ts_packet in ts.packets()]
+        assert [offset for offset, _ in packets] == list(range(ts_offset, len(data), ts.packet_size))
+        assert all(data[offset : offset + 188] == ts_packet for offset, ts_packet in packets)
+
+        offsets, pids = [], []
+        for block_offsets, block_pids in ts.packet_columns():
+            offsets += list(block_offsets)
+            pids += list(block_pids)
+        assert offsets == [offset for offset, _ in packets]
+        assert pids == [tscut.get_pid(ts_packet) for _, ts_packet in packets]
+
+        counts = {}
+        for pid in pids:
+            counts[pid] = counts.get(pid, 0) + 1
+        assert list(ts.pids()) == sorted(counts.items())
+        assert list(ts.pids(jobs=2)) == sorted(counts.items())
+
+
+def test_frames(input_ts, tmp_path):
+    with tscut.TsFile(str(input_ts)) as ts:
+        # A generator stopped early does not affect the next one
+        assert next(ts.frames()).picture_coding_type == 'I'
+        frames = [(f.packet_idx, f.pts, f.dts, f.picture_coding_type) for f in ts.frames()]
+        assert len(frames) == NUM_FRAMES
+        assert [frame[3] for frame in frames[:4]] == ['I', 'P', 'B', 'B']
+        assert [(f.packet_idx, f.pts, f.dts, f.picture_coding_type) for f in ts.frames(jobs=2)] == frames
+
+        ts.index()
+        assert (tmp_path / 'input.ts.tsidx').exists()
+        assert [(f.packet_idx, f.pts, f.dts, f.picture_coding_type) for f in ts.frames()] == frames
+
+
+def test_cut_concat(input_ts, run_tscut, tmp_path):
+    run_tscut('cut', '-r', '-s', 1, '-e', 2, input_ts, tmp_path / 'cut.ts')
+    run_tscut('concat', input_ts, input_ts, tmp_path / 'concat.ts')
+    with tscut.TsFile(str(input_ts)) as ts:
+        ts.cut(1, 2, str(tmp_path / 'api_cut.ts'), relative_time=True)
+        f = io.BytesIO()
+        ts.cut(1, 2, f, relative_time=True)
+        assert f.getvalue() == (tmp_path / 'cut.ts').read_bytes()
+
+        f = io.BytesIO()
+        with tscut.TsFile(str(input_ts)) as other:
+            ts.concat([other], f)
+        assert f.getvalue() == (tmp_path / 'concat.ts').read_bytes()
+        ts.concat([str(input_ts)], str(tmp_path / 'api_concat.ts'))
+
+        ts.cut_segments([(0.5, 1), (2, 2.5)], str(tmp_path / 'seg.ts'), relative_time=True)
+    assert (tmp_path / 'api_cut.ts').read_bytes() == (tmp_path / 'cut.ts').read_bytes()
+    assert (tmp_path / 'api_concat.ts').read_bytes() == (tmp_path / 'concat.ts').read_bytes()
+    assert (tmp_path / 'seg_1.ts').stat().st_size and (tmp_path / 'seg_2.ts').stat().st_size
@@ -2,10 +2,27 @@
 """TS editor"""
 
 import argparse
+import collections
+import contextlib
+import csv
+import functools
+import io
+import json
+import mmap
+import os
 import struct
+import sys
+import time
 
-# CHUNK_SIZE = 10000
+CHUNK_SIZE = 20000  # Packets per read
+COPY_SIZE = 1 << 30  # Bytes per copy_file_range() or sendfile() call
+COPY_BLOCK_SIZE = 1 << 23  # Bytes per read of a copy that cannot be done in the kernel
 TS_PACKET_SIZE = 188
+PACKET_SIZES = (188, 192, 204)  # TS, TS after a 4-byte ATS (BDAV), TS before 16 bytes of Reed-Solomon parity
+SYNC_PACKETS = 5  # Aligned sync bytes that confirm the packet boundaries when resyncing
+SYNC_WINDOW = 65536  # Bytes first searched for a sync, doubled until it is found
+DETECT_SIZE = 65536  # Bytes read from the head of an input to detect its packet size
+DETECT_MIN_RATIO = 0.5  # Minimum ratio of packets with a sync byte for a detected packet size
 
 STREAM_ID_PROGRAM_STREAM_MAP = 0b10111100
 STREAM_ID_PRIVATE_STREAM_1 = 0b10111101
@@ -29,6 +46,133 @@ STREAM_ID_METADATA_STREAM = 0b11111100
 STREAM_ID_EXTENDED_STREAM_ID = 0b11111101
 STREAM_ID_RESERVED_DATA_STREAM = 0b11111110
 STREAM_ID_PROGRAM_STREAM_DIRECTORY = 0b11111111
+STREAM_IDS_WITHOUT_PES_HEADER = (
+    STREAM_ID_PROGRAM_STREAM_MAP,
+    STREAM_ID_PADDING_STREAM,
+    STREAM_ID_PRIVATE_STREAM_2,
+    STREAM_ID_ECM_STREAM,
+    STREAM_ID_EMM_STREAM,
+    STREAM_ID_PROGRAM_STREAM_DIRECTORY,
+    STREAM_ID_DSMCC_STREAM,
+    STREAM_ID_TYPE_E_STREAM,
+)
+
+STREAM_TYPE_MPEG2_VIDEO = 0x02
+STREAM_TYPE_H264 = 0x1B
+STREAM_TYPE_HEVC = 0x24
+VIDEO_STREAM_TYPES = (STREAM_TYPE_MPEG2_VIDEO, STREAM_TYPE_H264, STREAM_TYPE_HEVC)
+
+START_CODE_PREFIX = b'\x00\x00\x01'
+PICTURE_START_CODE = b'\x00\x00\x01\x00'
+MPEG2_PICTURE_CODING_TYPES = {0b001: 'I', 0b010: 'P', 0b011: 'B'}
+H264_SLICE_TYPES = ('P', 'B', 'I', 'P', 'I')  # P, B, I, SP, SI
+HEVC_SLICE_TYPES = {0: 'B', 1: 'P', 2: 'I'}
+SLICE_HEADER_SIZE = 32  # Bytes read for the first fields of a slice header or a PPS
+
+
+class Stats:
+    """Counters of the work done, reported by --stats
+
+    Wrap work in phase() to time it. Hooks are called with the phase name and its wall time [s] at the end of each
+    phase, and snapshot() returns all the counters. Worker processes of -j are not counted.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        self.start = time.perf_counter()
+        self.phases = {}  # Wall time [s] by phase
+        self.num_bytes_read = 0
+        self.num_bytes_written = 0
+        self.num_packets = 0  # Packets read by PacketReader
+        self.num_skipped_bytes = 0  # Bytes skipped to resync by the scans (not by the probes of the same bytes)
+        self.num_pes = 0  # Pes objects
+        self.num_adaptation_fields = 0  # AdaptationField objects
+        self.units = {}  # Reassembly counters by pid
+
+    def add_units(self, pid, counters):
+        """Add the reassembly counters of a pid. The max_ counters keep their maximum."""
+        units = self.units.setdefault(pid, {})
+        for name, value in counters.items():
+            if name.startswith('max_'):
+                units[name] = max(units.get(name, 0), value)
+            else:
+                units[name] = units.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a phase of the work."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0) + seconds
+            for hook in self.hooks:
+                hook(name, seconds)
+
+    def timed(self, name):
+        """Decorate a function to time its calls as a phase."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self):
+        """Return the counters as a dict."""
+        seconds = time.perf_counter() - self.start
+        return {
+            'seconds': seconds,
+            'phases': dict(self.phases),
+            'bytes_read': self.num_bytes_read,
+            'bytes_written': self.num_bytes_written,
+            'packets': self.num_packets,
+            'packets_per_s': self.num_packets / seconds if seconds else 0,
+            'skipped_bytes': self.num_skipped_bytes,
+            'pes': self.num_pes,
+            'adaptation_fields': self.num_adaptation_fields,
+            'units': {f'0x{pid:04X}': dict(units) for pid, units in sorted(self.units.items())},
+            'peak_rss': get_peak_rss(),
+        }
+
+    def report(self, file=sys.stderr):
+        snapshot = self.snapshot()
+        seconds = snapshot['seconds']
+        print(f'Time: {seconds:.3f} s', file=file)
+        for name, phase_seconds in snapshot['phases'].items():
+            print(f'  {name}: {phase_seconds:.3f} s', file=file)
+        print(f'Read: {snapshot["bytes_read"]} bytes ({snapshot["bytes_read"] / seconds / 1e6:.2f} MB/s)', file=file)
+        print(f'Written: {snapshot["bytes_written"]} bytes', file=file)
+        print(f'Packets: {snapshot["packets"]} ({snapshot["packets_per_s"]:.0f} packets/s)', file=file)
+        print(f'Skipped: {snapshot["skipped_bytes"]} bytes', file=file)
+        print(f'Pes objects: {snapshot["pes"]}', file=file)
+        print(f'AdaptationField objects: {snapshot["adaptation_fields"]}', file=file)
+        for pid, units in snapshot['units'].items():
+            print(f'Units [{pid}]: ' + ', '.join(f'{name} {value}' for name, value in units.items()), file=file)
+        if snapshot['peak_rss'] is not None:
+            print(f'Peak memory: {snapshot["peak_rss"] / 1e6:.1f} MB', file=file)
+
+
+def get_peak_rss():
+    """Return the peak resident set size [bytes] of this process, or None if it is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024  # Kilobytes on Linux
+
+
+stats = Stats()
 
 
 def print_binaries(buffer, offset=0):
@@ -43,8 +187,435 @@ def print_binaries(buffer, offset=0):
         print(''.join([f'{b:c}' for b in buffer[i:j]]))
 
 
+def get_ts_offset(packet_size):
+    """Return the offset of the TS packet in a packet: 4 after the ATS of 192-byte packets, 0 otherwise."""
+    return 4 if packet_size == 192 else 0
+
+
 def get_ts_packet(packet, packet_size):
-    return packet[packet_size - TS_PACKET_SIZE :]
+    ts_offset = get_ts_offset(packet_size)
+    return packet[ts_offset : ts_offset + TS_PACKET_SIZE]
+
+
+class PacketReader:
+    """Chunked TS packet reader
+
+    Reads CHUNK_SIZE packets at a time and yields zero-copy memoryview slices of the TS packets (ATS stripped).
+
+    With resync, packets without a sync byte are skipped up to the next SYNC_PACKETS aligned sync bytes, and the
+    skipped bytes are counted in num_skipped_bytes, which the scans add to stats. packet_idx then counts the packets
+    read rather than indexing the packets of the file, while offset stays the byte offset in the file.
+    """
+
+    def __init__(self, tsi, packet_size, start=0, stop=None, chunk_size=CHUNK_SIZE, resync=False):
+        self.tsi = tsi
+        self.packet_size = packet_size
+        self.stop = stop  # Index of the packet to stop before
+        self.chunk_size = chunk_size
+        self.resync = resync
+        self.packet_idx = start - 1  # Index of the current packet
+        self.block_offset = start * packet_size  # Byte offset of the last block of blocks()
+        self.num_skipped_bytes = 0
+        self.__block = None
+        self.__block_idx = start
+        # Whether the next byte read is at a packet boundary. A resync from a packet index is checked with
+        # get_sync_offset(), as it may not be at a packet boundary after skipped bytes.
+        self.__is_synced = not (resync and start)
+        if tsi.seekable():
+            tsi.seek(start * packet_size)
+
+    @property
+    def offset(self):
+        """Byte offset of the current packet"""
+        return self.block_offset + (self.packet_idx - self.__block_idx) * self.packet_size
+
+    @property
+    def packet(self):
+        """Current packet including the ATS"""
+        pos = (self.packet_idx - self.__block_idx) * self.packet_size
+        return self.__block[pos : pos + self.packet_size]
+
+    def blocks(self):
+        """Yield blocks of whole packets."""
+        block_size = self.chunk_size * self.packet_size
+        if self.stop is None:
+            remaining = -1
+        else:
+            remaining = max(self.stop - self.__block_idx, 0) * self.packet_size
+
+        def read():
+            nonlocal remaining
+            if remaining < 0:
+                data = self.tsi.read(block_size)
+            else:
+                data = self.tsi.read(min(block_size, remaining))
+                remaining -= len(data)
+            stats.num_packets += len(data) // self.packet_size
+            return data
+
+        offset = self.block_offset  # Byte offset of data
+        rest = b''
+        held = None  # Offset and view of the last packet of a synced read, yielded once the next sync byte is read
+        for data in iter(read, b''):
+            if rest:
+                data = bytes(rest) + data
+            if held:
+                yield from self.__release(held, data)
+                held = None
+            if self.resync:
+                runs, size = self.__sync(data, False)
+                if self.__is_synced and runs and runs[-1][1] > runs[-1][0]:
+                    start, end = runs.pop()
+                    runs.append((start, end - self.packet_size))
+                    held = (offset + end - self.packet_size, memoryview(data)[end - self.packet_size : end])
+            else:
+                size = len(data) - len(data) % self.packet_size
+                runs = [(0, size)]
+            rest = data[size:]  # A truncated packet, completed by the next read if any
+            for start, end in runs:
+                if end > start:
+                    self.block_offset = offset + start
+                    yield memoryview(data)[start:end]
+            offset += size
+        if held:
+            yield from self.__release(held, rest)
+        if self.resync and rest:
+            for start, end in self.__sync(rest, True)[0]:
+                self.block_offset = offset + start
+                yield memoryview(rest)[start:end]
+
+    def __release(self, held, data):
+        """Yield the held packet if data, which follows it, starts with a sync byte or is too short to tell."""
+        ts_offset = get_ts_offset(self.packet_size)
+        if len(data) <= ts_offset or data[ts_offset] == 0x47:
+            self.block_offset = held[0]
+            yield held[1]
+        else:
+            # Likely truncated by the bytes that follow it
+            self.num_skipped_bytes += self.packet_size
+            self.__is_synced = False
+
+    def __sync(self, data, is_last):
+        """Find the runs of packets with sync bytes in data.
+
+        Returns a list of (start, end) byte ranges and the bytes of data used. The rest is kept for the next read
+        unless is_last. A packet followed by one without a sync byte is skipped too.
+        """
+        packet_size = self.packet_size
+        ts_offset = get_ts_offset(packet_size)
+        runs = []
+        pos = 0
+        while len(data) - pos >= packet_size:
+            if self.__is_synced:
+                end = len(data) - (len(data) - pos) % packet_size
+                sync_bytes = bytes(data[pos + ts_offset : end : packet_size])
+                num_packets = len(sync_bytes) - len(sync_bytes.lstrip(b'\x47'))
+                self.__is_synced = num_packets == len(sync_bytes)
+                if not self.__is_synced and num_packets:
+                    num_packets -= 1  # Not followed by a sync byte, so likely truncated
+                runs.append((pos, pos + num_packets * packet_size))
+                pos += num_packets * packet_size
+                continue
+
+            # Resync
+            num_packets = min(SYNC_PACKETS, (len(data) - pos) // packet_size) if is_last else SYNC_PACKETS
+            sync_pos = get_sync_offset(data, packet_size, num_packets, pos)
+            if sync_pos is None:
+                # Offsets not followed by enough data are searched again with the next read
+                sync_pos = len(data) if is_last else max(len(data) - ts_offset - (SYNC_PACKETS - 1) * packet_size, pos)
+            self.num_skipped_bytes += sync_pos - pos
+            self.__is_synced = sync_pos < len(data) - ts_offset - (num_packets - 1) * packet_size
+            pos = sync_pos
+            if not self.__is_synced:
+                break
+
+        return runs, pos
+
+    def __iter__(self):
+        packet_size = self.packet_size
+        ts_offset = get_ts_offset(packet_size)
+        for block in self.blocks():
+            self.__block = block
+            self.__block_idx = self.packet_idx + 1
+            for pos in range(0, len(block), packet_size):
+                self.packet_idx += 1
+                yield block[pos + ts_offset : pos + ts_offset + TS_PACKET_SIZE]
+
+
+class MappedInput:
+    """Memory-mapped input file
+
+    Has the subset of the file interface used by tscut. read() returns zero-copy memoryview slices of the mapping.
+    """
+
+    def __init__(self, path):
+        self.name = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.mm = None  # Empty files cannot be mapped
+        self.view = memoryview(self.mm if self.mm else b'')
+        self.pos = 0
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            pos += self.pos
+        elif whence == os.SEEK_END:
+            pos += len(self.view)
+        self.pos = max(pos, 0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size=-1):
+        start = min(self.pos, len(self.view))
+        end = len(self.view) if size is None or size < 0 else min(start + size, len(self.view))
+        self.pos = end
+        return self.view[start:end]
+
+    def close(self):
+        self.view.release()
+        if self.mm:
+            try:
+                self.mm.close()
+            except BufferError:
+                pass  # Slices are still referenced; the mapping is closed when they are released
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CountedFile:
+    """File wrapper counting the bytes read and written in stats"""
+
+    def __init__(self, f):
+        self.__f = f  # File or context manager of the file
+        self.file = None
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        stats.num_bytes_read += len(data)
+        return data
+
+    def write(self, data):
+        stats.num_bytes_written += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        self.file = self.__f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.__f.__exit__(*exc)
+
+
+class StdinInput:
+    """stdin whose head can be read ahead to detect the packet size, and is then read again"""
+
+    def __init__(self, f):
+        self.f = f
+        self.head = b''  # Bytes read ahead
+
+    def peek(self, size):
+        """Read ahead until size bytes or the end of the input, and return them."""
+        while len(self.head) < size:
+            data = self.f.read1(size - len(self.head))
+            if not data:
+                break
+            self.head += data
+        return self.head[:size]
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.f.read(size)
+
+        if size < 0:
+            data, self.head = self.head + self.f.read(), b''
+        else:
+            data, self.head = self.head[:size], self.head[size:]
+            if len(data) < size:
+                data += self.f.read(size - len(data))
+        return data
+
+    def seekable(self):
+        return False
+
+
+stdin_input = None  # StdinInput of sys.stdin
+
+
+def get_stdin_input():
+    """Return the StdinInput of sys.stdin."""
+    global stdin_input
+    if stdin_input is None or stdin_input.f is not sys.stdin.buffer:
+        stdin_input = StdinInput(sys.stdin.buffer)
+    return stdin_input
+
+
+def open_input(path, use_mmap=False):
+    """Open an input file, memory-mapped if requested, or stdin for '-'."""
+    if path == '-':
+        return CountedFile(contextlib.nullcontext(get_stdin_input()))
+    elif use_mmap:
+        return CountedFile(MappedInput(path))
+    else:
+        return CountedFile(open(path, 'rb'))
+
+
+def open_output(path):
+    """Open an output file, or stdout for '-'. A binary file object is used as is."""
+    if path == '-':
+        return CountedFile(contextlib.nullcontext(sys.stdout.buffer))
+    elif hasattr(path, 'write'):
+        return CountedFile(contextlib.nullcontext(path))
+    else:
+        return CountedFile(open(path, 'wb'))
+
+
+def copy_range(tsi, tso, offset, size):
+    """Copy size bytes at offset of tsi to tso, and leave tsi after them.
+
+    Files are copied in the kernel by os.copy_file_range(), which can share the blocks (reflink) on CoW filesystems, or
+    by os.sendfile(), e.g. to a pipe. Other inputs, such as memory-mapped ones, are copied in blocks, so the memory used
+    does not depend on size.
+    """
+    copied = 0
+    try:
+        in_fd, out_fd = tsi.fileno(), tso.fileno()
+    except (AttributeError, OSError, ValueError):
+        in_fd = out_fd = None
+    if in_fd is not None and tsi.seekable():
+        tso.flush()
+        copies = []
+        if hasattr(os, 'copy_file_range'):
+            copies.append(lambda n: os.copy_file_range(in_fd, out_fd, n, offset + copied))
+        if hasattr(os, 'sendfile'):
+            copies.append(lambda n: os.sendfile(out_fd, in_fd, offset + copied, n))
+        for copy in copies:
+            try:
+                while copied < size:
+                    n = copy(min(size - copied, COPY_SIZE))
+                    if n == 0:
+                        break  # End of file
+                    copied += n
+                break
+            except OSError:
+                continue  # Not supported by the files, the filesystem or the OS
+        if copied and tso.seekable():
+            tso.seek(os.lseek(out_fd, 0, os.SEEK_CUR))  # Sync the position of the buffered file
+        stats.num_bytes_read += copied
+        stats.num_bytes_written += copied
+
+    # Chunked copy of the rest
+    tsi.seek(offset + copied)
+    while copied < size:
+        data = tsi.read(min(size - copied, COPY_BLOCK_SIZE))
+        if not data:
+            break
+        tso.write(data)
+        copied += len(data)
+    tsi.seek(offset + copied)
+
+    return copied
+
+
+def get_sync_offset(data, packet_size, num_packets=SYNC_PACKETS, start=0):
+    """Find the offset of the first packet at or after start followed by aligned sync bytes, or None.
+
+    The search is vectorized with NumPy if it is installed.
+    """
+    ts_offset = get_ts_offset(packet_size)
+    span = (num_packets - 1) * packet_size  # From the first to the last sync byte
+    end = len(data) - ts_offset - span  # Offsets [start, end) can be checked
+    np = import_numpy()
+    if np:
+        is_sync = np.frombuffer(data, dtype=np.uint8) == 0x47
+    else:
+        data = bytes(data)
+    window = SYNC_WINDOW
+    while start < end:
+        stop = min(start + window, end)
+        if np:
+            found = is_sync[start + ts_offset : stop + ts_offset].copy()
+            for i in range(packet_size, span + 1, packet_size):
+                found &= is_sync[start + ts_offset + i : stop + ts_offset + i]
+            pos = int(found.argmax())
+            if found[pos]:
+                return start + pos
+        else:
+            pos = data.find(b'\x47', start + ts_offset, stop + ts_offset)
+            while pos >= 0:
+                if all(data[pos + i] == 0x47 for i in range(packet_size, span + 1, packet_size)):
+                    return pos - ts_offset
+                pos = data.find(b'\x47', pos + 1, stop + ts_offset)
+        start = stop
+        window *= 2
+
+    return None
+
+
+def detect_packet_size(data):
+    """Detect the packet size from the periodicity of the sync bytes in data, or return None."""
+    data = bytes(data)
+    best_packet_size = None
+    best_ratio = DETECT_MIN_RATIO
+    for packet_size in PACKET_SIZES:
+        num_packets = len(data) // packet_size
+        if num_packets < SYNC_PACKETS:
+            continue
+        size = num_packets * packet_size
+        ratio = max(data[pos:size:packet_size].count(0x47) for pos in range(packet_size)) / num_packets
+        if ratio > best_ratio:
+            best_packet_size = packet_size
+            best_ratio = ratio
+
+    return best_packet_size
+
+
+def detect_input_packet_size(path):
+    """Detect the packet size of an input file, or stdin for '-', from its head.
+
+    Returns None if the packet size of a file is unknown. For stdin, which cannot be read again with another packet
+    size, raises ValueError instead.
+    """
+    if path == '-':
+        packet_size = detect_packet_size(get_stdin_input().peek(DETECT_SIZE))  # Left to be read
+        if packet_size is None:
+            raise ValueError('The packet size of stdin is not detected: give it with -t')
+        return packet_size
+
+    with open(path, 'rb') as f:
+        return detect_packet_size(f.read(DETECT_SIZE))
+
+
+def set_packet_size(args):
+    """Set the packet size of a command to that of its inputs unless it is given by -t.
+
+    It is 188 if it cannot be detected in a file, and an error if it cannot be detected in stdin.
+    """
+    if getattr(args, 'packet_size', 0) is not None:
+        return
+
+    packet_sizes = set()
+    for infile in [args.infile] if hasattr(args, 'infile') else args.infiles:
+        try:
+            packet_sizes.add(detect_input_packet_size(infile) or TS_PACKET_SIZE)
+        except OSError:
+            pass  # Reported by the command
+    if len(packet_sizes) > 1:
+        raise ValueError(f'The inputs have different packet sizes: {sorted(packet_sizes)}')
+    args.packet_size = packet_sizes.pop() if packet_sizes else TS_PACKET_SIZE
 
 
 def get_sync_byte(ts_packet):
@@ -79,83 +650,220 @@ def get_continuity_counter(ts_packet):
     return ts_packet[3] & 0b00001111
 
 
+class PacketHeaders:
+    """TS packet header columns of a block of packets (NumPy)"""
+
+    def __init__(self, np, block, packet_size):
+        ts_offset = get_ts_offset(packet_size)
+        packets = np.frombuffer(block, dtype=np.uint8).reshape(-1, packet_size)
+        ts_packets = packets[:, ts_offset : ts_offset + TS_PACKET_SIZE]
+        self.ts_packets = ts_packets  # Bytes of the TS packets
+        self.sync_byte = ts_packets[:, 0]
+        self.transport_error_indicator = (ts_packets[:, 1] & 0b10000000) >> 7
+        self.payload_unit_start_indicator = (ts_packets[:, 1] & 0b01000000) >> 6
+        self.transport_priority = (ts_packets[:, 1] & 0b00100000) >> 5
+        self.pid = (ts_packets[:, 1].astype(np.uint16) & 0b00011111) << 8 | ts_packets[:, 2]
+        self.transport_scrambling_control = (ts_packets[:, 3] & 0b11000000) >> 6
+        self.adaptation_field_control = (ts_packets[:, 3] & 0b00110000) >> 4
+        self.continuity_counter = ts_packets[:, 3] & 0b00001111
+
+
+def import_numpy():
+    """Import NumPy on first use, or return None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
+def decode_pcr(data, pos):
+    """Decode the base [90 kHz] and the extension [27 MHz] of a PCR or OPCR at data[pos]."""
+    base = data[pos] << 25 | data[pos + 1] << 17 | data[pos + 2] << 9 | data[pos + 3] << 1 | data[pos + 4] >> 7
+    # Reserved
+    ext = (data[pos + 4] & 0b00000001) << 8 | data[pos + 5]
+    return base, ext
+
+
 class AdaptationField:
-    """Adaptation Field"""
-
-    def __init__(self, field):
-        self.adaptation_field_length = field[0]
-        self.random_access_indicator = None
-        self.pcr_flag = None
-        self.opcr_flag = None
-        self.pcr_base = None
-        self.pcr_ext = None
-        self.opcr_base = None
-        self.opcr_ext = None
-        if self.adaptation_field_length > 0:
-            # TODO
-            self.random_access_indicator = (field[1] & 0b01000000) >> 6
-            # TODO
-            self.pcr_flag = (field[1] & 0b00010000) >> 4
-            self.opcr_flag = (field[1] & 0b00001000) >> 3
-            # TODO
-            offset = 0
-            if self.pcr_flag == 1:
-                self.pcr_base = struct.unpack('>I', field[2:6])[0] << 1 | field[6] & 0b10000000 >> 7
-                # Reserved
-                self.pcr_ext = (field[6] & 0b00000001) << 8 | field[7]
-                offset += 6
-            if self.opcr_flag == 1:
-                self.opcr_base = (
-                    struct.unpack('>I', field[2 + offset : 6 + offset])[0] << 1 | field[6 + offset] & 0b10000000 >> 7
-                )
-                # Reserved
-                self.opcr_ext = (field[6 + offset] & 0b00000001) << 8 | field[7 + offset]
-                offset += 6
-            # TODO
+    """Adaptation Field
+
+    A view of the adaptation field at data[offset]. The fields are decoded when they are accessed.
+    """
+
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data, offset=0):
+        stats.num_adaptation_fields += 1
+        self.data = data
+        self.offset = offset
+
+    @property
+    def adaptation_field_length(self):
+        return self.data[self.offset]
+
+    def __flag(self, mask):
+        if self.data[self.offset] == 0:
+            return None
+        return 1 if self.data[self.offset + 1] & mask else 0
+
+    @property
+    def discontinuity_indicator(self):
+        return self.__flag(0b10000000)
+
+    @property
+    def random_access_indicator(self):
+        return self.__flag(0b01000000)
+
+    @property
+    def pcr_flag(self):
+        return self.__flag(0b00010000)
+
+    @property
+    def opcr_flag(self):
+        return self.__flag(0b00001000)
+
+    @property
+    def pcr(self):
+        """PCR base and extension, or None"""
+        if self.pcr_flag != 1:
+            return None
+        return decode_pcr(self.data, self.offset + 2)
+
+    @property
+    def opcr(self):
+        """OPCR base and extension, or None"""
+        if self.opcr_flag != 1:
+            return None
+        return decode_pcr(self.data, self.offset + (8 if self.pcr_flag else 2))
+
+    @property
+    def pcr_base(self):
+        pcr = self.pcr
+        return pcr and pcr[0]
+
+    @property
+    def pcr_ext(self):
+        pcr = self.pcr
+        return pcr and pcr[1]
+
+    @property
+    def opcr_base(self):
+        opcr = self.opcr
+        return opcr and opcr[0]
+
+    @property
+    def opcr_ext(self):
+        opcr = self.opcr
+        return opcr and opcr[1]
+
+
+def has_adaptation_field(ts_packet):
+    return ts_packet[3] & 0b00100000 != 0
+
+
+def has_pcr(ts_packet):
+    """Test the PCR flag of a TS packet without decoding its adaptation field."""
+    return ts_packet[3] & 0b00100000 != 0 and ts_packet[4] > 0 and ts_packet[5] & 0b00010000 != 0
+
+
+def get_pcr(ts_packet):
+    """Return the PCR [27 MHz] of a TS packet, or None."""
+    if not has_pcr(ts_packet):
+        return None
+    base, ext = decode_pcr(ts_packet, 6)
+    return base * 300 + ext
 
 
 def get_adaptation_field(ts_packet):
-    adaptation_field_control = get_adaptation_field_control(ts_packet)
-    if adaptation_field_control in (0b10, 0b11):
-        adaptation_field = AdaptationField(ts_packet[4:])
+    if has_adaptation_field(ts_packet):
+        adaptation_field = AdaptationField(ts_packet, 4)
     else:
         adaptation_field = None
 
     return adaptation_field
 
 
-def get_payload(ts_packet):
+def get_payload_offset(ts_packet):
+    """Return the offset of the payload in a TS packet, or None if it has no payload."""
     adaptation_field_control = get_adaptation_field_control(ts_packet)
-    if adaptation_field_control in (0b10, 0b11):
-        payload_offset = ts_packet[4] + 1
-    else:
-        payload_offset = 0
-    if adaptation_field_control in (0b01, 0b11):
-        payload = ts_packet[4 + payload_offset :]
+    if adaptation_field_control == 0b01:
+        return 4
+    elif adaptation_field_control == 0b11:
+        return 5 + ts_packet[4]
     else:
-        payload = None
+        return None
+
+
+def get_payload(ts_packet):
+    payload_offset = get_payload_offset(ts_packet)
+    if payload_offset is None:
+        return None
 
-    return payload
+    return ts_packet[payload_offset:]
 
 
 class Payload:
+    """Reassembly buffer of the PES packets or sections of a pid
+
+    Fragments are copied into a bytearray that is reused across units, and each unit is copied out once when the next
+    unit starts, instead of concatenating bytes on every packet. Fragments before the first unit start, the rest of a
+    unit started before the input, are dropped.
+    """
+
     def __init__(self):
-        self.buffer = b''
+        self.__buffer = bytearray()
+        self.__size = 0  # Bytes of the current unit in __buffer
+        self.__is_started = False  # Whether a unit start has been seen
         self.__payload = None
+        # Reassembly stats
+        self.num_units = 0
+        self.num_fragments = 0
+        self.num_bytes = 0
+        self.max_unit_size = 0
+
+    @property
+    def buffer(self):
+        """Current (incomplete) unit"""
+        with memoryview(self.__buffer) as view:
+            return view[: self.__size].tobytes()
+
+    def append(self, data):
+        end = self.__size + len(data)
+        self.__buffer[self.__size : end] = data
+        self.__size = end
+        self.num_fragments += 1
 
     def update(self, payload_unit_start_indicator, prev, next=None):
         if payload_unit_start_indicator == 1:
-            if self.buffer:
-                self.buffer += prev
+            if self.__size:
+                self.append(prev)
                 self.__payload = self.buffer
+                self.num_units += 1
+                self.num_bytes += self.__size
+                self.max_unit_size = max(self.max_unit_size, self.__size)
 
-            self.buffer = next
+            self.__size = 0
+            self.__is_started = True
+            self.append(next)
         else:
-            self.buffer += prev
+            if self.__is_started:
+                self.append(prev)
             self.__payload = None
 
         return self.__payload
 
+    def stats(self):
+        """Return the reassembly stats."""
+        return {
+            'units': self.num_units,
+            'fragments': self.num_fragments,
+            'bytes': self.num_bytes,
+            'max_unit_size': self.max_unit_size,
+            'max_buffer_size': len(self.__buffer),
+        }
+
 
 class Section(Payload):
     def __init__(self):
@@ -175,31 +883,92 @@ class Section(Payload):
             self.section = super().update(payload_unit_start_indicator, prev)
 
 
+def make_crc32_mpeg2_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+CRC32_MPEG2_TABLE = make_crc32_mpeg2_table()
+
+
+def crc32_mpeg2(data):
+    """Compute the CRC-32/MPEG-2 of data. It is 0 for a PSI section including its CRC_32."""
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ CRC32_MPEG2_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
 class Psi:
-    """Program Specific Information Table"""
+    """Program Specific Information Table
+
+    The header fields are decoded from the section when they are accessed.
+    """
+
+    __slots__ = ('section',)
 
     def __init__(self, section):
-        self.table_id = section[0]
-        self.section_syntax_indicator = (section[1] & 0b10000000) >> 7
-        # '0'
-        # reserved
-        self.section_length = struct.unpack('>H', section[1:3])[0] & 0b00001111_11111111
-        # 2 bytes
-        # reserved
-        self.version_number = (section[5] & 0b00111110) >> 1
-        self.current_next_indicator = section[5] & 0b00000001
-        self.section_number = section[6]
-        self.last_section_number = section[7]
-        # Some bytes
-        self.crc_32 = struct.unpack('>I', section[self.section_length - 1 : self.section_length + 3])[0]
+        self.section = section
+
+    @property
+    def table_id(self):
+        return self.section[0]
+
+    @property
+    def section_syntax_indicator(self):
+        return (self.section[1] & 0b10000000) >> 7
+
+    # '0'
+    # reserved
+
+    @property
+    def section_length(self):
+        return (self.section[1] & 0b00001111) << 8 | self.section[2]
+
+    # 2 bytes
+    # reserved
+
+    @property
+    def version_number(self):
+        return (self.section[5] & 0b00111110) >> 1
+
+    @property
+    def current_next_indicator(self):
+        return self.section[5] & 0b00000001
+
+    @property
+    def section_number(self):
+        return self.section[6]
+
+    @property
+    def last_section_number(self):
+        return self.section[7]
+
+    # Some bytes
+
+    @property
+    def crc_32(self):
+        section_length = self.section_length
+        return struct.unpack('>I', self.section[section_length - 1 : section_length + 3])[0]
+
+    def is_crc_valid(self):
+        """Return True if the section is complete and its CRC_32 matches."""
+        size = 3 + self.section_length
+        return self.section_length >= 9 and len(self.section) >= size and crc32_mpeg2(self.section[:size]) == 0
 
 
 class Pat(Psi):
     """Program Association Table"""
 
+    __slots__ = ('program_numbers', 'pids')
+
     def __init__(self, section):
         super().__init__(section)
-        self.transport_stream_id = struct.unpack('>H', section[3:5])[0]
 
         num_programs = (self.section_length - 9) // 4
         self.program_numbers = [[] for _ in range(num_programs)]
@@ -211,18 +980,18 @@ class Pat(Psi):
             # network_pid if program_numbers[i] == 0, program_map_pid otherwise
             self.pids[i] = struct.unpack('>H', section[10 + i_4 : 12 + i_4])[0] & 0b00011111_11111111
 
+    @property
+    def transport_stream_id(self):
+        return struct.unpack('>H', self.section[3:5])[0]
+
 
 class Pmt(Psi):
     """Program Mapping Table"""
 
+    __slots__ = ('descriptor', 'stream_types', 'elementary_pids', 'es_info_length', 'stream_descriptors')
+
     def __init__(self, section):
         super().__init__(section)
-        self.program_number = struct.unpack('>H', section[3:5])[0]
-
-        # reserved
-        self.pcr_pid = struct.unpack('>H', section[8:10])[0] & 0b00011111_11111111
-        # reserved
-        self.program_info_length = struct.unpack('>H', section[10:12])[0] & 0b00001111_11111111
 
         pos = 12
         self.descriptor = []
@@ -236,7 +1005,8 @@ class Pmt(Psi):
         self.es_info_length = []
         self.stream_descriptors = []
         i = 0
-        while pos < self.section_length - 1:
+        section_length = self.section_length
+        while pos < section_length - 1:
             self.stream_types += [section[pos]]
             # reserved
             self.elementary_pids += [struct.unpack('>H', section[pos + 1 : pos + 3])[0] & 0b00011111_11111111]
@@ -252,519 +1022,2545 @@ class Pmt(Psi):
             pos = pos_2
             i += 1
 
+    @property
+    def program_number(self):
+        return struct.unpack('>H', self.section[3:5])[0]
+
+    # reserved
+
+    @property
+    def pcr_pid(self):
+        return struct.unpack('>H', self.section[8:10])[0] & 0b00011111_11111111
+
+    # reserved
+
+    @property
+    def program_info_length(self):
+        return struct.unpack('>H', self.section[10:12])[0] & 0b00001111_11111111
+
+
+def decode_timestamp(data, pos):
+    """Decode a 33-bit PTS or DTS [90 kHz] at data[pos]."""
+    # '001x' or '0001'
+    # marker_bits
+    return (
+        (data[pos] & 0b00001110) << 29
+        | data[pos + 1] << 22
+        | (data[pos + 2] & 0b11111110) << 14
+        | data[pos + 3] << 7
+        | data[pos + 4] >> 1
+    )
+
 
 class Pes:
-    """Packetized Elementary Stream"""
+    """Packetized Elementary Stream
+
+    A view of the PES packet (or its head) at data[offset]. The fields are decoded when they are accessed, and
+    get_payload_offset() gives the offset of a PES header in a TS packet without copying its payload.
+    """
+
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data, offset=0):
+        stats.num_pes += 1
+        self.data = data
+        self.offset = offset
+
+    @property
+    def packet_start_code_prefix(self):
+        data, offset = self.data, self.offset
+        if data[offset] == 0x00 and data[offset + 1] == 0x00 and data[offset + 2] == 0x01:
+            return 0x000001
+        return None
+
+    @property
+    def stream_id(self):
+        if not self.packet_start_code_prefix:
+            return None
+        return self.data[self.offset + 3]
+
+    @property
+    def pes_packet_length(self):
+        if not self.packet_start_code_prefix:
+            return None
+        return self.data[self.offset + 4] << 8 | self.data[self.offset + 5]
+
+    def has_header(self):
+        """Return True if the PES packet has the optional PES header."""
+        stream_id = self.stream_id
+        return stream_id is not None and stream_id not in STREAM_IDS_WITHOUT_PES_HEADER
+
+    # TODO
+
+    @property
+    def pts_dts_flags(self):
+        if not self.has_header():
+            return None
+        return (self.data[self.offset + 7] & 0b11000000) >> 6
+
+    # TODO
+
+    @property
+    def pes_header_data_length(self):
+        if not self.has_header():
+            return None
+        return self.data[self.offset + 8]
+
+    @property
+    def pts(self):
+        if self.pts_dts_flags not in (0b10, 0b11):
+            return None
+        return decode_timestamp(self.data, self.offset + 9)
+
+    @property
+    def dts(self):
+        if self.pts_dts_flags != 0b11:
+            return None
+        return decode_timestamp(self.data, self.offset + 14)
+
+    # TODO
+
+    @property
+    def pes_packet_data_byte(self):
+        if not self.has_header():
+            return None
+        return self.data[self.offset + 9 + self.data[self.offset + 8] :]
+
+
+class BitReader:
+    """Bit reader of an H.264/HEVC NAL unit payload with the emulation prevention bytes removed"""
+
+    def __init__(self, data):
+        self.data = bytes(data).replace(b'\x00\x00\x03', b'\x00\x00')
+        self.pos = 0
+
+    def u(self, n):
+        """Read an n-bit unsigned integer."""
+        value = 0
+        for _ in range(n):
+            value = (value << 1) | ((self.data[self.pos >> 3] >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def ue(self):
+        """Read an Exp-Golomb-coded unsigned integer."""
+        leading_zero_bits = 0
+        while self.u(1) == 0:
+            leading_zero_bits += 1
+        return (1 << leading_zero_bits) - 1 + self.u(leading_zero_bits)
+
+
+def iter_nal_units(pes_stream):
+    """Yield the positions of the NAL unit headers in a byte stream."""
+    i = pes_stream.find(START_CODE_PREFIX)
+    while i >= 0:
+        i += len(START_CODE_PREFIX)
+        yield i
+        i = pes_stream.find(START_CODE_PREFIX, i)
+
+
+def get_mpeg2_picture_coding_type(pes_stream):
+    i = pes_stream.find(PICTURE_START_CODE)
+    if i < 0 or i + 5 >= len(pes_stream):
+        return None
+
+    return MPEG2_PICTURE_CODING_TYPES.get((pes_stream[i + 5] & 0b00111000) >> 3)
+
+
+def get_h264_picture_coding_type(pes_stream):
+    """Read the slice_type of the first slice."""
+    for i in iter_nal_units(pes_stream):
+        if i >= len(pes_stream):
+            break
+        nal_unit_type = pes_stream[i] & 0x1F
+        if nal_unit_type == 5:
+            return 'I'  # IDR picture
+        if nal_unit_type == 1:
+            bits = BitReader(pes_stream[i + 1 : i + 1 + SLICE_HEADER_SIZE])
+            try:
+                bits.ue()  # first_mb_in_slice
+                return H264_SLICE_TYPES[bits.ue() % 5]
+            except IndexError:
+                return None
+
+    return None
+
+
+def get_hevc_picture_coding_type(pes_stream, extra_slice_header_bits=None):
+    """Read the slice_type of the first slice segment.
+
+    extra_slice_header_bits maps a PPS id to its num_extra_slice_header_bits and is updated with the PPS found.
+    """
+    if extra_slice_header_bits is None:
+        extra_slice_header_bits = {}
+    for i in iter_nal_units(pes_stream):
+        if i + 1 >= len(pes_stream):
+            break
+        nal_unit_type = (pes_stream[i] >> 1) & 0x3F
+        if 16 <= nal_unit_type <= 23:
+            return 'I'  # IRAP picture
+        if nal_unit_type == 34:
+            # Picture parameter set
+            bits = BitReader(pes_stream[i + 2 : i + 2 + SLICE_HEADER_SIZE])
+            try:
+                pps_id = bits.ue()
+                bits.ue()  # pps_seq_parameter_set_id
+                bits.u(2)  # dependent_slice_segments_enabled_flag, output_flag_present_flag
+                extra_slice_header_bits[pps_id] = bits.u(3)
+            except IndexError:
+                pass
+        elif nal_unit_type <= 9:
+            bits = BitReader(pes_stream[i + 2 : i + 2 + SLICE_HEADER_SIZE])
+            try:
+                if bits.u(1) == 0:
+                    continue  # Not the first slice segment of the picture
+                pps_id = bits.ue()
+                if pps_id not in extra_slice_header_bits:
+                    return None
+                bits.u(extra_slice_header_bits[pps_id])  # slice_reserved_flag
+                return HEVC_SLICE_TYPES.get(bits.ue())
+            except IndexError:
+                return None
+
+    return None
+
+
+def get_picture_coding_type(pes_stream, stream_type=STREAM_TYPE_MPEG2_VIDEO, extra_slice_header_bits=None):
+    """Return the picture coding type ('I', 'P' or 'B') of a video PES payload, or None if it is not found."""
+    if stream_type == STREAM_TYPE_H264:
+        return get_h264_picture_coding_type(pes_stream)
+    elif stream_type == STREAM_TYPE_HEVC:
+        return get_hevc_picture_coding_type(pes_stream, extra_slice_header_bits)
+    else:
+        return get_mpeg2_picture_coding_type(pes_stream)
+
+
+class Frame:
+    """Video frame (one video PES)"""
+
+    def __init__(self, packet_idx, end_idx, pts, dts, pcr, picture_coding_type, offset=None):
+        self.packet_idx = packet_idx  # Packet with the PES header
+        self.end_idx = end_idx  # Packet with the next PES header, exclusive end of the frame
+        self.pts = pts
+        self.dts = dts
+        self.pcr = pcr  # The last PCR before the PES header
+        self.picture_coding_type = picture_coding_type
+        self.offset = offset  # Byte offset of the packet with the PES header in the file
+
+
+class FrameScanner:
+    """Video frame scanner
+
+    Feed every packet to update(), which returns a Frame once the next video PES header shows that a frame is complete.
+    Each PES header is parsed once, and only the head of the PES payload is collected until its picture coding type is
+    found. The rest of the PES is skipped without copying.
+    """
+
+    def __init__(self, video_pid, pcr_pid=None, stream_type=STREAM_TYPE_MPEG2_VIDEO):
+        self.video_pid = video_pid
+        self.pcr_pid = pcr_pid
+        self.stream_type = stream_type
+        self.extra_slice_header_bits = {}  # num_extra_slice_header_bits by HEVC PPS id
+        self.pcr = None
+        self.__pes = None  # Header of the current PES: packet_idx, pts, dts, pcr, offset
+        self.__head = bytearray()  # Head of the current PES payload
+        self.__picture_coding_type = None
+        self.__size = 0  # Bytes of the current PES payload
+        # Scan stats
+        self.num_units = 0
+        self.num_bytes = 0
+        self.num_collected_bytes = 0
+        self.max_unit_size = 0
+
+    def update(self, ts_packet, packet_idx, offset=None):
+        pid = get_pid(ts_packet)
+        if pid == self.pcr_pid and has_pcr(ts_packet):
+            self.pcr = get_pcr(ts_packet)
+        if pid != self.video_pid:
+            return None
+
+        # Video PES
+        frame = None
+        if get_payload_unit_start_indicator(ts_packet) == 1:
+            if self.__size and self.__pes:
+                frame = self.__frame(packet_idx)
+            video_pes = Pes(ts_packet, get_payload_offset(ts_packet))
+            self.__pes = (packet_idx, video_pes.pts, video_pes.dts, self.pcr, offset)
+            self.__head.clear()
+            self.__picture_coding_type = None
+            self.__size = 0
+            payload = video_pes.pes_packet_data_byte
+        else:
+            payload = get_payload(ts_packet)
+        if payload:
+            self.__collect(payload)
 
-    def __init__(self, pes_payload):
-        self.packet_start_code_prefix = (
-            pes_payload[0] << 16 | pes_payload[1] << 8 | pes_payload[2] if 0x000001 else None
+        return frame
+
+    def flush(self, end_idx):
+        """Return the last frame, which has no following PES header."""
+        if not self.__pes:
+            return None
+
+        frame = self.__frame(end_idx)
+        self.__pes = None
+
+        return frame
+
+    def __collect(self, data):
+        self.__size += len(data)
+        if self.__pes is None or self.__picture_coding_type is not None:
+            return
+
+        # Rescan only the bytes that may hold a start code or a header cut off by the end of the previous head
+        start = max(len(self.__head) - SLICE_HEADER_SIZE - 8, 0)
+        self.__head += data
+        self.num_collected_bytes += len(data)
+        self.__picture_coding_type = get_picture_coding_type(
+            self.__head[start:], self.stream_type, self.extra_slice_header_bits
         )
-        self.stream_id = None
-        self.pes_packet_length = None
-        self.pts_dts_flags = None
-        self.pes_header_data_length = None
-        self.pts = None
-        self.dts = None
-        self.pes_packet_data_byte = None
-        if self.packet_start_code_prefix:
-            self.stream_id = pes_payload[3]
-            self.pes_packet_length = struct.unpack('>H', pes_payload[4:6])[0]
-            if self.stream_id not in (
-                STREAM_ID_PROGRAM_STREAM_MAP,
-                STREAM_ID_PADDING_STREAM,
-                STREAM_ID_PRIVATE_STREAM_2,
-                STREAM_ID_ECM_STREAM,
-                STREAM_ID_EMM_STREAM,
-                STREAM_ID_PROGRAM_STREAM_DIRECTORY,
-                STREAM_ID_DSMCC_STREAM,
-                STREAM_ID_TYPE_E_STREAM,
-            ):
-                # TODO
-                self.pts_dts_flags = (pes_payload[7] & 0b11000000) >> 6
-                # TODO
-                self.pes_header_data_length = pes_payload[8]
-                if self.pts_dts_flags in (0b10, 0b11):
-                    # '001x'
-                    pts_32 = pes_payload[9] & 0b00001110
-                    # marker_bit
-                    pts_29 = struct.unpack('>H', pes_payload[10:12])[0] & 0b11111111_11111110
-                    # marker_bit
-                    pts_14 = struct.unpack('>H', pes_payload[12:14])[0] & 0b11111111_11111110
-                    # marker_bit
-                    self.pts = pts_32 << 29 | pts_29 << 14 | pts_14 >> 1
-                    if self.pts_dts_flags == 0b11:
-                        # '0001'
-                        dts_32 = pes_payload[14] & 0b00001110
-                        # marker_bit
-                        dts_29 = struct.unpack('>H', pes_payload[15:17])[0] & 0b11111111_11111110
-                        # marker_bit
-                        dts_14 = struct.unpack('>H', pes_payload[17:19])[0] & 0b11111111_11111110
-                        # marker_bit
-                        self.dts = dts_32 << 29 | dts_29 << 14 | dts_14 >> 1
-                # TODO
-                self.pes_packet_data_byte = pes_payload[9 + self.pes_header_data_length :]
-                # TODO
-
-
-class Stream(Payload):
-    def __init__(self):
-        super().__init__()
-        self.stream = None
 
-    def update(self, ts_packet):
-        payload_unit_start_indicator = get_payload_unit_start_indicator(ts_packet)
-        payload = get_payload(ts_packet)
-        if payload_unit_start_indicator == 1:
-            prev = b''
-            next = Pes(payload).pes_packet_data_byte
-            self.stream = super().update(payload_unit_start_indicator, prev, next)
+    def __frame(self, end_idx):
+        self.num_units += 1
+        self.num_bytes += self.__size
+        self.max_unit_size = max(self.max_unit_size, self.__size)
+
+        packet_idx, pts, dts, pcr, offset = self.__pes
+        return Frame(packet_idx, end_idx, pts, dts, pcr, self.__picture_coding_type, offset)
+
+    def stats(self):
+        """Return the scan stats."""
+        return {
+            'units': self.num_units,
+            'bytes': self.num_bytes,
+            'collected_bytes': self.num_collected_bytes,
+            'max_unit_size': self.max_unit_size,
+        }
+
+
+def scan_frames(tsi, packet_size, video_pid, pcr_pid=None, start=0, stream_type=STREAM_TYPE_MPEG2_VIDEO, resync=False):
+    """Yield the video frames from the start packet onward.
+
+    With resync, the packet indices of the frames are those of PacketReader with resync.
+    """
+    reader = PacketReader(tsi, packet_size, start, resync=resync)
+    scanner = FrameScanner(video_pid, pcr_pid, stream_type)
+    for ts_packet in reader:
+        frame = scanner.update(ts_packet, reader.packet_idx, reader.offset)
+        if frame:
+            yield frame
+
+    frame = scanner.flush(reader.packet_idx + 1)
+    if frame:
+        yield frame
+    stats.num_skipped_bytes += reader.num_skipped_bytes
+    stats.add_units(video_pid, scanner.stats())
+
+
+def scan_extra_slice_header_bits(tsi, packet_size, video_pid, stop):
+    """Return the num_extra_slice_header_bits by HEVC PPS id, from the first PPS in the packets [0, stop)."""
+    reader = PacketReader(tsi, packet_size, 0, stop, resync=True)
+    scanner = FrameScanner(video_pid, stream_type=STREAM_TYPE_HEVC)
+    for ts_packet in reader:
+        scanner.update(ts_packet, reader.packet_idx)
+        if scanner.extra_slice_header_bits:
+            break
+
+    return scanner.extra_slice_header_bits
+
+
+def split_range(num_packets, jobs):
+    """Split the packets [0, num_packets) into ranges for jobs worker processes."""
+    num_ranges = max(min(jobs * 4, num_packets // MIN_RANGE), 1)
+    bounds = [num_packets * i // num_ranges for i in range(num_ranges + 1)]
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class RangeCounter:
+    """Packets and skipped bytes of a worker range [start, stop) scanned by a resyncing PacketReader
+
+    The range has the packets starting before the byte offset of stop, and the reader reads on into the next range.
+    The bytes skipped before the first packet of a range are counted by the previous range, which reads up to that
+    packet, so that the ranges add up to a serial scan.
+    """
+
+    def __init__(self, reader, start, stop):
+        self.reader = reader
+        self.start_offset = start * reader.packet_size
+        self.stop_offset = stop * reader.packet_size
+        self.first_offset = 0 if start == 0 else None  # Offset from which the skipped bytes are counted
+        self.end_offset = None  # Offset of the first packet after the range
+        self.num_packets = 0
+
+    def update_block(self, offset, num_packets):
+        """Count a run of packets at offset [bytes], and return how many of them are in the range."""
+        packet_size = self.reader.packet_size
+        n = min(max(-(-(self.stop_offset - offset) // packet_size), 0), num_packets)
+        if n and self.first_offset is None:
+            self.first_offset = offset
+        self.num_packets += n
+        if n < num_packets and self.end_offset is None:
+            self.end_offset = offset + n * packet_size
+        return n
+
+    def update(self, offset):
+        """Count a packet at offset [bytes], and return whether it is in the range."""
+        return self.update_block(offset, 1) == 1
+
+    @property
+    def num_skipped_bytes(self):
+        if self.first_offset is None:
+            return 0  # Counted by the previous range
+        elif self.end_offset is not None:
+            return self.end_offset - self.first_offset - self.num_packets * self.reader.packet_size
         else:
-            prev = payload
-            self.stream = super().update(payload_unit_start_indicator, prev)
+            # Read to the end of the file
+            return self.reader.num_skipped_bytes - (self.first_offset - self.start_offset)
+
+
+def scan_frames_range(
+    path,
+    use_mmap,
+    packet_size,
+    video_pid,
+    pcr_pid,
+    start,
+    stop,
+    stream_type=STREAM_TYPE_MPEG2_VIDEO,
+    resync=False,
+    extra_slice_header_bits=None,
+):
+    """Scan the frames whose PES header is in the packets [start, stop) (worker process).
+
+    The last frame is completed from the packets after stop. Returns the frames as tuples, the last PCR before stop,
+    and the number of packets and skipped bytes of the range. Frames before the first PCR in the range have no PCR.
+    With resync, the range has the packets starting before the byte offset of stop (see RangeCounter).
+    extra_slice_header_bits holds the HEVC PPS found before the range.
+    """
+    video_frames = []
+    pcr = None
+    with open_input(path, use_mmap) as tsi:
+        reader = PacketReader(tsi, packet_size, start, resync=resync)
+        counter = RangeCounter(reader, start, stop) if resync else None
+        scanner = FrameScanner(video_pid, pcr_pid, stream_type)
+        scanner.extra_slice_header_bits.update(extra_slice_header_bits or {})
+        for ts_packet in reader:
+            frame = scanner.update(ts_packet, reader.packet_idx, reader.offset)
+            if frame:
+                video_frames.append(frame)
+            if counter.update(reader.offset) if counter else reader.packet_idx < stop:
+                pcr = scanner.pcr
+            elif get_pid(ts_packet) == video_pid and get_payload_unit_start_indicator(ts_packet) == 1:
+                break
+        else:
+            frame = scanner.flush(reader.packet_idx + 1)
+            if frame:
+                video_frames.append(frame)
+
+    records = [(f.packet_idx, f.end_idx, f.pts, f.dts, f.pcr, f.picture_coding_type, f.offset) for f in video_frames]
+    if counter:
+        return records, pcr, counter.num_packets, counter.num_skipped_bytes
+    else:
+        return records, pcr, stop - start, 0
+
+
+def parallel_scan_frames(
+    path, use_mmap, packet_size, video_pid, pcr_pid, jobs, stream_type=STREAM_TYPE_MPEG2_VIDEO, resync=False
+):
+    """Yield the video frames like scan_frames(), scanning ranges of the file in jobs worker processes.
+
+    With resync, the packet indices are those of a serial scan with resync. The HEVC slice headers of the ranges are
+    parsed with the PPS at the head of the file, as the workers start after it.
+    """
+    import concurrent.futures
+
+    num_packets = os.stat(path).st_size // packet_size
+    ranges = split_range(num_packets, jobs)
+    extra_slice_header_bits = None
+    if stream_type == STREAM_TYPE_HEVC:
+        with open_input(path, use_mmap) as tsi:
+            extra_slice_header_bits = scan_extra_slice_header_bits(tsi, packet_size, video_pid, ranges[0][1])
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(
+                scan_frames_range,
+                path,
+                use_mmap,
+                packet_size,
+                video_pid,
+                pcr_pid,
+                start,
+                stop,
+                stream_type,
+                resync,
+                extra_slice_header_bits,
+            )
+            for start, stop in ranges
+        ]
+        pcr = None  # The last PCR before the range
+        packet_idx = 0  # Index of the first packet of the range in a serial scan
+        for (start, _), future in zip(ranges, futures):
+            records, range_pcr, range_packets, range_skipped_bytes = future.result()
+            for record in records:
+                frame = Frame(*record)
+                frame.packet_idx += packet_idx - start
+                frame.end_idx += packet_idx - start
+                if frame.pcr is None:
+                    frame.pcr = pcr
+                yield frame
+            if range_pcr is not None:
+                pcr = range_pcr
+            packet_idx += range_packets
+            stats.num_skipped_bytes += range_skipped_bytes
+
+
+@stats.timed('scan frames')
+def get_segment_cut_points(video_frames, segments, relative_time=False, unwrapper=None):
+    """Find the packet range [inpoint, outpoint) of every (start, end) segment in a single pass over video_frames.
+
+    A range is from the last I-frame before start to the first I-frame after end. outpoint is None if there is no
+    I-frame after end. The PTS and the times are unwrapped with unwrapper (a PtsUnwrapper) if given.
+    """
+    if unwrapper and not relative_time:
+        segments = [(unwrapper.unwrap_time(start), unwrapper.unwrap_time(end)) for start, end in segments]
+    pts = None
+    packet_idx_prev = None
+    offset = 0
+    is_set = False
+    inpoints = [0] * len(segments)
+    outpoints = [None] * len(segments)
+    num_open = len(segments)
+    for frame in video_frames:
+        if frame.pts:
+            pts = (unwrapper.unwrap(frame.pts) if unwrapper else frame.pts) / 90000
+            packet_idx_prev = frame.packet_idx
+        if pts and frame.picture_coding_type == 'I':
+            if relative_time and not is_set:
+                offset = pts
+                is_set = True
+            for i, (start, end) in enumerate(segments):
+                if outpoints[i] is not None:
+                    continue
+                if pts < start + offset:
+                    inpoints[i] = packet_idx_prev
+                if end + offset < pts:
+                    outpoints[i] = frame.end_idx
+                    num_open -= 1
+            if num_open == 0:
+                break
+
+    return list(zip(inpoints, outpoints))
 
 
-def get_picture_coding_type(pes_stream):
-    picture_start_code = 0x00000100
-    picture_coding_types = {0b001: 'I', 0b010: 'P', 0b011: 'B'}
+SEEK_WINDOW = 8192  # Packets read per probe at most
+PROBE_WINDOW = 64  # Packets first read by a probe, doubled until a video PES header is found
+EDGE_WINDOW = 4096  # Packets first read from the end of a file, doubled until the timestamps are found
+INFO_WINDOW = 32768  # Packets read from the head of a file for info
+LOOKBACK = 65536  # Packets buffered by cut reading from a pipe
+MIN_RANGE = 16384  # Minimum packets per worker process range
+PSI_WINDOW = 3  # PAT repetitions waited for the PMTs of the other programs
+SEEK_MARGIN = 5 * 90000  # Initial lookback before a seek target, and tolerance for PTS reordering [90 kHz]
+PTS_WRAP = 1 << 33
+PCR_WRAP = PTS_WRAP * 300
+ATS_WRAP = 1 << 30
+CONCAT_GAP = 3 * 3003  # Gap between joined streams: 3 frames * 90000 Hz @ 29.97 fps
 
-    i = 0
-    while i + 3 < len(pes_stream):
-        if struct.unpack('>I', pes_stream[i : i + 4])[0] == picture_start_code:
-            return picture_coding_types[(pes_stream[i + 5] & 0b00111000) >> 3]
+
+class PtsUnwrapper:
+    """Unwrapper of the video PTS of a file, given its first and last PTS
+
+    PTS are unwrapped relative to the first PTS of the file so that they stay monotonic across a 33-bit wraparound.
+    """
+
+    def __init__(self, first, last):
+        self.ref = first - SEEK_MARGIN if first is not None else 0
+        self.is_wrapped = first is not None and last is not None and last < first
+
+    def unwrap(self, pts):
+        """Unwrap a PTS found in the file."""
+        if self.is_wrapped:
+            return self.ref + (pts - self.ref) % PTS_WRAP
         else:
-            i += 1
+            return pts
+
+    def unwrap_time(self, t):
+        """Unwrap a time [s] given by the user."""
+        if self.is_wrapped and t * 90000 < self.ref:
+            t += PTS_WRAP / 90000
+        return t
+
+
+def get_pts_unwrapper(tsi, packet_size, video_pid, video_frames=None):
+    """Return the PtsUnwrapper of a file, from the first and last PTS of video_frames (a list) if given."""
+    if video_frames is not None:
+        pts = [frame.pts for frame in video_frames if frame.pts is not None]
+        return PtsUnwrapper(pts[0], pts[-1]) if pts else PtsUnwrapper(None, None)
+
+    first = get_edge_timestamp(tsi, packet_size, False, video_pid)[1]
+    last = get_edge_timestamp(tsi, packet_size, True, video_pid)[1]
+    return PtsUnwrapper(first, last)
+
+
+class PtsSeeker(PtsUnwrapper):
+    """Bisection seeker over the video PTS
+
+    is_monotonic turns False once the probes of a bisection find a discontinuity, after which seeking is unreliable.
+    """
+
+    def __init__(self, tsi, packet_size, video_pid, stream_type=STREAM_TYPE_MPEG2_VIDEO):
+        self.tsi = tsi
+        self.packet_size = packet_size
+        self.video_pid = video_pid
+        self.stream_type = stream_type
+        self.num_packets = tsi.seek(0, os.SEEK_END) // packet_size
+        self.is_monotonic = True
+
+        first = self.probe(0)
+        self.first = first
+        # The last PTS is searched back from the end in growing steps
+        last = None
+        idx = self.num_packets
+        step = PROBE_WINDOW
+        while last is None and idx > 0:
+            idx = max(idx - step, 0)
+            last = self.probe(idx)
+            step = min(step * 2, SEEK_WINDOW)
+        super().__init__(first, last)
+        self.last_idx = idx  # Packet index before the last PTS
+        self.last = self.unwrap(last) if last is not None else None
+
+    def probe(self, packet_idx):
+        """Return the PTS of the first video PES header at or after packet_idx, or None.
+
+        The packets are read in windows doubling from PROBE_WINDOW, up to SEEK_WINDOW packets in all.
+        """
+        packet_size = self.packet_size
+        ts_offset = get_ts_offset(packet_size)
+        self.tsi.seek(packet_idx * packet_size)
+        data = bytearray()
+        pos = None  # Offset of the next packet once synced
+        window = PROBE_WINDOW
+        while len(data) < SEEK_WINDOW * packet_size:
+            chunk = self.tsi.read(min(window, SEEK_WINDOW - len(data) // packet_size) * packet_size)
+            if not chunk:
+                break
+            data += chunk
+            window *= 2
+            if pos is None:
+                pos = get_sync_offset(data, packet_size)
+                if pos is None:
+                    continue
+            while pos + packet_size <= len(data):
+                ts_packet = data[pos + ts_offset : pos + ts_offset + TS_PACKET_SIZE]
+                if get_pid(ts_packet) == self.video_pid and get_payload_unit_start_indicator(ts_packet) == 1:
+                    video_pes = Pes(ts_packet, get_payload_offset(ts_packet))
+                    if video_pes.pts is not None:
+                        return video_pes.pts
+                pos += packet_size
+
+        return None
+
+    def seek(self, pts):
+        """Return a packet index before the first video PES header with an unwrapped PTS at or after pts."""
+        if self.first is None or pts <= self.first:
+            return 0
+
+        # The last PTS bounds the bisection, which finds a discontinuity as a probe out of order
+        lo, lo_pts = 0, self.first
+        hi, hi_pts = (self.last_idx, self.last) if self.last is not None else (self.num_packets, None)
+        while hi - lo > SEEK_WINDOW:
+            mid = (lo + hi) // 2
+            mid_pts = self.probe(mid)
+            if mid_pts is None:
+                hi = mid
+                continue
+            mid_pts = self.unwrap(mid_pts)
+            if mid_pts < lo_pts - SEEK_MARGIN or (hi_pts is not None and hi_pts < mid_pts - SEEK_MARGIN):
+                self.is_monotonic = False
+                return 0
+            if mid_pts < pts:
+                lo, lo_pts = mid, mid_pts
+            else:
+                hi, hi_pts = mid, mid_pts
 
+        return lo
 
-def packets(args):
-    """Show packet info."""
-    with open(args.infile, 'rb') as tsi:
-        offset = 0
-        packet_idx = 0
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
-            offset += args.packet_size - TS_PACKET_SIZE
 
-            # Resync
-            # while get_sync_byte(ts_packet) != 0x47:
-            #     ts_packet = ts_packet[1:] + tsi.read(1)
-            #     offset += 1
+@stats.timed('seek')
+def seek_segment_cut_points(
+    tsi, packet_size, video_pid, segments, relative_time=False, stream_type=STREAM_TYPE_MPEG2_VIDEO
+):
+    """Find the cut points of get_segment_cut_points(), scanning only a few GOPs around each cut point
 
-            pid = get_pid(ts_packet)
-            print('{:012d} [0x{:04X}]'.format(offset, pid))
-            offset += TS_PACKET_SIZE
+    The cut points are located by bisection with one seeker. Falls back to get_segment_cut_points() over the whole
+    file if the I-frame PTS are found not to increase in decoding order apart from a wraparound.
+    """
+    seeker = PtsSeeker(tsi, packet_size, video_pid, stream_type)
+    segment_cut_points = []
+    for start, end in segments:
+        cut_points = seeker.is_monotonic and _seek_cut_points(seeker, start, end, relative_time)
+        if not cut_points:
+            video_frames = scan_frames(tsi, packet_size, video_pid, stream_type=stream_type)
+            return get_segment_cut_points(video_frames, segments, relative_time, seeker)
+        segment_cut_points.append(cut_points)
 
-            packet_idx += 1
+    return segment_cut_points
+
+
+def _seek_cut_points(seeker, start, end, relative_time):
+    """Seek the cut points, or return None at a PTS discontinuity."""
+    tsi, packet_size, video_pid, stream_type = seeker.tsi, seeker.packet_size, seeker.video_pid, seeker.stream_type
+    offset = 0
+    if relative_time:
+        pts = None
+        for frame in scan_frames(tsi, packet_size, video_pid, stream_type=stream_type):
+            if frame.pts:
+                pts = frame.pts / 90000
+            if pts and frame.picture_coding_type == 'I':
+                offset = pts
+                break
+    start = seeker.unwrap_time(start + offset)
+    end = seeker.unwrap_time(end + offset)
+
+    # Inpoint: the scan must see an I-frame before start unless it starts at the beginning of the file
+    margin = SEEK_MARGIN
+    while True:
+        landing = seeker.seek(start * 90000 - margin)
+        if not seeker.is_monotonic:
+            return None
+        pts = None
+        i_pts = None
+        packet_idx_prev = None
+        inpoint = None
+        stop = None
+        for frame in scan_frames(tsi, packet_size, video_pid, start=landing, stream_type=stream_type):
+            if frame.pts:
+                pts = seeker.unwrap(frame.pts) / 90000
+                packet_idx_prev = frame.packet_idx
+            if pts and frame.picture_coding_type == 'I':
+                if i_pts and pts < i_pts - SEEK_MARGIN / 90000:
+                    return None
+                i_pts = pts
+                if pts < start:
+                    inpoint = packet_idx_prev
+                elif inpoint is None and landing > 0:
+                    break  # Landed after the inpoint
+                if end < pts:
+                    return inpoint or 0, frame.end_idx
+                if start <= pts:
+                    stop = frame.packet_idx
+                    break
+        else:
+            return inpoint or 0, None
+        if stop is not None:
+            break
+        margin *= 4
+    inpoint = inpoint or 0
+
+    # Outpoint: the scan must see an I-frame not after end unless it continues from the inpoint scan
+    margin = SEEK_MARGIN
+    while True:
+        landing = max(seeker.seek(end * 90000 - margin), stop)
+        if not seeker.is_monotonic:
+            return None
+        pts = None
+        i_pts = None
+        is_before_end = landing == stop
+        for frame in scan_frames(tsi, packet_size, video_pid, start=landing, stream_type=stream_type):
+            if frame.pts:
+                pts = seeker.unwrap(frame.pts) / 90000
+            if pts and frame.picture_coding_type == 'I':
+                if i_pts and pts < i_pts - SEEK_MARGIN / 90000:
+                    return None
+                i_pts = pts
+                if end < pts:
+                    if is_before_end:
+                        return inpoint, frame.end_idx
+                    break  # Landed after the outpoint
+                is_before_end = True
+        else:
+            return inpoint, None
+        margin *= 4
+
+
+INDEX_SUFFIX = '.tsidx'
+INDEX_MAGIC = b'TSIX'
+INDEX_VERSION = 1
+# magic, version, packet_size, video_pid, file size, file mtime [ns], num_packets, num_frames
+INDEX_HEADER = struct.Struct('<4sHHHQqQQ')
+# packet_idx, pts, dts, pcr, picture_coding_type (-1 and '-' for none)
+INDEX_RECORD = struct.Struct('<Qqqqc')
+
+
+class FrameIndex:
+    """Frame index of a ts file"""
+
+    def __init__(self, packet_size, video_pid, num_packets, frames):
+        self.packet_size = packet_size
+        self.video_pid = video_pid
+        self.num_packets = num_packets
+        self.frames = frames
+
+
+@stats.timed('write index')
+def write_index(path, frame_index, stat):
+    """Write a frame index for the file with the given os.stat() result."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(
+            INDEX_HEADER.pack(
+                INDEX_MAGIC,
+                INDEX_VERSION,
+                frame_index.packet_size,
+                frame_index.video_pid,
+                stat.st_size,
+                stat.st_mtime_ns,
+                frame_index.num_packets,
+                len(frame_index.frames),
+            )
+        )
+        f.write(
+            b''.join(
+                INDEX_RECORD.pack(
+                    frame.packet_idx,
+                    -1 if frame.pts is None else frame.pts,
+                    -1 if frame.dts is None else frame.dts,
+                    -1 if frame.pcr is None else frame.pcr,
+                    (frame.picture_coding_type or '-').encode(),
+                )
+                for frame in frame_index.frames
+            )
+        )
+    os.replace(tmp_path, path)
+
+
+@stats.timed('read index')
+def read_index(infile, packet_size, path=None):
+    """Read the frame index of infile, or return None if there is no up-to-date index."""
+    path = path or infile + INDEX_SUFFIX
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        stat = os.stat(infile)
+    except OSError:
+        return None
+    if len(data) < INDEX_HEADER.size:
+        return None
+
+    header = INDEX_HEADER.unpack_from(data)
+    magic, version, index_packet_size, video_pid, size, mtime_ns, num_packets, num_frames = header
+    if (magic, version, index_packet_size, size, mtime_ns) != (
+        INDEX_MAGIC,
+        INDEX_VERSION,
+        packet_size,
+        stat.st_size,
+        stat.st_mtime_ns,
+    ):
+        return None
+    if len(data) != INDEX_HEADER.size + num_frames * INDEX_RECORD.size:
+        return None
+
+    frames = []
+    records = list(INDEX_RECORD.iter_unpack(memoryview(data)[INDEX_HEADER.size :]))
+    for i, (packet_idx, pts, dts, pcr, picture_coding_type) in enumerate(records):
+        end_idx = records[i + 1][0] if i + 1 < num_frames else num_packets
+        frames.append(
+            Frame(
+                packet_idx,
+                end_idx,
+                None if pts < 0 else pts,
+                None if dts < 0 else dts,
+                None if pcr < 0 else pcr,
+                None if picture_coding_type == b'-' else picture_coding_type.decode(),
+                packet_idx * packet_size,  # Indexed files have no skipped bytes
+            )
+        )
+
+    return FrameIndex(packet_size, video_pid, num_packets, frames)
+
+
+OUTPUT_FORMATS = ('text', 'csv', 'jsonl', 'npy')
+NPY_MAGIC = b'\x93NUMPY\x01\x00'  # .npy format version 1.0
+NPY_MAX_ROWS_DIGITS = 20  # Room for the number of rows in a .npy header written before the rows
+# (name, NumPy type) of the table columns of pkt, pid, prg and frm
+PACKET_FIELDS = [('offset', '<i8'), ('pid', '<u2')]
+PID_FIELDS = [('pid', '<u2'), ('packets', '<i8')]
+PROGRAM_FIELDS = [('program_number', '<u2'), ('program_map_pid', '<u2'), ('pid', '<u2'), ('stream_type', '<u1')]
+FRAME_FIELDS = [('offset', '<i8'), ('pts', '<i8'), ('dts', '<i8'), ('type', 'S1')]  # -1 and '-' for none
+
+
+class TableWriter:
+    """Writer of a table to stdout as text, CSV, JSON lines or a NumPy structured array (.npy)
+
+    write() takes a batch of rows as columns (lists or NumPy arrays) and writes it at once. Text rows are formatted with
+    template. The .npy header is padded to a fixed size and rewritten with the number of rows on close() if stdout is
+    seekable, so the rows are streamed to a file; otherwise they are kept until close().
+    """
+
+    def __init__(self, fmt, fields, template=None):
+        self.fmt = fmt
+        self.fields = fields
+        self.template = template
+        self.num_rows = 0
+        if fmt == 'npy':
+            self.np = import_numpy()
+            if not self.np:
+                raise ValueError('The npy format needs NumPy')
+            self.dtype = self.np.dtype(fields)
+            sys.stdout.flush()
+            self.out = sys.stdout.buffer
+            self.batches = None if self.out.seekable() else []
+            if self.batches is None:
+                self.header_pos = self.out.tell()
+                self.out.write(self.get_npy_header())
+        elif fmt == 'csv':
+            sys.stdout.write(','.join(name for name, _ in fields) + '\n')
+
+    def get_npy_header(self):
+        descr = self.np.lib.format.dtype_to_descr(self.dtype)
+        header = repr({'descr': descr, 'fortran_order': False, 'shape': (self.num_rows,)})
+        # Fixed size, a multiple of 64 bytes
+        size = (len(NPY_MAGIC) + 2 + len(header) + NPY_MAX_ROWS_DIGITS + 1 + 63) // 64 * 64
+        header = header.ljust(size - len(NPY_MAGIC) - 2 - 1) + '\n'
+        return NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+    def write(self, columns):
+        num_rows = len(columns[0])
+        if not num_rows:
+            return
+        self.num_rows += num_rows
+        if self.fmt == 'npy':
+            table = self.np.empty(num_rows, dtype=self.dtype)
+            for (name, _), column in zip(self.fields, columns):
+                table[name] = column
+            if self.batches is None:
+                self.out.write(table.tobytes())
+            else:
+                self.batches.append(table)
+            return
+
+        rows = zip(*(column.tolist() if hasattr(column, 'tolist') else column for column in columns))
+        if self.fmt == 'text':
+            template = self.template + '\n'
+            lines = [template.format(*row) for row in rows]
+        elif self.fmt == 'csv':
+            lines = [','.join(map(str, row)) + '\n' for row in rows]
+        else:
+            names = [name for name, _ in self.fields]
+            lines = [json.dumps(dict(zip(names, row))) + '\n' for row in rows]
+        sys.stdout.write(''.join(lines))
+
+    def close(self):
+        if self.fmt == 'npy':
+            if self.batches is None:
+                end = self.out.tell()
+                self.out.seek(self.header_pos)
+                self.out.write(self.get_npy_header())
+                self.out.seek(end)
+            else:
+                self.out.write(self.get_npy_header())
+                for table in self.batches:
+                    self.out.write(table.tobytes())
+                self.batches = []
+            self.out.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def packets(args):
+    """Show packet info."""
+    with TsFile(args.infile, args.packet_size, args.mmap) as ts, TableWriter(
+        args.format, PACKET_FIELDS, '{:012d} [0x{:04X}]'
+    ) as writer, stats.phase('scan'):
+        for offsets, pids in ts.packet_columns():
+            writer.write([offsets, pids])
+
+
+@stats.timed('count pids')
+def count_pids(tsi, packet_size, start=0, stop=None, resync=False):
+    """Count the packets [start, stop) of each pid."""
+    np = import_numpy()
+    reader = PacketReader(tsi, packet_size, start, stop, resync=resync)
+    if np:
+        counts = np.zeros(0x2000, dtype=np.int64)
+        for block in reader.blocks():
+            headers = PacketHeaders(np, block, packet_size)
+            counts += np.bincount(headers.pid, minlength=0x2000)
+        counts = counts.tolist()
+    else:
+        counts = [0] * 0x2000
+        for ts_packet in reader:
+            counts[get_pid(ts_packet)] += 1
+    stats.num_skipped_bytes += reader.num_skipped_bytes
+
+    return counts
+
+
+def count_pids_range(path, use_mmap, packet_size, start, stop):
+    """Count the packets [start, stop) of each pid with resync (worker process).
+
+    Returns the counts and the skipped bytes of the range (see RangeCounter).
+    """
+    np = import_numpy()
+    with open_input(path, use_mmap) as tsi:
+        reader = PacketReader(tsi, packet_size, start, resync=True)
+        counter = RangeCounter(reader, start, stop)
+        if np:
+            counts = np.zeros(0x2000, dtype=np.int64)
+            for block in reader.blocks():
+                n = counter.update_block(reader.block_offset, len(block) // packet_size)
+                if n:
+                    headers = PacketHeaders(np, block[: n * packet_size], packet_size)
+                    counts += np.bincount(headers.pid, minlength=0x2000)
+                if counter.end_offset is not None:
+                    break
+            counts = counts.tolist()
+        else:
+            counts = [0] * 0x2000
+            for ts_packet in reader:
+                if not counter.update(reader.offset):
+                    break
+                counts[get_pid(ts_packet)] += 1
+
+    return counts, counter.num_skipped_bytes
 
 
 def pid(args):
     """Show pid info."""
-    with open(args.infile, 'rb') as tsi:
-        pids = []
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
+    with TsFile(args.infile, args.packet_size, args.mmap) as ts:
+        counts = [(pid, count) for pid, count in ts.pids(args.jobs) if pid != 0x1FFF]
 
-            pid = get_pid(ts_packet)
-            pids.append(pid)
+    with TableWriter(args.format, PID_FIELDS, '[0x{:04X}] {:12d}') as writer:
+        writer.write([[pid for pid, _ in counts], [count for _, count in counts]])
 
-    elements = set(pids)
-    for i in range(0x1FFF):
-        if i in elements:
-            print('[0x{:04X}] {:12d}'.format(i, pids.count(i)))
+
+@stats.timed('psi')
+def get_programs(ts_packets):
+    """Collect the programs and their elementary streams.
+
+    Returns a list of (program_number, program_map_pid, elementary_pids, stream_types).
+    """
+    pat_section = Section()
+    program_map_pids = []
+    pat_loaded = False
+    for ts_packet in ts_packets:
+        pid = get_pid(ts_packet)
+        if pid == 0x0000 and not pat_loaded:  # Only the first PAT is used now
+            # Program Association Table
+            pat_section.update(ts_packet)
+            if pat_section.section:
+                pat = Pat(pat_section.section)
+                program_map_pids = [p for i, p in enumerate(pat.pids) if pat.program_numbers[i] != 0]
+                program_numbers = [p for i, p in enumerate(pat.program_numbers) if pat.program_numbers[i] != 0]
+                pat_loaded = True
+
+                pmt_section = [Section() for _ in range(len(program_map_pids))]
+                elementary_pids = [[] for _ in range(len(program_map_pids))]
+                stream_types = [[] for _ in range(len(program_map_pids))]
+        elif pid in program_map_pids:
+            # Program Map Table
+            i = program_map_pids.index(pid)
+            pmt_section[i].update(ts_packet)
+            if pmt_section[i].section:
+                pmt = Pmt(pmt_section[i].section)
+                # Append only new elements
+                for p, t in zip(pmt.elementary_pids, pmt.stream_types):
+                    if p not in elementary_pids[i]:
+                        elementary_pids[i].append(p)
+                        stream_types[i].append(t)
+
+    stats.add_units(0x0000, pat_section.stats())
+    for pid, section in zip(program_map_pids, pmt_section if pat_loaded else []):
+        stats.add_units(pid, section.stats())
+
+    return [
+        (program_numbers[i], program_map_pids[i], elementary_pids[i], stream_types[i])
+        for i in range(len(program_map_pids))
+    ]
+
+
+def print_programs(program_list):
+    for program_number, program_map_pid, elementary_pids, stream_types in program_list:
+        print('Program {}[0x{:04X}]'.format(program_number, program_map_pid))
+        for j in range(len(elementary_pids)):
+            print('  Stream [0x{:04X}]: '.format(elementary_pids[j]), end='')
+            print('type [0x{:04X}]'.format(stream_types[j]))
 
 
 def programs(args):
     """Show program info."""
-    with open(args.infile, 'rb') as tsi:
-        pat_section = Section()
-        program_map_pids = []
-        pat_loaded = False
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
+    with TsFile(args.infile, args.packet_size, args.mmap) as ts:
+        program_list = list(ts.programs())
 
-            pid = get_pid(ts_packet)
-            if pid == 0x0000 and not pat_loaded:  # Only the first PAT is used now
-                # Program Association Table
-                pat_section.update(ts_packet)
-                if pat_section.section:
-                    pat = Pat(pat_section.section)
-                    program_map_pids = [p for i, p in enumerate(pat.pids) if pat.program_numbers[i] != 0]
-                    program_numbers = [p for i, p in enumerate(pat.program_numbers) if pat.program_numbers[i] != 0]
-                    pat_loaded = True
-
-                    pmt_section = [Section() for _ in range(len(program_map_pids))]
-                    elementary_pids = [[] for _ in range(len(program_map_pids))]
-                    stream_types = [[] for _ in range(len(program_map_pids))]
-            elif pid in program_map_pids:
-                # Program Map Table
-                i = program_map_pids.index(pid)
-                pmt_section[i].update(ts_packet)
-                if pmt_section[i].section:
-                    pmt = Pmt(pmt_section[i].section)
-                    # Append only new elements
-                    for p, t in zip(pmt.elementary_pids, pmt.stream_types):
-                        if p not in elementary_pids[i]:
-                            elementary_pids[i].append(p)
-                            stream_types[i].append(t)
-
-    for i in range(len(program_map_pids)):
-        print('Program {}[0x{:04X}]'.format(program_numbers[i], program_map_pids[i]))
-        for j in range(len(elementary_pids[i])):
-            print('  Stream [0x{:04X}]: '.format(elementary_pids[i][j]), end='')
-            print('type [0x{:04X}]'.format(stream_types[i][j]))
+    if args.format == 'text':
+        print_programs(program_list)
+    else:
+        columns = [[], [], [], []]
+        for program_number, program_map_pid, elementary_pids, stream_types in program_list:
+            for elementary_pid, stream_type in zip(elementary_pids, stream_types):
+                for column, value in zip(columns, (program_number, program_map_pid, elementary_pid, stream_type)):
+                    column.append(value)
+        with TableWriter(args.format, PROGRAM_FIELDS) as writer:
+            writer.write(columns)
+
+
+def info(args):
+    """Show file info read from the head and the tail of the file."""
+    with open_input(args.infile, args.mmap) as tsi:
+        size = tsi.seek(0, os.SEEK_END)
+        probe = get_probe(tsi, args.packet_size, args.infile)
+        pcr_first, pts_first, _ = scan_timestamps(tsi, args.packet_size, probe.video_pid, 0, INFO_WINDOW, True)
+        pcr_last, pts_last, _ = get_edge_timestamp(tsi, args.packet_size, True, probe.video_pid)
+
+    print(f'Size: {size} bytes ({size // args.packet_size} packets)')
+    duration = None
+    if pts_first and pts_last:
+        duration = (pts_last - pts_first) % PTS_WRAP / 90000
+        print(f'First PTS: {pts_first / 90000:.6f}')
+        print(f'Last PTS: {pts_last / 90000:.6f}')
+        print(f'Duration: {duration:.6f} s')
+    if pcr_first and pcr_last:
+        duration = (pcr_last - pcr_first) % (PTS_WRAP * 300) / 27000000
+    if duration:
+        print(f'Bitrate: {size * 8 / duration / 1000000:.3f} Mbps')
+    print_programs([(n, p, pids, types) for n, p, _, pids, types in probe.programs])
+
+
+CHECK_MAX_EVENTS = 1000  # Events listed in a check report
+CHECK_COUNTERS = ('packets', 'transport_errors', 'scrambled', 'continuity_errors', 'duplicates')
+
+
+class StreamChecker:
+    """Checker of the transport error indicators, scrambling, continuity counters and PSI CRC_32 of each pid
+
+    Feed blocks of packets to update_block() (NumPy), or packets to update(). Continuity counters are checked on the
+    packets with a payload, except null packets, packets with or after a transport error and packets with a
+    discontinuity_indicator.
+    A repeated counter is counted as a duplicate. PAT and PMT sections are reassembled and their CRC_32 checked.
+    """
+
+    def __init__(self, np=None):
+        self.np = np
+        if np:
+            self.counts = {name: np.zeros(0x2000, dtype=np.int64) for name in CHECK_COUNTERS}
+            self.last_cc = np.full(0x2000, -1, dtype=np.int64)  # Continuity counter of the last packet of each pid
+        else:
+            self.counts = {name: [0] * 0x2000 for name in CHECK_COUNTERS}
+            self.last_cc = [-1] * 0x2000
+        self.num_events = 0
+        self.events = []  # The first CHECK_MAX_EVENTS events
+        self.pmt_pids = set()
+        self.sections = {}  # Section by pid
+        self.section_offsets = {}  # Offset of the packet starting the current section by pid
+        self.tables = {}  # Section and CRC error counts by pid
+
+    def __event(self, offset, pid, kind, **fields):
+        self.num_events += 1
+        if len(self.events) < CHECK_MAX_EVENTS:
+            self.events.append({'offset': offset, 'pid': pid, 'type': kind, **fields})
+
+    def __update_psi(self, ts_packet, pid, offset):
+        section = self.sections.setdefault(pid, Section())
+        section.update(ts_packet)
+        if get_payload_unit_start_indicator(ts_packet) == 1:
+            if section.section:
+                self.__check_section(pid, section.section, self.section_offsets[pid])
+            self.section_offsets[pid] = offset
+
+    def __check_section(self, pid, section, offset):
+        table = self.tables.setdefault(pid, {'sections': 0, 'crc_errors': 0})
+        table['sections'] += 1
+        psi = Psi(section)
+        if len(section) < 3 or not psi.is_crc_valid():
+            table['crc_errors'] += 1
+            self.__event(offset, pid, 'crc_error')
+        elif pid == 0x0000 and psi.table_id == 0x00:
+            pat = Pat(section)
+            self.pmt_pids = {p for n, p in zip(pat.program_numbers, pat.pids) if n != 0}
+
+    def update(self, ts_packet, offset):
+        """Check a packet at offset [bytes]."""
+        pid = get_pid(ts_packet)
+        self.counts['packets'][pid] += 1
+        if get_transport_error_indicator(ts_packet):
+            self.counts['transport_errors'][pid] += 1
+            self.__event(offset, pid, 'transport_error')
+            self.last_cc[pid] = -1  # Unknown after a transport error
+            return
+        if get_transport_scrambling_control(ts_packet):
+            self.counts['scrambled'][pid] += 1
+        if pid == 0x1FFF or get_payload_offset(ts_packet) is None:
+            return
+
+        continuity_counter = get_continuity_counter(ts_packet)
+        last_cc = self.last_cc[pid]
+        self.last_cc[pid] = continuity_counter
+        af = get_adaptation_field(ts_packet)
+        if last_cc >= 0 and not (af and af.discontinuity_indicator):
+            diff = (continuity_counter - last_cc) % 16
+            if diff == 0:
+                self.counts['duplicates'][pid] += 1
+            elif diff != 1:
+                self.counts['continuity_errors'][pid] += 1
+                self.__event(offset, pid, 'continuity_error', expected=(last_cc + 1) % 16, found=continuity_counter)
+
+        if pid == 0x0000 or pid in self.pmt_pids:
+            self.__update_psi(ts_packet, pid, offset)
+
+    def update_block(self, block, packet_size, block_offset):
+        """Check a block of packets at block_offset [bytes] (NumPy)."""
+        np = self.np
+        headers = PacketHeaders(np, block, packet_size)
+        pid = headers.pid
+        counts = self.counts
+        counts['packets'] += np.bincount(pid, minlength=0x2000)
+        is_error = headers.transport_error_indicator == 1
+        counts['transport_errors'] += np.bincount(pid[is_error], minlength=0x2000)
+        counts['scrambled'] += np.bincount(
+            pid[~is_error & (headers.transport_scrambling_control != 0)], minlength=0x2000
+        )
+        events = [(row, 'transport_error', {}) for row in np.flatnonzero(is_error)[:CHECK_MAX_EVENTS].tolist()]
+        self.num_events += max(int(is_error.sum()) - CHECK_MAX_EVENTS, 0)
+
+        # Continuity counters of the packets with a payload, grouped by pid in packet order
+        ts_packets = headers.ts_packets
+        is_discontinuity = (
+            ((headers.adaptation_field_control & 0b10) != 0)
+            & (ts_packets[:, 4] > 0)
+            & ((ts_packets[:, 5] & 0b10000000) != 0)
+        )
+        rows = np.flatnonzero((((headers.adaptation_field_control & 0b01) != 0) | is_error) & (pid != 0x1FFF))
+        rows = rows[np.argsort(pid[rows], kind='stable')]
+        pids = pid[rows].astype(np.int64)
+        continuity_counter = headers.continuity_counter[rows].astype(np.int64)
+        continuity_counter[is_error[rows]] = -1  # Unknown after a transport error
+        if len(rows):
+            is_first = np.ones(len(rows), dtype=bool)  # First packet of a pid in the block
+            is_first[1:] = pids[1:] != pids[:-1]
+            is_last = np.ones(len(rows), dtype=bool)
+            is_last[:-1] = is_first[1:]
+            last_cc = np.empty_like(continuity_counter)
+            last_cc[1:] = continuity_counter[:-1]
+            last_cc[is_first] = self.last_cc[pids[is_first]]
+            self.last_cc[pids[is_last]] = continuity_counter[is_last]
+
+            is_checked = (last_cc >= 0) & (continuity_counter >= 0) & ~is_discontinuity[rows]
+            diff = (continuity_counter - last_cc) % 16
+            is_duplicate = is_checked & (diff == 0)
+            is_gap = is_checked & (diff != 0) & (diff != 1)
+            counts['duplicates'] += np.bincount(pids[is_duplicate], minlength=0x2000)
+            counts['continuity_errors'] += np.bincount(pids[is_gap], minlength=0x2000)
+            gaps = np.flatnonzero(is_gap)
+            self.num_events += max(len(gaps) - CHECK_MAX_EVENTS, 0)
+            for i in gaps[:CHECK_MAX_EVENTS].tolist():
+                expected = (int(last_cc[i]) + 1) % 16
+                events.append(
+                    (int(rows[i]), 'continuity_error', {'expected': expected, 'found': int(continuity_counter[i])})
+                )
 
+        for row, kind, fields in sorted(events, key=lambda event: event[0]):
+            self.__event(block_offset + row * packet_size, int(pid[row]), kind, **fields)
+
+        # PSI in packet order, rescanned from the next packet when a PAT changes the PMT pids
+        is_psi = ((headers.adaptation_field_control & 0b01) != 0) & ~is_error
+        start = 0
+        while start < len(pid):
+            pmt_pids = self.pmt_pids
+            rows = start + np.flatnonzero(is_psi[start:] & np.isin(pid[start:], [0x0000, *pmt_pids]))
+            start = len(pid)
+            for row in rows.tolist():
+                self.__update_psi(ts_packets[row].tobytes(), int(pid[row]), block_offset + row * packet_size)
+                if self.pmt_pids != pmt_pids:
+                    start = row + 1
+                    break
 
-def frames(args):
-    """Show frame info."""
-    with open(args.infile, 'rb') as tsi:
-        # Determine the video pid
-        pat_section = Section()
-        program_1_pid = None
-        pmt_section = Section()
-        video_pid = None
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
+    def report(self):
+        """Return the counts and events as a dict."""
+        pids = {}
+        for pid in range(0x2000):
+            if self.counts['packets'][pid]:
+                pids[f'0x{pid:04X}'] = {name: int(self.counts[name][pid]) for name in CHECK_COUNTERS}
+
+        return {
+            **{name: int(sum(self.counts[name])) for name in CHECK_COUNTERS},
+            'crc_errors': sum(table['crc_errors'] for table in self.tables.values()),
+            'pids': pids,
+            'tables': {f'0x{pid:04X}': table for pid, table in sorted(self.tables.items())},
+            'num_events': self.num_events,
+            'events': sorted(self.events, key=lambda event: event['offset']),
+        }
+
+
+def check(args):
+    """Check the packets and write a JSON report. Exits with 1 if errors are found."""
+    np = import_numpy()
+    with open_input(args.infile, args.mmap) as tsi, stats.phase('check'):
+        reader = PacketReader(tsi, args.packet_size, resync=True)
+        checker = StreamChecker(np)
+        if np:
+            for block in reader.blocks():
+                checker.update_block(block, args.packet_size, reader.block_offset)
+        else:
+            for ts_packet in reader:
+                checker.update(ts_packet, reader.offset)
+    stats.num_skipped_bytes += reader.num_skipped_bytes
+    for pid, section in checker.sections.items():
+        stats.add_units(pid, section.stats())
+
+    report = {'file': args.infile, 'packet_size': args.packet_size, 'skipped_bytes': reader.num_skipped_bytes}
+    report.update(checker.report())
+    report['ok'] = not (
+        report['skipped_bytes'] or report['transport_errors'] or report['continuity_errors'] or report['crc_errors']
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if not report['ok']:
+        sys.exit(1)
+
+
+PCR_MAX_INTERVAL = 0.04  # PCR repetition limit [s] (ETSI TR 101 290)
+PCR_DISCONTINUITY = 1.0  # PCR steps longer than this [s] are discontinuities
+
+
+class Timeline:
+    """Number of packets and the PCR of every packet with one of a ts file, in NumPy arrays"""
+
+    def __init__(self, packet_size, num_packets, ats_duration, pcr_idx, pcr_pids, pcrs, pcr_discontinuities):
+        self.packet_size = packet_size
+        self.num_packets = num_packets
+        self.ats_duration = ats_duration  # Time [s] from the first to the last packet by the ATS, or None
+        self.pcr_idx = pcr_idx  # Packet indices of the PCRs
+        self.pcr_pids = pcr_pids
+        self.pcrs = pcrs  # [27 MHz]
+        self.pcr_discontinuities = pcr_discontinuities  # discontinuity_indicator
+
+
+def scan_timeline(np, tsi, packet_size, ats_bins=None):
+    """Collect the Timeline of a ts file (NumPy).
+
+    If ats_bins (BitrateBins) is given, the packets are counted into it by their ATS.
+    """
+    pcr_idx, pcr_pids, pcrs, pcr_discontinuities = [], [], [], []
+    num_packets = 0
+    ats_ticks = 0  # ATS time [27 MHz] of the last packet from the first one
+    last_ats = None
+    for block in PacketReader(tsi, packet_size).blocks():
+        headers = PacketHeaders(np, block, packet_size)
+        if ats_bins:
+            b = np.frombuffer(block, dtype=np.uint8).reshape(-1, packet_size)[:, :4].astype(np.int64)
+            ats = (b[:, 0] & 0b00111111) << 24 | b[:, 1] << 16 | b[:, 2] << 8 | b[:, 3]
+            ticks = ats_ticks + np.cumsum(np.diff(ats, prepend=ats[0] if last_ats is None else last_ats) % ATS_WRAP)
+            ats_bins.add(ticks / 27000000, headers.pid)
+            ats_ticks, last_ats = int(ticks[-1]), int(ats[-1])
+
+        ts_packets = headers.ts_packets
+        rows = np.flatnonzero(
+            ((headers.adaptation_field_control & 0b10) != 0)
+            & (ts_packets[:, 4] > 0)
+            & ((ts_packets[:, 5] & 0b00010000) != 0)
+        )
+        b = ts_packets[rows, 6:12].astype(np.int64)
+        pcr_base = b[:, 0] << 25 | b[:, 1] << 17 | b[:, 2] << 9 | b[:, 3] << 1 | b[:, 4] >> 7
+        pcrs.append(pcr_base * 300 + ((b[:, 4] & 0b00000001) << 8 | b[:, 5]))
+        pcr_idx.append(rows + num_packets)
+        pcr_pids.append(headers.pid[rows])
+        pcr_discontinuities.append((ts_packets[rows, 5] & 0b10000000) != 0)
+        num_packets += len(headers.pid)
+
+    def concatenate(arrays, dtype):
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+    return Timeline(
+        packet_size,
+        num_packets,
+        ats_ticks / 27000000 if ats_bins else None,
+        concatenate(pcr_idx, np.int64),
+        concatenate(pcr_pids, np.uint16),
+        concatenate(pcrs, np.int64),
+        concatenate(pcr_discontinuities, bool),
+    )
 
-            pid = get_pid(ts_packet)
-            if pid == 0x0000:
-                # Program Association Table
-                pat_section.update(ts_packet)
-                if pat_section.section:
-                    pat = Pat(pat_section.section)
-                    program_1_pid = (
-                        pat.pids[1] if pat.program_numbers[0] == 0 else pat.pids[0]
-                    )  # Only the first program is used
-            elif pid == program_1_pid:
-                # Program Map Table
-                pmt_section.update(ts_packet)
-                if pmt_section.section:
-                    pmt = Pmt(pmt_section.section)
-                    video_pid = pmt.elementary_pids[
-                        pmt.stream_types.index(0x02)
-                    ]  # Only the first video stream is used
-                    break
 
-        tsi.seek(0)
-        video_stream = Stream()
-        pts = None
-        # hoge = None
-        # i_pcr = None
-        # i_pts = None
-        # i_dts = None
-        # i = 0
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
-            # if not hoge:
-            #     hoge = (struct.unpack('>I', packet[:4])[0] << 2) >> 2
-            # print((((struct.unpack('>I', packet[:4])[0] << 2) >> 2) - hoge) / 1356)
-            # ats = (struct.unpack('>I', packet[:4])[0] << 2) >> 2
-            # print(ats / 27000000)
-
-            # af = get_adaptation_field(ts_packet)
-            # if af:
-            #     if af.pcr_base:
-            #         pcr = (af.pcr_base * 300 + af.pcr_ext) / 27000000
-            #         i_pcr = i
-            #         print(f'PCR,{pcr:.6f}\t{i_pcr}')
+class BitrateBins:
+    """Packets of each pid in each interval [s] of the packet times, counted block by block (NumPy)"""
+
+    def __init__(self, np, interval):
+        self.np = np
+        self.interval = interval
+        self.columns = np.full(0x2000, -1, dtype=np.int64)  # Column of each pid in counts
+        self.pids = np.zeros(0, dtype=np.uint16)  # Pid of each column
+        self.counts = np.zeros((0, 0), dtype=np.int64)  # Packets by interval and column
+        self.num_bins = 0
+
+    def add(self, times, pids):
+        """Count packets by their times [s from the first packet] and pids."""
+        np = self.np
+        new_pids = np.flatnonzero((np.bincount(pids, minlength=0x2000) > 0) & (self.columns < 0))
+        if len(new_pids):
+            self.columns[new_pids] = np.arange(len(self.pids), len(self.pids) + len(new_pids))
+            self.pids = np.concatenate((self.pids, new_pids.astype(np.uint16)))
+
+        bins = np.maximum(np.floor(times / self.interval).astype(np.int64), 0)
+        first, stop = int(bins.min()), int(bins.max()) + 1
+        num_columns = len(self.pids)
+        if stop > len(self.counts) or num_columns > self.counts.shape[1]:
+            counts = np.zeros((max(stop, 2 * len(self.counts)), num_columns), dtype=np.int64)
+            counts[: len(self.counts), : self.counts.shape[1]] = self.counts
+            self.counts = counts
+        idx = (bins - first) * num_columns + self.columns[pids]
+        self.counts[first:stop] += np.bincount(idx, minlength=(stop - first) * num_columns).reshape(-1, num_columns)
+        self.num_bins = max(self.num_bins, stop)
+
+    def get_bitrates(self):
+        """Return the start time [s] of each interval, the total bitrates, the pids, the bitrates of each pid
+        (intervals x pids) and the number of packets of each pid."""
+        np = self.np
+        order = np.argsort(self.pids)
+        counts = self.counts[: self.num_bins, order]
+        bitrates = counts * (TS_PACKET_SIZE * 8 / self.interval)
+        return np.arange(self.num_bins) * self.interval, bitrates.sum(axis=1), self.pids[order], bitrates, counts.sum(0)
+
+
+class PcrTimeline:
+    """Continuous time of the PCRs of a pid (NumPy)
+
+    Wraparounds are unwrapped. Steps that are flagged by the discontinuity_indicator, negative or longer than
+    PCR_DISCONTINUITY are discontinuities, and are replaced by the time of the packets in between at the median packet
+    time. The jitter is the distance from a constant packet rate fitted to each continuous part, which is meaningful
+    for constant bitrate multiplexes.
+    """
+
+    def __init__(self, np, pid, packet_idx, pcrs, discontinuity_indicator):
+        self.np = np
+        self.pid = pid
+        self.packet_idx = packet_idx
+        self.pcrs = pcrs
+        steps = np.diff(pcrs) % PCR_WRAP / 27000000
+        packet_steps = np.diff(packet_idx)
+        self.is_discontinuity = np.zeros(len(pcrs), dtype=bool)
+        self.is_discontinuity[1:] = discontinuity_indicator[1:] | (steps > PCR_DISCONTINUITY)
+        is_regular = ~self.is_discontinuity[1:] & (packet_steps > 0)
+        self.packet_time = float(np.median(steps[is_regular] / packet_steps[is_regular])) if is_regular.any() else 0.0
+        steps = np.where(self.is_discontinuity[1:], packet_steps * self.packet_time, steps)
+        self.time = np.concatenate(([0.0], np.cumsum(steps)))  # [s]
+        self.interval = np.concatenate(([np.nan], np.where(self.is_discontinuity[1:], np.nan, steps)))  # [s]
+
+        self.jitter = np.zeros(len(pcrs))  # [s]
+        parts = np.cumsum(self.is_discontinuity)
+        for part in range(int(parts[-1]) + 1 if len(parts) else 0):
+            is_part = parts == part
+            if is_part.sum() >= 2:
+                slope, intercept = np.polyfit(packet_idx[is_part], self.time[is_part], 1)
+                self.jitter[is_part] = self.time[is_part] - (slope * packet_idx[is_part] + intercept)
+
+    def get_table(self, packet_size):
+        """Return the columns of a table of the PCRs."""
+        np = self.np
+        return {
+            'offset': self.packet_idx * packet_size,
+            'pid': np.full(len(self.pcrs), self.pid, dtype=np.uint16),
+            'pcr': self.pcrs,
+            'time': self.time,
+            'interval': self.interval,
+            'jitter': self.jitter,
+            'discontinuity': self.is_discontinuity,
+        }
+
+    def get_packet_times(self, start, stop):
+        """Return the time [s] of the packets [start, stop), interpolated between the PCRs."""
+        np = self.np
+        idx = np.arange(start, stop)
+        times = np.interp(idx, self.packet_idx, self.time)
+        before = idx < self.packet_idx[0]
+        times[before] = self.time[0] - (self.packet_idx[0] - idx[before]) * self.packet_time
+        after = idx > self.packet_idx[-1]
+        times[after] = self.time[-1] + (idx[after] - self.packet_idx[-1]) * self.packet_time
+        return times
+
+
+def write_table(np, path, columns):
+    """Write columns (a dict of arrays) to a CSV file, or to a NumPy structured array for a .npy path."""
+    if path.endswith('.npy'):
+        num_rows = len(next(iter(columns.values())))
+        table = np.empty(num_rows, dtype=[(name, column.dtype) for name, column in columns.items()])
+        for name, column in columns.items():
+            table[name] = column
+        np.save(path, table)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(zip(*(column.tolist() for column in columns.values())))
+
+
+def bitrate(args):
+    """Show the bitrate over time, and the interval, jitter and discontinuities of the PCRs (NumPy)."""
+    np = import_numpy()
+    if not np:
+        raise ValueError('bitrate needs NumPy')
+
+    # With the PCR clock, the packet times depend on all the PCRs: they are collected first, and the packets are
+    # counted in a second pass.
+    clock = args.clock or ('ats' if args.packet_size == 192 else 'pcr')
+    bins = BitrateBins(np, args.interval)
+    with open_input(args.infile, args.mmap) as tsi:
+        probe = get_probe(tsi, args.packet_size, args.infile)
+        if clock == 'ats' and args.packet_size != 192:
+            raise ValueError('ATS needs 192-byte packets')
+        if clock == 'pcr' and not tsi.seekable():
+            raise ValueError('The PCR clock needs a seekable input')
+        timeline = scan_timeline(np, tsi, args.packet_size, bins if clock == 'ats' else None)
+        num_packets = timeline.num_packets
+        if not num_packets:
+            raise ValueError('No packets')
+
+        pcr_timelines = {}
+        for pid in sorted(set(timeline.pcr_pids.tolist())):
+            is_pid = timeline.pcr_pids == pid
+            pcr_timelines[pid] = PcrTimeline(
+                np, pid, timeline.pcr_idx[is_pid], timeline.pcrs[is_pid], timeline.pcr_discontinuities[is_pid]
+            )
+
+        if clock == 'ats':
+            duration = timeline.ats_duration
+            clock_name = 'ATS'
+        else:
+            pcr_pid = args.pcr_pid if args.pcr_pid is not None else probe.pcr_pid
+            if pcr_pid not in pcr_timelines:
+                pcr_pid = max(pcr_timelines, key=lambda pid: len(pcr_timelines[pid].pcrs), default=None)
+            if pcr_pid is None or len(pcr_timelines[pcr_pid].pcrs) < 2:
+                raise ValueError('No PCR')
+            pcr_timeline = pcr_timelines[pcr_pid]
+            start_time = pcr_timeline.get_packet_times(0, 1)[0]
+            duration = pcr_timeline.get_packet_times(num_packets - 1, num_packets)[0] - start_time
+            clock_name = f'PCR [0x{pcr_pid:04X}]'
+            with stats.phase('bitrate'):
+                packet_idx = 0
+                for block in PacketReader(tsi, args.packet_size).blocks():
+                    block_pids = PacketHeaders(np, block, args.packet_size).pid
+                    stop = packet_idx + len(block_pids)
+                    bins.add(pcr_timeline.get_packet_times(packet_idx, stop) - start_time, block_pids)
+                    packet_idx = stop
+
+    interval_times, totals, pids, bitrates, counts = bins.get_bitrates()
+
+    print(f'Clock: {clock_name}')
+    print(f'Duration: {duration:.6f} s')
+    if duration > 0:
+        print(f'Bitrate: {num_packets * TS_PACKET_SIZE * 8 / duration / 1000000:.3f} Mbps', end='')
+        if len(totals) > 2:
+            # The last interval is partial
+            print(f' ({args.interval:g} s: min {totals[:-1].min() / 1000000:.3f}', end='')
+            print(f', max {totals[:-1].max() / 1000000:.3f} Mbps)', end='')
+        print()
+        for pid, count in zip(pids.tolist(), counts.tolist()):
+            print(f'[0x{pid:04X}] {count * TS_PACKET_SIZE * 8 / duration / 1000000:12.6f} Mbps')
+    for pid, pcr_timeline in pcr_timelines.items():
+        interval = pcr_timeline.interval[1:][~np.isnan(pcr_timeline.interval[1:])]
+        print(f'PCR [0x{pid:04X}]: {len(pcr_timeline.pcrs)} values', end='')
+        if len(interval):
+            print(f', interval {interval.mean() * 1000:.3f} ms (max {interval.max() * 1000:.3f} ms', end='')
+            print(f', {int((interval > PCR_MAX_INTERVAL).sum())} over {PCR_MAX_INTERVAL * 1000:g} ms)', end='')
+        jitter = np.abs(pcr_timeline.jitter)
+        print(f', jitter {jitter.mean() * 1e9:.0f} ns (max {jitter.max() * 1e9:.0f} ns)', end='')
+        print(f', {int(pcr_timeline.is_discontinuity.sum())} discontinuities')
+
+    if args.output:
+        columns = {'time': interval_times, 'total': totals}
+        columns.update((f'0x{pid:04X}', bitrates[:, i]) for i, pid in enumerate(pids.tolist()))
+        write_table(np, args.output, columns)
+    if args.pcr_output and pcr_timelines:
+        tables = [pcr_timeline.get_table(args.packet_size) for pcr_timeline in pcr_timelines.values()]
+        write_table(
+            np, args.pcr_output, {name: np.concatenate([table[name] for table in tables]) for name in tables[0]}
+        )
 
-            pid = get_pid(ts_packet)
-            if pid == video_pid:
-                # Video PES
-                video_stream.update(ts_packet)
-                if video_stream.stream:
-                    picture_coding_type = get_picture_coding_type(video_stream.stream)
+
+def frames(args):
+    """Show frame info."""
+    with TsFile(args.infile, args.packet_size, args.mmap) as ts:
+        video_frames = ts.frames(args.jobs)
+        with stats.phase('scan frames'), TableWriter(args.format, FRAME_FIELDS, '{:.6f},{}') as writer:
+            ts_offset = get_ts_offset(args.packet_size)
+            pts = None
+            columns = [[], []] if args.format == 'text' else [[], [], [], []]
+            for frame in video_frames:
+                if args.format == 'text':
+                    # PTS in seconds carried over frames without one, and picture type
+                    if frame.pts:
+                        pts = frame.pts / 90000
                     if pts:
-                        print(f'{pts:.6f},{picture_coding_type}')
+                        columns[0].append(pts)
+                        columns[1].append(frame.picture_coding_type)
+                else:
+                    columns[0].append(frame.offset + ts_offset)
+                    columns[1].append(-1 if frame.pts is None else frame.pts)
+                    columns[2].append(-1 if frame.dts is None else frame.dts)
+                    columns[3].append(frame.picture_coding_type or '-')
+                if len(columns[0]) == CHUNK_SIZE:
+                    writer.write(columns)
+                    columns = [[] for _ in columns]
+            writer.write(columns)
 
-                if get_payload_unit_start_indicator(ts_packet) == 1:
-                    video_pes = Pes(get_payload(ts_packet))
-                    if video_pes.pts:
-                        pts = video_pes.pts / 90000
-
-            # if get_payload_unit_start_indicator(ts_packet) == 1:
-            #     video_pes = Pes(get_payload(ts_packet))
-            #     if video_pes.pts:
-            #         pts = video_pes.pts / 90000
-            #         i_pts = i
-            #         print(f'PTS,{pts:.6f}\t{i_pts} {pid}')
-            #     if video_pes.dts:
-            #         dts = video_pes.dts / 90000
-            #         i_dts = i
-            #         print(f'DTS,{dts:.6f}\t{i_dts} {pid}')
-            # i += 1
-        # Print the last frame
-        picture_coding_type = get_picture_coding_type(video_stream.buffer)
-        print(f'{pts:.6f},{picture_coding_type}')
+
+def index(args):
+    """Write a frame index."""
+    with TsFile(args.infile, args.packet_size, args.mmap) as ts:
+        ts.index(args.outfile, args.jobs)
 
 
 def cut(args):
     """Trim a ts file."""
-    with open(args.infile, 'rb') as tsi, open(args.outfile, 'wb') as tso:
-        # Determine the video pid
-        pat_section = Section()
-        program_1_pid = None
-        pmt_section = Section()
-        video_pid = None
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
-
-            pid = get_pid(ts_packet)
-            if pid == 0x0000:
-                # Program Association Table
-                pat_section.update(ts_packet)
-                if pat_section.section:
-                    pat = Pat(pat_section.section)
-                    program_1_pid = (
-                        pat.pids[1] if pat.program_numbers[0] == 0 else pat.pids[0]
-                    )  # Only the first program is used
-            elif pid == program_1_pid:
-                # Program Map Table
-                pmt_section.update(ts_packet)
-                if pmt_section.section:
-                    pmt = Pmt(pmt_section.section)
-                    video_pid = pmt.elementary_pids[
-                        pmt.stream_types.index(0x02)
-                    ]  # Only the first video stream is used
-                    break
-
-        tsi.seek(0)
-        packet_idx = 0
-        packet_idx_prev = None
-        video_stream = Stream()
-        pts = None
-        offset = 0
-        is_set = False
-        inpoint = 0
-        outpoint = None
-        for packet in iter(lambda: tsi.read(args.packet_size), b''):
-            ts_packet = get_ts_packet(packet, args.packet_size)
-
-            pid = get_pid(ts_packet)
-            if pid == video_pid:
-                # Video PES
-                video_stream.update(ts_packet)
-                if video_stream.stream:
-                    picture_coding_type = get_picture_coding_type(video_stream.stream)
-                    if pts:
-                        if args.relative_time:
-                            if not is_set and picture_coding_type == 'I':
-                                offset = pts
-                                is_set = True
-                        if pts < args.start + offset and picture_coding_type == 'I':
-                            inpoint = packet_idx_prev
-                        if args.end + offset < pts and picture_coding_type == 'I':
-                            outpoint = packet_idx
-                            break
-
-                if get_payload_unit_start_indicator(ts_packet) == 1:
-                    video_pes = Pes(get_payload(ts_packet))
-                    if video_pes.pts:
-                        pts = video_pes.pts / 90000
-                        packet_idx_prev = packet_idx
+    with TsFile(args.infile, args.packet_size, args.mmap) as ts:
+        ts.cut_segments(get_segments(args), args.outfile, args.join, args.relative_time, args.linear, args.lookback)
+
+
+def get_segments(args):
+    """Return the (start, end) segments [s] given by --edl or by the --start and --end options."""
+    if args.edl:
+        if args.start or args.end:
+            raise ValueError('--edl cannot be used with --start or --end')
+        return read_edl(args.edl)
+
+    starts = args.start or [0]
+    ends = args.end or [60 * 60 * 24]
+    if not args.start:
+        starts *= len(ends)
+    if not args.end:
+        ends *= len(starts)
+    if len(starts) != len(ends):
+        raise ValueError('--start and --end must be given in pairs')
+
+    return list(zip(starts, ends))
+
+
+def read_edl(path):
+    """Read an edit decision list: a line of start and end times [s] per segment to keep, # for comments."""
+    segments = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split('#')[0].replace(',', ' ').split()
+            if fields:
+                segments.append((float(fields[0]), float(fields[1])))
+
+    return segments
+
+
+def get_segment_path(path, i):
+    """Return the output file name of the i-th segment: output_1.ts, output_2.ts, ..."""
+    root, ext = os.path.splitext(path)
+
+    return f'{root}_{i + 1}{ext}'
+
+
+@stats.timed('write')
+def write_segments(tsi, tso, packet_size, video_pid, cut_points):
+    """Write the packet ranges [inpoint, outpoint) one after another.
+
+    The timestamps of each range after the first are shifted to follow the previous range as concat does.
+    """
+    shift = 0
+    prev = None  # Previous range
+    for inpoint, outpoint in cut_points:
+        if prev:
+            _, *last = scan_last_timestamps(tsi, packet_size, video_pid, *prev)
+            _, *first = scan_timestamps(tsi, packet_size, video_pid, inpoint, outpoint, True)
+            diff = get_join_diff(last, first)
+            if diff is not None:
+                shift += diff + CONCAT_GAP
+        if shift:
+            write_restamped(tso, PacketReader(tsi, packet_size, inpoint, outpoint), packet_size, shift)
+        else:
+            copy_range(tsi, tso, inpoint * packet_size, (outpoint - inpoint) * packet_size)
+        prev = (inpoint, outpoint)
+
+
+@stats.timed('stream cut')
+def stream_cut(tsi, tso, packet_size, start, end, relative_time=False, lookback=LOOKBACK):
+    """Trim a stream read sequentially, e.g. from a pipe.
+
+    Packets from the last I-frame seen so far that may become the inpoint are kept in a buffer of at most lookback
+    packets. The output is the same as cut() of a file as long as the I-frame PTS increase in decoding order.
+    """
+    reader = PacketReader(tsi, packet_size)
+    ts_packets = iter(reader)
+    history = collections.deque(maxlen=lookback)  # (packet_idx, packet) read before the video pid is known
+
+    def record():
+        for ts_packet in ts_packets:
+            history.append((reader.packet_idx, reader.packet))
+            yield ts_packet
+
+    probe = StreamProbe(packet_size, find_programs(record()))
+    if probe.video_pid is None:
+        raise ValueError('No video stream')
+    video_pid, stream_type = probe.video_pid, probe.video_stream_type
+
+    scanner = FrameScanner(video_pid, stream_type=stream_type)
+    buffer = collections.deque()  # (packet_idx, packet) from the inpoint candidate on
+    is_overflowed = bool(history) and history[0][0] > 0  # The first packets were dropped from history
+    if is_overflowed:
+        print(f'Lookback buffer of {lookback} packets overflowed', file=sys.stderr)
+    is_in = False
+    pts = None
+    packet_idx_prev = None
+    offset = 0
+    is_set = False
+
+    def on_frame(frame):
+        """Update the cut state with a frame. Returns True at the outpoint."""
+        nonlocal is_in, pts, packet_idx_prev, offset, is_set
+        if frame.pts:
+            pts = frame.pts / 90000
+            packet_idx_prev = frame.packet_idx
+        if pts and frame.picture_coding_type == 'I':
+            if relative_time and not is_set:
+                offset = pts
+                is_set = True
+            if pts < start + offset and not is_in:
+                # New inpoint
+                while buffer and buffer[0][0] < packet_idx_prev:
+                    buffer.popleft()
+            if end + offset < pts:
+                return True
+            if start + offset <= pts and not is_in:
+                is_in = True
+                tso.write(b''.join(packet for _, packet in buffer))
+                buffer.clear()
+        return False
+
+    def packets():
+        for packet_idx, packet in history:
+            yield packet_idx, packet, get_ts_packet(packet, packet_size)
+        history.clear()
+        for ts_packet in ts_packets:
+            yield reader.packet_idx, reader.packet, ts_packet
+
+    for packet_idx, packet, ts_packet in packets():
+        frame = scanner.update(ts_packet, packet_idx)
+        if frame and on_frame(frame):
+            break
+
+        if is_in:
+            tso.write(packet)
+        else:
+            buffer.append((packet_idx, packet))
+            if len(buffer) > lookback:
+                buffer.popleft()
+                if not is_overflowed:
+                    print(f'Lookback buffer of {lookback} packets overflowed', file=sys.stderr)
+                    is_overflowed = True
+    else:
+        frame = scanner.flush(reader.packet_idx + 1)
+        if frame:
+            on_frame(frame)
 
-            packet_idx += 1
-        if not outpoint:
-            outpoint = packet_idx
+    tso.write(b''.join(packet for _, packet in buffer))
+    stats.add_units(video_pid, scanner.stats())
 
-        tsi.seek(inpoint * args.packet_size)
-        tso.write(tsi.read((outpoint - inpoint) * args.packet_size))
 
+def find_programs(ts_packets):
+    """Read the first PAT and the first PMT of each of its programs.
 
-def get_video_pid(tsi, packet_size):
-    """Determine the video pid"""
-    tsi.seek(0)
+    Returns a list of (program_number, program_map_pid, pcr_pid, elementary_pids, stream_types), which is empty if no
+    PAT is found. pcr_pid is None and the lists are empty for a program whose PMT is not found. Once the PMT of the
+    first program is found, the other PMTs are waited for until PSI_WINDOW more PATs are seen.
+    """
     pat_section = Section()
-    program_1_pid = None
-    pmt_section = Section()
-    video_pid = None
-    for packet in iter(lambda: tsi.read(packet_size), b''):
-        ts_packet = get_ts_packet(packet, packet_size)
-
+    pat = None
+    pmt_sections = {}  # Section by program map pid
+    pmts = {}  # Pmt by program map pid
+    first_pmt_pid = None  # Program map pid of the first program
+    num_pats = 0  # PATs seen after the first one
+    for ts_packet in ts_packets:
         pid = get_pid(ts_packet)
-        if pid == 0x0000:
+        if pid == 0x0000 and not pat:
             # Program Association Table
             pat_section.update(ts_packet)
             if pat_section.section:
                 pat = Pat(pat_section.section)
-                program_1_pid = (
-                    pat.pids[1] if pat.program_numbers[0] == 0 else pat.pids[0]
-                )  # Only the first program is used
-        elif pid == program_1_pid:
-            # Program Map Table
-            pmt_section.update(ts_packet)
-            if pmt_section.section:
-                pmt = Pmt(pmt_section.section)
-                video_pid = pmt.elementary_pids[pmt.stream_types.index(0x02)]  # Only the first video stream is used
+                pmt_sections = {p: Section() for n, p in zip(pat.program_numbers, pat.pids) if n != 0}
+                if not pmt_sections:
+                    break
+                first_pmt_pid = next(p for n, p in zip(pat.program_numbers, pat.pids) if n != 0)
+        elif pid == 0x0000 and get_payload_unit_start_indicator(ts_packet) == 1:
+            num_pats += 1
+            if num_pats >= PSI_WINDOW and first_pmt_pid in pmts:
                 break
+        elif pid in pmt_sections and pid not in pmts:
+            # Program Map Table
+            pmt_sections[pid].update(ts_packet)
+            if pmt_sections[pid].section:
+                pmts[pid] = Pmt(pmt_sections[pid].section)
+                if len(pmts) == len(pmt_sections):
+                    break
+
+    stats.add_units(0x0000, pat_section.stats())
+    for pid, section in pmt_sections.items():
+        stats.add_units(pid, section.stats())
+    if not pat:
+        return []
+
+    program_list = []
+    for program_number, program_map_pid in zip(pat.program_numbers, pat.pids):
+        if program_number == 0:
+            continue
+        pmt = pmts.get(program_map_pid)
+        if pmt:
+            program_list.append((program_number, program_map_pid, pmt.pcr_pid, pmt.elementary_pids, pmt.stream_types))
+        else:
+            program_list.append((program_number, program_map_pid, None, [], []))
+
+    return program_list
 
-    return video_pid
 
+def find_video_stream(elementary_pids, stream_types):
+    """Return the pid and the stream type of the first MPEG-2, H.264 or HEVC video stream, or (None, None)."""
+    for pid, stream_type in zip(elementary_pids, stream_types):
+        if stream_type in VIDEO_STREAM_TYPES:
+            return pid, stream_type  # Only the first video stream is used
 
-def get_edge_timestamp(tsi, packet_size, isLast=False):
-    video_pid = get_video_pid(tsi, packet_size)
+    return None, None
+
+
+class StreamProbe:
+    """Programs and elementary streams of a ts file read from the first PAT and PMTs
+
+    programs is a list of find_programs(). The scanners use the PCR pid and the first video stream of the first
+    program.
+    """
+
+    def __init__(self, packet_size, programs):
+        self.packet_size = packet_size
+        self.programs = programs
+        self.pcr_pid = None
+        self.video_pid = None
+        self.video_stream_type = None
+        if programs:
+            _, _, self.pcr_pid, elementary_pids, stream_types = programs[0]  # Only the first program is used
+            self.video_pid, self.video_stream_type = find_video_stream(elementary_pids, stream_types)
+
+
+PROBE_SUFFIX = '.tsprobe'
+PROBE_VERSION = 1
+
+
+def write_probe(path, probe, stat):
+    """Write a probe cache (JSON) for the file with the given os.stat() result."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(
+            {
+                'version': PROBE_VERSION,
+                'packet_size': probe.packet_size,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'programs': probe.programs,
+            },
+            f,
+        )
+    os.replace(tmp_path, path)
+
+
+def read_probe(infile, packet_size, path=None):
+    """Read the probe cache of infile, or return None if there is no up-to-date cache."""
+    path = path or infile + PROBE_SUFFIX
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+        stat = os.stat(infile)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cache, dict):
+        return None
+    key = tuple(cache.get(k) for k in ('version', 'packet_size', 'size', 'mtime_ns'))
+    if key != (PROBE_VERSION, packet_size, stat.st_size, stat.st_mtime_ns):
+        return None
+
+    return StreamProbe(packet_size, [tuple(program) for program in cache['programs']])
+
+
+@stats.timed('probe')
+def get_probe(tsi, packet_size, infile=None):
+    """Probe the programs of a ts file.
+
+    If infile is given, the result is read from and written to its probe cache next to it.
+    """
+    use_cache = infile is not None and infile != '-'
+    if use_cache:
+        probe = read_probe(infile, packet_size)
+        if probe:
+            return probe
+
+    probe = StreamProbe(packet_size, find_programs(PacketReader(tsi, packet_size, resync=True)))
+    if use_cache and probe.programs:
+        try:
+            write_probe(infile + PROBE_SUFFIX, probe, os.stat(infile))
+        except OSError:
+            pass  # e.g. a read-only directory
+
+    return probe
+
+
+def get_video_stream(tsi, packet_size, infile=None):
+    """Determine the video pid and stream type"""
+    probe = get_probe(tsi, packet_size, infile)
+    if probe.video_pid is None:
+        raise ValueError('No video stream')
+
+    return probe.video_pid, probe.video_stream_type
+
+
+def get_video_pid(tsi, packet_size, infile=None):
+    """Determine the video pid"""
+    return get_video_stream(tsi, packet_size, infile)[0]
 
-    tsi.seek(0)
+
+@stats.timed('timestamps')
+def scan_timestamps(tsi, packet_size, video_pid, start=0, stop=None, isFirst=False):
+    """Find the last (or first) PCR, and PTS and DTS of the video stream in the packets [start, stop).
+
+    The PTS and DTS are those of the same video PES header, and a missing DTS is equal to the PTS. With isFirst, the
+    scan stops at the first PCR and the first video PES header with a PTS.
+    """
     pcr_edge = None
     pts_edge = None
     dts_edge = None
-    for packet in iter(lambda: tsi.read(packet_size), b''):
-        ts_packet = get_ts_packet(packet, packet_size)
-
-        af = get_adaptation_field(ts_packet)
-        if af:
-            if af.pcr_base:
-                pcr_edge = af.pcr_base * 300 + af.pcr_ext if isLast or not pcr_edge else pcr_edge
+    for ts_packet in PacketReader(tsi, packet_size, start, stop):
+        if has_pcr(ts_packet) and not (isFirst and pcr_edge is not None):
+            pcr_edge = get_pcr(ts_packet)
 
         pid = get_pid(ts_packet)
-        if pid == video_pid:
+        if pid == video_pid and not (isFirst and pts_edge is not None):
             if get_payload_unit_start_indicator(ts_packet) == 1:
-                video_pes = Pes(get_payload(ts_packet))
-                if video_pes.pts:
-                    pts_edge = video_pes.pts if isLast or not pts_edge else pts_edge
-                if video_pes.dts:
-                    dts_edge = video_pes.dts if isLast or not dts_edge else dts_edge
-
-        if not isLast:
-            if pcr_edge and pts_edge and dts_edge:
-                break
+                video_pes = Pes(ts_packet, get_payload_offset(ts_packet))
+                pts = video_pes.pts
+                if pts is not None:
+                    dts = video_pes.dts
+                    pts_edge, dts_edge = pts, dts if dts is not None else pts
+
+        if isFirst and pcr_edge is not None and pts_edge is not None:
+            break
 
     return pcr_edge, pts_edge, dts_edge
 
 
+def get_edge_timestamp(tsi, packet_size, isLast=False, video_pid=None):
+    """Find the first (or last) PCR, and PTS and DTS of the video stream."""
+    if video_pid is None:
+        video_pid = get_video_pid(tsi, packet_size)
+    if not isLast:
+        return scan_timestamps(tsi, packet_size, video_pid, isFirst=True)
+
+    return scan_last_timestamps(tsi, packet_size, video_pid)
+
+
+def scan_last_timestamps(tsi, packet_size, video_pid, start=0, stop=None):
+    """Find the last PCR, and PTS and DTS of the video stream in the packets [start, stop).
+
+    They are searched backwards from stop in growing windows until the last PCR and the last video PES header with a
+    PTS are found.
+    """
+    pcr_edge = None
+    pts_edge = None
+    dts_edge = None
+    if stop is None:
+        stop = tsi.seek(0, os.SEEK_END) // packet_size
+    window = EDGE_WINDOW
+    while stop > start and (pcr_edge is None or pts_edge is None):
+        window_start = max(stop - window, start)
+        pcr, pts, dts = scan_timestamps(tsi, packet_size, video_pid, window_start, stop)
+        if pcr_edge is None:
+            pcr_edge = pcr
+        if pts_edge is None:
+            pts_edge, dts_edge = pts, dts
+        stop = window_start
+        window *= 2
+
+    return pcr_edge, pts_edge, dts_edge
+
+
+def get_join_diff(last, first):
+    """Return the decode time at the end of a stream minus that at the start of the next one [90 kHz].
+
+    last and first are (pts, dts) pairs of the edge video PES. A missing DTS is equal to the PTS. Returns None if
+    either has no PTS.
+    """
+    (pts_last, dts_last), (pts_first, dts_first) = last, first
+    if pts_last is None or pts_first is None:
+        return None
+
+    return (dts_last if dts_last is not None else pts_last) - (dts_first if dts_first is not None else pts_first)
+
+
+def restamp_packet(packet, packet_size, shift):
+    """Shift the ATS, PCR, PTS and DTS of a packet (bytearray) in place by shift [90 kHz]."""
+    if packet_size == 192:
+        ats = (struct.unpack('>I', packet[:4])[0] << 2) >> 2
+        ats_new = ats + shift * 300
+        packet[0] = packet[0] & 0b11000000 | (ats_new >> 24) & 0b00111111
+        packet[1] = (ats_new >> 16) & 0b11111111
+        packet[2] = (ats_new >> 8) & 0b11111111
+        packet[3] = ats_new & 0b11111111
+
+    ts_packet = get_ts_packet(memoryview(packet), packet_size)  # Writable view of packet
+
+    if has_pcr(ts_packet):
+        pcr_base = decode_pcr(ts_packet, 6)[0] + shift
+        ts_packet[6] = (pcr_base >> 25) & 0b11111111
+        ts_packet[7] = (pcr_base >> 17) & 0b11111111
+        ts_packet[8] = (pcr_base >> 9) & 0b11111111
+        ts_packet[9] = (pcr_base >> 1) & 0b11111111
+        if pcr_base & 0b00000001:
+            ts_packet[10] |= 0b10000000
+        else:
+            ts_packet[10] &= 0b01111111
+
+    offset = get_payload_offset(ts_packet)
+    if get_payload_unit_start_indicator(ts_packet) == 1 and offset is not None:
+        pes = Pes(ts_packet, offset)
+        if pes.pts:
+            pts_new = pes.pts + shift
+            ts_packet[offset + 9] = ts_packet[offset + 9] & 0b11110001 | (pts_new >> 29) & 0b00001110
+            ts_packet[offset + 10] = (pts_new >> 22) & 0b11111111
+            ts_packet[offset + 11] = ts_packet[offset + 11] & 0b00000001 | (pts_new >> 14) & 0b11111110
+            ts_packet[offset + 12] = (pts_new >> 7) & 0b11111111
+            ts_packet[offset + 13] = ts_packet[offset + 13] & 0b00000001 | (pts_new << 1) & 0b11111110
+        if pes.dts:
+            dts_new = pes.dts + shift
+            ts_packet[offset + 14] = ts_packet[offset + 14] & 0b11110001 | (dts_new >> 29) & 0b00001110
+            ts_packet[offset + 15] = (dts_new >> 22) & 0b11111111
+            ts_packet[offset + 16] = ts_packet[offset + 16] & 0b00000001 | (dts_new >> 14) & 0b11111110
+            ts_packet[offset + 17] = (dts_new >> 7) & 0b11111111
+            ts_packet[offset + 18] = ts_packet[offset + 18] & 0b00000001 | (dts_new << 1) & 0b11111110
+
+
+def restamp_block(np, block, packet_size, shift):
+    """Shift the ATS, PCR, PTS and DTS of a block of packets (bytearray) in place by shift [90 kHz] (NumPy)."""
+    packets = np.frombuffer(block, dtype=np.uint8).reshape(-1, packet_size)
+    if packet_size == 192:
+        ats = packets[:, :4].astype(np.int64)
+        ats = (ats[:, 0] & 0b00111111) << 24 | ats[:, 1] << 16 | ats[:, 2] << 8 | ats[:, 3]
+        ats = (ats + shift * 300) % (1 << 30)
+        packets[:, 0] = packets[:, 0] & 0b11000000 | ats >> 24
+        packets[:, 1] = (ats >> 16) & 0b11111111
+        packets[:, 2] = (ats >> 8) & 0b11111111
+        packets[:, 3] = ats & 0b11111111
+    ts_offset = get_ts_offset(packet_size)
+    ts_packets = packets[:, ts_offset : ts_offset + TS_PACKET_SIZE]
+
+    adaptation_field_control = (ts_packets[:, 3] & 0b00110000) >> 4
+    has_adaptation_field = (adaptation_field_control & 0b10) != 0
+    adaptation_field_length = ts_packets[:, 4].astype(np.int64)
+
+    # PCR
+    idx = np.flatnonzero(has_adaptation_field & (adaptation_field_length > 0) & (ts_packets[:, 5] & 0b00010000 != 0))
+    pcr = ts_packets[idx, 6:11].astype(np.int64)
+    pcr_base = pcr[:, 0] << 25 | pcr[:, 1] << 17 | pcr[:, 2] << 9 | pcr[:, 3] << 1 | pcr[:, 4] >> 7
+    pcr_base = (pcr_base + shift) % PTS_WRAP
+    ts_packets[idx, 6] = (pcr_base >> 25) & 0b11111111
+    ts_packets[idx, 7] = (pcr_base >> 17) & 0b11111111
+    ts_packets[idx, 8] = (pcr_base >> 9) & 0b11111111
+    ts_packets[idx, 9] = (pcr_base >> 1) & 0b11111111
+    ts_packets[idx, 10] = ts_packets[idx, 10] & 0b01111111 | (pcr_base & 0b00000001) << 7
+
+    # PES headers
+    offset = 4 + np.where(has_adaptation_field, adaptation_field_length + 1, 0)
+    is_pes = ((ts_packets[:, 1] & 0b01000000) != 0) & ((adaptation_field_control & 0b01) != 0)
+    is_pes &= offset + 9 <= TS_PACKET_SIZE
+    idx = np.flatnonzero(is_pes)
+    offset = offset[idx]
+    is_pes = (ts_packets[idx, offset] == 0) & (ts_packets[idx, offset + 1] == 0) & (ts_packets[idx, offset + 2] == 1)
+    is_pes &= ~np.isin(ts_packets[idx, offset + 3], STREAM_IDS_WITHOUT_PES_HEADER)
+    pts_dts_flags = (ts_packets[idx, offset + 7] & 0b11000000) >> 6
+    for flags, pos in ((0b10, 9), (0b11, 14)):
+        # PTS if flags are '1x', DTS if '11'
+        is_timestamp = is_pes & (pts_dts_flags & flags == flags) & (offset + pos + 5 <= TS_PACKET_SIZE)
+        rows = idx[is_timestamp]
+        cols = offset[is_timestamp] + pos
+        ts = [ts_packets[rows, cols + i].astype(np.int64) for i in range(5)]
+        ts = (ts[0] & 0b00001110) << 29 | ts[1] << 22 | (ts[2] & 0b11111110) << 14 | ts[3] << 7 | ts[4] >> 1
+        ts = (ts + shift) % PTS_WRAP
+        ts_packets[rows, cols] = ts_packets[rows, cols] & 0b11110001 | (ts >> 29) & 0b00001110
+        ts_packets[rows, cols + 1] = (ts >> 22) & 0b11111111
+        ts_packets[rows, cols + 2] = ts_packets[rows, cols + 2] & 0b00000001 | (ts >> 14) & 0b11111110
+        ts_packets[rows, cols + 3] = (ts >> 7) & 0b11111111
+        ts_packets[rows, cols + 4] = ts_packets[rows, cols + 4] & 0b00000001 | (ts << 1) & 0b11111110
+
+
+@stats.timed('restamp')
+def write_restamped(tso, reader, packet_size, shift):
+    """Write the packets of a PacketReader with the ATS, PCR, PTS and DTS shifted by shift [90 kHz]."""
+    np = import_numpy()
+    if np:
+        for block in reader.blocks():
+            block = bytearray(block)
+            restamp_block(np, block, packet_size, shift)
+            tso.write(block)
+    else:
+        for _ in reader:
+            packet = bytearray(reader.packet)
+            restamp_packet(packet, packet_size, shift)
+            tso.write(packet)
+
+
 def concat(args):
-    """Concatenate two ts files."""
-    with open(args.infile_1, 'rb') as tsi_1, open(args.infile_2, 'rb') as tsi_2, open(args.outfile, 'wb') as tso:
-        # Find the last pts of infile_1
-        pcr_last, pts_last, dts_last = get_edge_timestamp(tsi_1, args.packet_size, True)
-        # print(f'{dts_last/90000:.6f}')
-
-        # Find the first pts of infile_2
-        pcr_first, pts_first, dts_first = get_edge_timestamp(tsi_2, args.packet_size)
-        # print(f'{dts_first/90000:.6f}')
-
-        tsi_1.seek(0)
-        tso.write(tsi_1.read())
-
-        diff = dts_last - dts_first
-        # print(f'{diff/90000:.6f}')
-        video_pid_2 = get_video_pid(tsi_2, args.packet_size)
-        inpoint = 0
-        if 0 < diff and diff < 2 * 90000:
-            tsi_2.seek(0)
-            packet_idx = 0
-            is_in = False
-            for packet in iter(lambda: tsi_2.read(args.packet_size), b''):
-                ts_packet = get_ts_packet(packet, args.packet_size)
-
-                pid = get_pid(ts_packet)
-                if pid == video_pid_2:
-                    if get_payload_unit_start_indicator(ts_packet) == 1:
-                        pes = Pes(get_payload(ts_packet))
-                        if pes.pts:
-                            pts = pes.pts
-                            if pts == pts_last:
-                                is_in = True
-                else:
-                    if is_in:
-                        inpoint = packet_idx
-                        break
+    """Concatenate ts files."""
+    with TsFile(args.infiles[0], args.packet_size, args.mmap) as ts:
+        ts.concat(args.infiles[1:], args.outfile)
 
-                packet_idx += 1
 
-            tsi_2.seek(inpoint * args.packet_size)
-            tso.write(tsi_2.read())
+@stats.timed('overlap')
+def find_overlap_inpoint(tsi, packet_size, video_pid, pts_last):
+    """Find the first packet after the video PES with pts_last and the rest of its frame, or 0 if it is not found."""
+    reader = PacketReader(tsi, packet_size)
+    is_in = False
+    for ts_packet in reader:
+        pid = get_pid(ts_packet)
+        if pid == video_pid:
+            if get_payload_unit_start_indicator(ts_packet) == 1:
+                pes = Pes(ts_packet, get_payload_offset(ts_packet))
+                if pes.pts:
+                    pts = pes.pts
+                    if pts == pts_last:
+                        is_in = True
         else:
-            gap = 3 * 3003  # 3 frames * 90000 Hz @ 29.97 fps
-
-            tsi_2.seek(0)
-            for packet in iter(lambda: tsi_2.read(args.packet_size), b''):
-                packet = bytearray(packet)
-
-                if args.packet_size == 192:
-                    ats = (struct.unpack('>I', packet[:4])[0] << 2) >> 2
-                    ats_new = ats + (diff + gap) * 300
-                    packet[0] = packet[0] & 0b11000000 | (ats_new >> 24) & 0b00111111
-                    packet[1] = (ats_new >> 16) & 0b11111111
-                    packet[2] = (ats_new >> 8) & 0b11111111
-                    packet[3] = ats_new & 0b11111111
-
-                ts_packet = get_ts_packet(packet, args.packet_size)
-
-                af = get_adaptation_field(ts_packet)
-                if af:
-                    if af.pcr_base:
-                        # pcr = af.pcr_base * 300 + af.pcr_ext
-                        # pcr_new = pcr + (diff + gap) * 300
-                        # pcr_ext = pcr_new % 300
-                        # pcr_base = (pcr_new - pcr_ext) // 300
-                        pcr_base = af.pcr_base + diff + gap
-                        ts_packet[6] = (pcr_base >> 25) & 0b11111111
-                        ts_packet[7] = (pcr_base >> 17) & 0b11111111
-                        ts_packet[8] = (pcr_base >> 9) & 0b11111111
-                        ts_packet[9] = (pcr_base >> 1) & 0b11111111
-                        if pcr_base & 0b00000001:
-                            ts_packet[10] |= 0b10000000
-                        else:
-                            ts_packet[10] &= 0b01111111
-                        # if (pcr_ext >> 8) & 0b00000001:
-                        #     ts_packet[10] |= 0b00000001
-                        # else:
-                        #     ts_packet[10] &= 0b11111110
-                        # ts_packet[11] = pcr_ext & 0b11111111
-
-                        # field = ts_packet[4:]
-                        # self.pcr_base = struct.unpack('>I', field[2:6])[0] << 1 | field[6] & 0b10000000 >> 7
-                        # # Reserved
-                        # self.pcr_ext = (field[6] & 0b00000001) << 8 | field[7]
-
-                if get_payload_unit_start_indicator(ts_packet) == 1:
-                    pes = Pes(get_payload(ts_packet))
-                    if pes.pts:
-                        pts = pes.pts
-                        pts_new = pts + diff + gap
-                        adaptation_field_control = get_adaptation_field_control(ts_packet)
-                        if adaptation_field_control in (0b10, 0b11):
-                            payload_offset = ts_packet[4] + 1
-                        else:
-                            payload_offset = 0
-                        offset = 4 + payload_offset
-                        ts_packet[offset + 9] = ts_packet[offset + 9] & 0b11110001 | (pts_new >> 29) & 0b00001110
-                        ts_packet[offset + 10] = (pts_new >> 22) & 0b11111111
-                        ts_packet[offset + 11] = ts_packet[offset + 11] & 0b00000001 | (pts_new >> 14) & 0b11111110
-                        ts_packet[offset + 12] = (pts_new >> 7) & 0b11111111
-                        ts_packet[offset + 13] = ts_packet[offset + 13] & 0b00000001 | (pts_new << 1) & 0b11111110
-
-                        # # '001x'
-                        # pts_32 = pes_payload[9] & 0b00001110
-                        # # marker_bit
-                        # pts_29 = struct.unpack('>H', pes_payload[10:12])[0] & 0b11111111_11111110
-                        # # marker_bit
-                        # pts_14 = struct.unpack('>H', pes_payload[12:14])[0] & 0b11111111_11111110
-                        # # marker_bit
-                        # self.pts = pts_32 << 29 | pts_29 << 14 | pts_14 >> 1
-                    if pes.dts:
-                        dts = pes.dts
-                        dts_new = dts + diff + gap
-                        ts_packet[offset + 14] = ts_packet[offset + 14] & 0b11110001 | (dts_new >> 29) & 0b00001110
-                        ts_packet[offset + 15] = (dts_new >> 22) & 0b11111111
-                        ts_packet[offset + 16] = ts_packet[offset + 16] & 0b00000001 | (dts_new >> 14) & 0b11111110
-                        ts_packet[offset + 17] = (dts_new >> 7) & 0b11111111
-                        ts_packet[offset + 18] = ts_packet[offset + 18] & 0b00000001 | (dts_new << 1) & 0b11111110
-
-                packet[args.packet_size - TS_PACKET_SIZE :] = ts_packet
-                tso.write(packet)
+            if is_in:
+                return reader.packet_idx
+
+    return 0
+
+
+class TsFile:
+    """MPEG-TS file, the library API of the commands
+
+    The file is opened once, and its packet size is detected unless it is given. The first PAT and PMTs are probed on
+    first use and kept (and cached next to the file as by the commands). The scanners are generators reading the file
+    in blocks, so they can be stopped early and use little memory:
+
+        with tscut.TsFile('input.ts') as ts:
+            for frame in ts.frames():
+                print(frame.pts, frame.picture_coding_type)
+            ts.cut(13.1, 17.3, 'output.ts')
+
+    path is '-' for stdin, which can be read only once. Outputs are paths, '-' for stdout, or binary file objects.
+    """
+
+    def __init__(self, path, packet_size=None, use_mmap=False):
+        self.path = path
+        self.packet_size = packet_size or detect_input_packet_size(path) or TS_PACKET_SIZE
+        self.use_mmap = use_mmap
+        self.__input = open_input(path, use_mmap)
+        self.file = self.__input.__enter__()
+        self.__probe = None
+
+    def close(self):
+        if self.file is not None:
+            self.file = None
+            self.__input.__exit__(None, None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def probe(self):
+        """StreamProbe of the first PAT and PMTs"""
+        if self.__probe is None:
+            self.__probe = get_probe(self.file, self.packet_size, self.path)
+        return self.__probe
+
+    @property
+    def video_stream(self):
+        """pid and stream type of the first video stream of the first program"""
+        if self.probe.video_pid is None:
+            raise ValueError('No video stream')
+        return self.probe.video_pid, self.probe.video_stream_type
+
+    @property
+    def num_packets(self):
+        """Number of whole packets of a seekable file"""
+        return self.file.seek(0, os.SEEK_END) // self.packet_size
+
+    def packets(self):
+        """Yield the byte offset and the 188-byte packet (a memoryview valid until the next one) of every packet.
+
+        Data without sync bytes is skipped.
+        """
+        reader = PacketReader(self.file, self.packet_size, resync=True)
+        ts_offset = get_ts_offset(self.packet_size)
+        for ts_packet in reader:
+            yield reader.offset + ts_offset, ts_packet
+        stats.num_skipped_bytes += reader.num_skipped_bytes
+
+    def packet_columns(self):
+        """Yield the byte offsets and the pids of the packets a block at a time, in NumPy arrays if it is installed."""
+        np = import_numpy()
+        if np:
+            reader = PacketReader(self.file, self.packet_size, resync=True)
+            ts_offset = get_ts_offset(self.packet_size)
+            for block in reader.blocks():
+                headers = PacketHeaders(np, block, self.packet_size)
+                offset = reader.block_offset + ts_offset
+                yield np.arange(offset, offset + len(block), self.packet_size), headers.pid
+            stats.num_skipped_bytes += reader.num_skipped_bytes
+        else:
+            offsets, pids = [], []
+            for offset, ts_packet in self.packets():
+                offsets.append(offset)
+                pids.append(get_pid(ts_packet))
+                if len(offsets) == CHUNK_SIZE:
+                    yield offsets, pids
+                    offsets, pids = [], []
+            if offsets:
+                yield offsets, pids
+
+    def pids(self, jobs=1):
+        """Yield the pid and the number of packets of every pid found in pid order, counted in jobs processes."""
+        if jobs > 1 and self.file.seekable():
+            import concurrent.futures
+
+            counts = [0] * 0x2000
+            with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+                futures = [
+                    executor.submit(count_pids_range, self.path, self.use_mmap, self.packet_size, start, stop)
+                    for start, stop in split_range(self.num_packets, jobs)
+                ]
+                for future in futures:
+                    range_counts, range_skipped_bytes = future.result()
+                    counts = [c + d for c, d in zip(counts, range_counts)]
+                    stats.num_skipped_bytes += range_skipped_bytes
+        else:
+            counts = count_pids(self.file, self.packet_size, resync=True)
+
+        for pid, count in enumerate(counts):
+            if count:
+                yield pid, count
+
+    def programs(self):
+        """Yield (program_number, program_map_pid, elementary_pids, stream_types) of every program.
+
+        Unlike probe, the whole file is read, and the streams of every version of the PMTs are collected.
+        """
+        reader = PacketReader(self.file, self.packet_size, resync=True)
+        yield from get_programs(reader)
+        stats.num_skipped_bytes += reader.num_skipped_bytes
+
+    def frames(self, jobs=1):
+        """Yield the video frames of the first video stream, read from the frame index if it is up to date."""
+        frame_index = read_index(self.path, self.packet_size)
+        if frame_index:
+            yield from frame_index.frames
+            return
+
+        video_pid, stream_type = self.video_stream
+        if jobs > 1 and self.file.seekable():
+            yield from parallel_scan_frames(
+                self.path, self.use_mmap, self.packet_size, video_pid, None, jobs, stream_type, resync=True
+            )
+        else:
+            yield from scan_frames(self.file, self.packet_size, video_pid, stream_type=stream_type, resync=True)
+
+    def index(self, path=None, jobs=1):
+        """Write the frame index, to the .tsidx file next to the file by default.
+
+        The frames are scanned with resync like frames(). Raises ValueError if bytes were skipped, as the packet
+        indices of the frames would then not be those of the file, which cut() copies.
+        """
+        video_pid, stream_type = self.video_stream
+        pcr_pid = self.probe.pcr_pid
+        num_skipped_bytes = stats.num_skipped_bytes
+        if jobs > 1:
+            video_frames = list(
+                parallel_scan_frames(
+                    self.path, self.use_mmap, self.packet_size, video_pid, pcr_pid, jobs, stream_type, resync=True
+                )
+            )
+        else:
+            with stats.phase('scan frames'):
+                video_frames = list(
+                    scan_frames(self.file, self.packet_size, video_pid, pcr_pid, stream_type=stream_type, resync=True)
+                )
+        num_skipped_bytes = stats.num_skipped_bytes - num_skipped_bytes
+        if num_skipped_bytes:
+            raise ValueError(f'Not indexed: {num_skipped_bytes} bytes without sync bytes were skipped')
+
+        write_index(
+            path or self.path + INDEX_SUFFIX,
+            FrameIndex(self.packet_size, video_pid, self.num_packets, video_frames),
+            os.stat(self.path),
+        )
 
+    def cut(self, start, end, dst, relative_time=False, linear=False, lookback=LOOKBACK):
+        """Write the packets from the last I-frame before start [s] to the first I-frame after end [s] to dst."""
+        self.cut_segments([(start, end)], dst, False, relative_time, linear, lookback)
+
+    def cut_segments(self, segments, dst, join=False, relative_time=False, linear=False, lookback=LOOKBACK):
+        """Cut the (start, end) segments [s] to dst_1.ts, dst_2.ts, ..., or to dst one after another if join."""
+        packet_size = self.packet_size
+        tsi = self.file
+        if not tsi.seekable():
+            if len(segments) > 1:
+                raise ValueError('Cutting several segments needs a seekable input')
+            with open_output(dst) as tso:
+                start, end = segments[0]
+                stream_cut(tsi, tso, packet_size, start, end, relative_time, lookback)
+            return
+
+        frame_index = read_index(self.path, packet_size)
+        if frame_index:
+            video_pid = frame_index.video_pid
+            unwrapper = get_pts_unwrapper(tsi, packet_size, video_pid, frame_index.frames)
+            cut_points = get_segment_cut_points(frame_index.frames, segments, relative_time, unwrapper)
+            num_packets = frame_index.num_packets
+        else:
+            video_pid, stream_type = self.video_stream
+            if linear:
+                unwrapper = get_pts_unwrapper(tsi, packet_size, video_pid)
+                video_frames = scan_frames(tsi, packet_size, video_pid, stream_type=stream_type)
+                cut_points = get_segment_cut_points(video_frames, segments, relative_time, unwrapper)
+            else:
+                cut_points = seek_segment_cut_points(tsi, packet_size, video_pid, segments, relative_time, stream_type)
+            num_packets = self.num_packets
+        cut_points = [(inpoint, num_packets if outpoint is None else outpoint) for inpoint, outpoint in cut_points]
 
-def main():
-    """Main routine"""
+        if join or len(cut_points) == 1:
+            with open_output(dst) as tso:
+                write_segments(tsi, tso, packet_size, video_pid, cut_points)
+        else:
+            if not isinstance(dst, str) or dst == '-':
+                raise ValueError('Several segments can be written to stdout or a file object only with --join')
+            for i, (inpoint, outpoint) in enumerate(cut_points):
+                with open_output(get_segment_path(dst, i)) as tso:
+                    copy_range(tsi, tso, inpoint * packet_size, (outpoint - inpoint) * packet_size)
+
+    def concat(self, others, dst):
+        """Write this file and the others (TsFile objects or paths) one after another to dst.
+
+        If two adjacent files overlap by less than 2 s, they are joined seamlessly. Otherwise the timestamps of the
+        later file are shifted to follow the earlier one.
+        """
+        with contextlib.ExitStack() as stack:
+            ts_files = [self]
+            for other in others:
+                if not isinstance(other, TsFile):
+                    other = stack.enter_context(TsFile(other, self.packet_size, self.use_mmap))
+                if other.packet_size != self.packet_size:
+                    raise ValueError(f'The inputs have different packet sizes: {self.packet_size}, {other.packet_size}')
+                ts_files.append(other)
+
+            # Probe the edges of every input first to find its inpoint and timestamp shift
+            packet_size = self.packet_size
+            plans = []  # (inpoint, shift) of each input
+            shift = 0
+            last = None  # pts and dts at the end of the previous input
+            for ts in ts_files:
+                video_pid = ts.video_stream[0]
+                _, *first = get_edge_timestamp(ts.file, packet_size, False, video_pid)
+                inpoint = 0
+                diff = get_join_diff(last, first) if last else None
+                if diff is not None:
+                    if 0 < diff and diff < 2 * 90000:
+                        # Overlap: keep the timestamps and skip what the previous input has
+                        inpoint = find_overlap_inpoint(ts.file, packet_size, video_pid, last[0])
+                    else:
+                        shift += diff + CONCAT_GAP
+                plans.append((inpoint, shift))
+
+                _, *last = get_edge_timestamp(ts.file, packet_size, True, video_pid)
+
+            # Write every input in a single pass
+            with open_output(dst) as tso, stats.phase('write'):
+                for ts, (inpoint, shift) in zip(ts_files, plans):
+                    if shift:
+                        write_restamped(tso, PacketReader(ts.file, packet_size, inpoint), packet_size, shift)
+                    else:
+                        num_packets = ts.num_packets  # A truncated last packet is dropped
+                        copy_range(ts.file, tso, inpoint * packet_size, (num_packets - inpoint) * packet_size)
+
+
+BATCH_IO_JOBS = 2  # Default jobs per disk at a time
+
+
+class BatchJob:
+    """Job of a batch manifest"""
+
+    def __init__(self, name, argv):
+        self.name = name
+        self.argv = argv
+        self.args = None  # Parsed argv
+        self.status = None  # 'ok' or 'failed'
+        self.seconds = None
+        self.error = None
+
+
+def read_manifest(path):
+    """Read the jobs of a manifest.
+
+    A JSON manifest is a list of argument lists or of {"name": ..., "args": [...]} objects. A CSV manifest has an
+    argument list per row; empty rows and rows starting with # are skipped.
+    """
+    jobs = []
+    with open(path, newline='') as f:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            for row in csv.reader(f):
+                argv = [field.strip() for field in row if field.strip()]
+                if argv and not argv[0].startswith('#'):
+                    jobs.append(BatchJob(' '.join(argv), argv))
+        else:
+            for entry in json.load(f):
+                if isinstance(entry, dict):
+                    argv = [str(arg) for arg in entry['args']]
+                    jobs.append(BatchJob(entry.get('name') or ' '.join(argv), argv))
+                else:
+                    argv = [str(arg) for arg in entry]
+                    jobs.append(BatchJob(' '.join(argv), argv))
+
+    return jobs
+
+
+def get_job_devices(args):
+    """Return the devices of the files a job reads and writes."""
+    paths = list(getattr(args, 'infiles', None) or [])
+    paths += [getattr(args, name, None) for name in ('infile', 'outfile', 'edl')]
+    devices = set()
+    for path in paths:
+        if path and path != '-':
+            try:
+                devices.add(os.stat(path if os.path.exists(path) else os.path.dirname(os.path.abspath(path))).st_dev)
+            except OSError:
+                pass
+
+    return devices
+
+
+def run_job(argv):
+    """Run a command line (worker process). Returns what it wrote to stdout, and its report of skipped bytes and
+    --stats."""
+    args = build_parser().parse_args(argv)
+    stdout = io.TextIOWrapper(io.BytesIO(), write_through=True)
+    report = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        run_command(args, report)
+
+    return stdout.buffer.getvalue(), report.getvalue()
+
+
+async def run_batch(jobs, num_workers, io_jobs):
+    """Run the jobs in worker processes, at most io_jobs at a time on each disk."""
+    import asyncio
+    import concurrent.futures
+
+    loop = asyncio.get_running_loop()
+    semaphores = collections.defaultdict(lambda: asyncio.Semaphore(io_jobs))
+    num_done = 0
+
+    async def run(job):
+        nonlocal num_done
+        async with contextlib.AsyncExitStack() as stack:
+            for device in sorted(get_job_devices(job.args)):
+                await stack.enter_async_context(semaphores[device])
+            print(f'start: {job.name}', file=sys.stderr)
+            start = time.perf_counter()
+            try:
+                output, report = await loop.run_in_executor(executor, run_job, job.argv)
+            except (Exception, SystemExit) as e:
+                job.status = 'failed'
+                job.error = repr(e)
+            else:
+                job.status = 'ok'
+                sys.stdout.buffer.write(output)
+                sys.stdout.flush()
+            job.seconds = time.perf_counter() - start
+        num_done += 1
+        print(f'[{num_done}/{len(jobs)}] {job.status}: {job.name} ({job.seconds:.3f} s)', file=sys.stderr)
+        if job.error:
+            print(f'  {job.error}', file=sys.stderr)
+        else:
+            sys.stderr.write(report)
+
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+        await asyncio.gather(*(run(job) for job in jobs))
+
+
+def batch(args):
+    """Run the jobs of a manifest concurrently."""
+    jobs = read_manifest(args.manifest)
+    parser = build_parser()
+    runnable_jobs = []
+    for job in jobs:
+        try:
+            job.args = parser.parse_args(job.argv)
+        except SystemExit:
+            job.status = 'failed'
+            job.error = 'invalid arguments'
+            continue
+        if job.args.func == batch:
+            job.status = 'failed'
+            job.error = 'batch cannot be a job'
+            continue
+        runnable_jobs.append(job)
+
+    start = time.perf_counter()
+    import asyncio
+
+    asyncio.run(run_batch(runnable_jobs, args.jobs, args.io_jobs))
+    seconds = time.perf_counter() - start
+
+    failed_jobs = [job for job in jobs if job.status == 'failed']
+    for job in failed_jobs:
+        print(f'failed: {job.name}: {job.error}', file=sys.stderr)
+    print(f'{len(jobs)} jobs, {len(failed_jobs)} failed in {seconds:.3f} s', file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(
+                [
+                    {
+                        'name': job.name,
+                        'args': job.argv,
+                        'status': job.status,
+                        'seconds': job.seconds,
+                        'error': job.error,
+                    }
+                    for job in jobs
+                ],
+                f,
+                indent=2,
+            )
+    if failed_jobs:
+        sys.exit(1)
+
+
+def build_parser():
+    """Build the command line parser"""
     parser = argparse.ArgumentParser(description='Process MPEG-TS files.')
+    parser.add_argument(
+        '--stats', action='store_true', help='report time per phase, bytes, packets, objects and memory to stderr'
+    )
+    parser.add_argument('--profile', metavar='FILE', help='write a cProfile dump (read with python -m pstats)')
     subparsers = parser.add_subparsers(required=True, help='subcommands')
 
     # command "packets"
     parser_packets = subparsers.add_parser('packets', aliases=['pkt'], help='show packet info')
     parser_packets.add_argument('infile', metavar='input', help='input file')
     parser_packets.add_argument(
-        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_packets.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_packets.add_argument(
+        '-f', '--format', choices=OUTPUT_FORMATS, default='text', help='output format (npy needs NumPy)'
     )
     parser_packets.set_defaults(func=packets)
 
@@ -772,7 +3568,12 @@ def main():
     parser_pid = subparsers.add_parser('pid', help='show pid info')
     parser_pid.add_argument('infile', metavar='input', help='input file')
     parser_pid.add_argument(
-        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_pid.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_pid.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser_pid.add_argument(
+        '-f', '--format', choices=OUTPUT_FORMATS, default='text', help='output format (npy needs NumPy)'
     )
     parser_pid.set_defaults(func=pid)
 
@@ -780,62 +3581,179 @@ def main():
     parser_programs = subparsers.add_parser('programs', aliases=['prg'], help='show program info')
     parser_programs.add_argument('infile', metavar='input', help='input file')
     parser_programs.add_argument(
-        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_programs.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_programs.add_argument(
+        '-f', '--format', choices=OUTPUT_FORMATS, default='text', help='output format (npy needs NumPy)'
     )
     parser_programs.set_defaults(func=programs)
 
+    # command "check"
+    parser_check = subparsers.add_parser('check', help='check continuity counters, transport errors and PSI CRC')
+    parser_check.add_argument('infile', metavar='input', help='input file')
+    parser_check.add_argument(
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_check.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_check.add_argument('-o', '--output', help='JSON file to write the report to (default: stdout)')
+    parser_check.set_defaults(func=check)
+
     # command "frames"
     parser_frames = subparsers.add_parser('frames', aliases=['frm'], help='show frame info')
     parser_frames.add_argument('infile', metavar='input', help='input file')
     parser_frames.add_argument(
-        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_frames.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_frames.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser_frames.add_argument(
+        '-f', '--format', choices=OUTPUT_FORMATS, default='text', help='output format (npy needs NumPy)'
     )
     parser_frames.set_defaults(func=frames)
 
+    # command "index"
+    parser_index = subparsers.add_parser('index', help='write a frame index used by frames and cut')
+    parser_index.add_argument('infile', metavar='input', help='input file')
+    parser_index.add_argument(
+        '-o', '--output', dest='outfile', help=f'index file (default: input file name + {INDEX_SUFFIX})'
+    )
+    parser_index.add_argument(
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_index.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_index.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser_index.set_defaults(func=index)
+
+    # command "info"
+    parser_info = subparsers.add_parser('info', help='show file info read from the head and the tail of the file')
+    parser_info.add_argument('infile', metavar='input', help='input file')
+    parser_info.add_argument(
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_info.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_info.set_defaults(func=info)
+
+    # command "bitrate"
+    parser_bitrate = subparsers.add_parser(
+        'bitrate', aliases=['pcr'], help='show the bitrate over time and the PCR intervals and jitter (NumPy)'
+    )
+    parser_bitrate.add_argument('infile', metavar='input', help='input file')
+    parser_bitrate.add_argument(
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
+    )
+    parser_bitrate.add_argument('--mmap', action='store_true', help='memory-map the input file')
+    parser_bitrate.add_argument('-i', '--interval', type=float, default=1, help='bitrate interval [s]')
+    parser_bitrate.add_argument(
+        '--clock', choices=['pcr', 'ats'], help='packet times (default: ATS of 192-byte packets, PCR otherwise)'
+    )
+    parser_bitrate.add_argument(
+        '--pcr-pid', type=lambda x: int(x, 0), help='pid of the PCR clock (default: the PCR pid of the first program)'
+    )
+    parser_bitrate.add_argument('-o', '--output', help='CSV (or .npy) file to write the bitrate of each interval to')
+    parser_bitrate.add_argument('--pcr-output', help='CSV (or .npy) file to write every PCR to')
+    parser_bitrate.set_defaults(func=bitrate)
+
     # command "cut"
     parser_cut = subparsers.add_parser('cut', help='trim a ts file')
     parser_cut.add_argument(
         'infile',
         metavar='input',  # nargs='+',
-        help='input file',
+        help='input file (- for stdin)',
     )
     parser_cut.add_argument(
         'outfile',
         metavar='output',  # nargs='*',
-        help='output file',
+        help='output file (- for stdout)',
     )
     parser_cut.add_argument(
-        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
     )
+    parser_cut.add_argument('--mmap', action='store_true', help='memory-map the input file')
     parser_cut.add_argument('-r', '--relative-time', action='store_true', help='use relative time instead of PTS')
-    parser_cut.add_argument('-s', '--start', type=float, default=0, help='start time [s]')
-    parser_cut.add_argument('-e', '--end', type=float, default=60 * 60 * 24, help='end time [s]')
+    parser_cut.add_argument(
+        '-s', '--start', type=float, action='append', help='start time [s] (repeat with --end for several segments)'
+    )
+    parser_cut.add_argument('-e', '--end', type=float, action='append', help='end time [s]')
+    parser_cut.add_argument('--edl', help='edit decision list: a line of start and end times [s] per segment')
+    parser_cut.add_argument(
+        '--join', action='store_true', help='join the segments into the output instead of output_1.ts, output_2.ts, ...'
+    )
+    parser_cut.add_argument(
+        '--linear', action='store_true', help='scan from the start instead of seeking (for PTS discontinuities)'
+    )
+    parser_cut.add_argument(
+        '--lookback',
+        type=int,
+        default=LOOKBACK,
+        help='packets buffered to find the inpoint when reading from a pipe (at least the longest GOP)',
+    )
     parser_cut.set_defaults(func=cut)
 
     # command "concat"
-    parser_concat = subparsers.add_parser('concat', help='concatenate two ts files')
-    parser_concat.add_argument(
-        'infile_1',
-        metavar='input1',
-        help='input file 1',
-    )
+    parser_concat = subparsers.add_parser('concat', help='concatenate ts files')
     parser_concat.add_argument(
-        'infile_2',
-        metavar='input2',
-        help='input file 2',
+        'infiles',
+        metavar='input',
+        nargs='+',
+        help='input files',
     )
     parser_concat.add_argument(
         'outfile',
         metavar='output',
-        help='output file',
+        help='output file (- for stdout)',
     )
     parser_concat.add_argument(
-        '-t', '--type', dest='packet_size', type=int, choices=[188, 192], default=188, help='TS packet size'
+        '-t', '--type', dest='packet_size', type=int, choices=PACKET_SIZES, help='TS packet size (default: detected)'
     )
+    parser_concat.add_argument('--mmap', action='store_true', help='memory-map the input file')
     parser_concat.set_defaults(func=concat)
 
-    args = parser.parse_args()
-    args.func(args)
+    # command "batch"
+    parser_batch = subparsers.add_parser('batch', help='run the jobs of a manifest concurrently')
+    parser_batch.add_argument(
+        'manifest', help='JSON list of jobs (argument lists or {"name", "args"}) or CSV with an argument list per row'
+    )
+    parser_batch.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count() or 1, help='number of worker processes (default: CPUs)'
+    )
+    parser_batch.add_argument(
+        '--io-jobs', type=int, default=BATCH_IO_JOBS, help=f'jobs per disk at a time (default: {BATCH_IO_JOBS})'
+    )
+    parser_batch.add_argument('--report', help='JSON file to write the result and the time of every job to')
+    parser_batch.set_defaults(func=batch)
+
+    return parser
+
+
+def run_command(args, file=None):
+    """Run the command of parsed arguments with a new stats, and its --profile and --stats.
+
+    The skipped bytes and --stats are reported to file, stderr by default.
+    """
+    file = file or sys.stderr
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    stats.reset()
+    try:
+        set_packet_size(args)
+        args.func(args)
+        if stats.num_skipped_bytes:
+            print(f'Skipped {stats.num_skipped_bytes} bytes without sync bytes', file=file)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.stats:
+            stats.report(file)
+
+
+def main():
+    """Main routine"""
+    run_command(build_parser().parse_args())
 
 
 def main_old():